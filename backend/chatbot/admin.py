@@ -1,18 +1,49 @@
 from django.contrib import admin
-from .models import ChatSession, Message, KnowledgeBaseEntry, ChatbotConfiguration
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from .models import ChatSession, Message, KnowledgeBaseEntry, ChatbotConfiguration, FAQEntry, MessageRollup, RequestProfile, RouteRollup
+from .analytics import estimate_percentile
+from .db_router import mark_written, replica_reads
+from .profiling import get_profile_dir
+from .runtime_config import CONFIG_OPTIONS
+
+
+class ReplicaReadAdmin(admin.ModelAdmin):
+    """Changelists are read from a replica; the editor's own changes stay on the primary for a few seconds"""
+    
+    def changelist_view(self, request, extra_context=None):
+        # POSTs run actions and list_editable saves, which must read what they write
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        with replica_reads(sticky_key=f'admin:{request.user.pk}'):
+            return super().changelist_view(request, extra_context)
+    
+    def log_change(self, request, obj, message):
+        mark_written(f'admin:{request.user.pk}')
+        return super().log_change(request, obj, message)
+    
+    def log_addition(self, request, obj, message):
+        mark_written(f'admin:{request.user.pk}')
+        return super().log_addition(request, obj, message)
+    
+    def log_deletion(self, request, obj, object_repr):
+        mark_written(f'admin:{request.user.pk}')
+        return super().log_deletion(request, obj, object_repr)
 
 
 @admin.register(ChatSession)
-class ChatSessionAdmin(admin.ModelAdmin):
+class ChatSessionAdmin(ReplicaReadAdmin):
     list_display = ['session_id', 'user', 'created_at', 'is_active']
     list_filter = ['is_active', 'created_at']
     search_fields = ['session_id', 'user__username']
 
 
 @admin.register(Message)
-class MessageAdmin(admin.ModelAdmin):
-    list_display = ['session', 'message_type', 'content_preview', 'timestamp', 'is_helpful']
-    list_filter = ['message_type', 'timestamp', 'is_helpful']
+class MessageAdmin(ReplicaReadAdmin):
+    list_display = ['session', 'message_type', 'content_preview', 'timestamp', 'is_helpful', 'answer_source']
+    list_filter = ['message_type', 'answer_source', 'timestamp', 'is_helpful']
     search_fields = ['content', 'session__session_id']
     
     def content_preview(self, obj):
@@ -21,7 +52,7 @@ class MessageAdmin(admin.ModelAdmin):
 
 
 @admin.register(KnowledgeBaseEntry)
-class KnowledgeBaseEntryAdmin(admin.ModelAdmin):
+class KnowledgeBaseEntryAdmin(ReplicaReadAdmin):
     list_display = ['title', 'category', 'priority', 'is_active', 'created_at']
     list_filter = ['category', 'is_active', 'created_at']
     search_fields = ['title', 'content', 'keywords']
@@ -29,10 +60,118 @@ class KnowledgeBaseEntryAdmin(admin.ModelAdmin):
 
 
 @admin.register(ChatbotConfiguration)
-class ChatbotConfigurationAdmin(admin.ModelAdmin):
-    list_display = ['name', 'value_preview', 'description', 'updated_at']
+class ChatbotConfigurationAdmin(ReplicaReadAdmin):
+    list_display = ['name', 'value_preview', 'runtime_option', 'description', 'updated_at']
     search_fields = ['name', 'description']
     
+    def runtime_option(self, obj):
+        option = CONFIG_OPTIONS.get(obj.name)
+        if option is None:
+            return '-'
+        default = 'built in' if isinstance(option.default, tuple) else option.default
+        return f"{option.description} (default {default})"
+    runtime_option.short_description = 'Runtime Option'
+    
     def value_preview(self, obj):
         return obj.value[:50] + "..." if len(obj.value) > 50 else obj.value
     value_preview.short_description = 'Value Preview'
+
+
+@admin.register(FAQEntry)
+class FAQEntryAdmin(ReplicaReadAdmin):
+    list_display = ['sample_question', 'language', 'ask_count', 'answer_source', 'answer_score', 'is_active', 'updated_at']
+    list_filter = ['language', 'answer_source', 'is_active']
+    search_fields = ['question_key', 'sample_question']
+    readonly_fields = ['question_key', 'ask_count', 'answer_score', 'answer_source', 'updated_at']
+
+
+@admin.register(MessageRollup)
+class MessageRollupAdmin(ReplicaReadAdmin):
+    list_display = ['bucket_start', 'granularity', 'language', 'message_type', 'message_count',
+                    'session_starts', 'helpful_count', 'unhelpful_count', 'model_free_rate',
+                    'avg_response_time', 'p95_response_time']
+    list_filter = ['granularity', 'language', 'message_type']
+    date_hierarchy = 'bucket_start'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def model_free_rate(self, obj):
+        answered = obj.llm_count + obj.template_count + obj.faq_count + obj.refusal_count
+        if not answered:
+            return None
+        return round((answered - obj.llm_count) / answered, 3)
+    model_free_rate.short_description = 'Served Without LLM'
+    
+    def avg_response_time(self, obj):
+        if not obj.response_time_count:
+            return None
+        return round(obj.response_time_sum / obj.response_time_count, 3)
+    avg_response_time.short_description = 'Avg Response Time'
+    
+    def p95_response_time(self, obj):
+        value = estimate_percentile(obj.response_time_histogram, 0.95)
+        return round(value, 3) if value is not None else None
+    p95_response_time.short_description = 'P95 Response Time'
+
+
+@admin.register(RouteRollup)
+class RouteRollupAdmin(ReplicaReadAdmin):
+    list_display = ['bucket_start', 'granularity', 'route', 'llm_model', 'language', 'call_count',
+                    'truncated_count', 'hedged_count', 'hedge_win_count', 'avg_prompt_tokens', 'avg_completion_tokens', 'p95_response_time']
+    list_filter = ['granularity', 'route', 'llm_model', 'language']
+    date_hierarchy = 'bucket_start'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def avg_prompt_tokens(self, obj):
+        return round(obj.prompt_tokens / obj.call_count) if obj.call_count else None
+    avg_prompt_tokens.short_description = 'Avg Prompt Tokens'
+    
+    def avg_completion_tokens(self, obj):
+        return round(obj.completion_tokens / obj.call_count) if obj.call_count else None
+    avg_completion_tokens.short_description = 'Avg Completion Tokens'
+    
+    def p95_response_time(self, obj):
+        value = estimate_percentile(obj.response_time_histogram, 0.95)
+        return round(value, 3) if value is not None else None
+    p95_response_time.short_description = 'P95 Response Time'
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(ReplicaReadAdmin):
+    list_display = ['created_at', 'method', 'path', 'session_id', 'trigger', 'status_code', 'duration', 'sample_count', 'download']
+    list_filter = ['trigger', 'method', 'status_code']
+    search_fields = ['path', 'session_id']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def get_urls(self):
+        urls = [
+            path('<int:profile_id>/download/', self.admin_site.admin_view(self.download_view),
+                 name='chatbot_requestprofile_download'),
+        ]
+        return urls + super().get_urls()
+    
+    def download_view(self, request, profile_id):
+        profile = get_object_or_404(RequestProfile, id=profile_id)
+        file_path = get_profile_dir() / profile.file_name
+        if not file_path.exists():
+            raise Http404("Profile file no longer exists")
+        return FileResponse(open(file_path, 'rb'), as_attachment=True, filename=profile.file_name)
+    
+    def download(self, obj):
+        url = reverse('admin:chatbot_requestprofile_download', args=[obj.id])
+        return format_html('<a href="{}">speedscope</a>', url)
+    download.short_description = 'Profile'
@@ -0,0 +1,259 @@
+"""
+Admission control for chat turns.
+
+Token buckets per session, per client IP and for the whole deployment are
+checked (and charged) in one atomic Redis script, with an in-process fallback
+when Redis is unavailable. Turns are also shed while too many LLM calls are
+already in flight in this process. Checks run before any DB or LLM work.
+"""
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+
+from .redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'chat:ratelimit:'
+REDIS_RETRY_AFTER = 5.0
+
+# KEYS: one bucket per limit; ARGV: capacity and refill rate (tokens/sec) for each key.
+# Charges one token from every bucket only if all of them have one.
+TOKEN_BUCKET_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local states = {}
+local denied = 0
+local retry_after = 0
+for index, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[index * 2 - 1])
+    local rate = tonumber(ARGV[index * 2])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    states[index] = tokens
+    if tokens < 1 and denied == 0 then
+        denied = index
+        retry_after = (1 - tokens) / rate
+    end
+end
+for index, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[index * 2 - 1])
+    local rate = tonumber(ARGV[index * 2])
+    local tokens = states[index]
+    if denied == 0 then
+        tokens = tokens - 1
+    end
+    redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000) + 1000)
+end
+return {denied, tostring(retry_after)}
+"""
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    reason: str = ''
+    retry_after: float = 0.0
+
+    @property
+    def status_code(self) -> int:
+        return 503 if self.reason == 'overloaded' else 429
+
+    @property
+    def message(self) -> str:
+        if self.reason == 'overloaded':
+            return 'The assistant is busy right now. Please try again in a few seconds.'
+        return 'Too many messages. Please slow down and try again shortly.'
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+    def payload(self) -> Dict:
+        return {'detail': self.message, 'reason': self.reason, 'retry_after': round(self.retry_after, 2)}
+
+
+ALLOWED = Decision(True)
+
+
+def parse_rate(value: str) -> Tuple[float, float]:
+    """'20/60' -> (capacity 20, refill 20/60 tokens per second)"""
+    count, _, seconds = str(value).partition('/')
+    count = float(count)
+    return count, count / float(seconds or 1)
+
+
+def _buckets(session_id: Optional[str], ip: Optional[str]) -> List[Tuple[str, str, float, float]]:
+    limits = getattr(settings, 'CHAT_RATE_LIMITS', {})
+    buckets = []
+    for scope, identity in (('session', session_id), ('ip', ip), ('global', 'all')):
+        if identity and limits.get(scope):
+            capacity, rate = parse_rate(limits[scope])
+            buckets.append((scope, f'{KEY_PREFIX}{scope}:{identity}', capacity, rate))
+    return buckets
+
+
+class LocalBuckets:
+    """In-process token buckets used when Redis is not configured or unreachable"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state: Dict[str, Tuple[float, float]] = {}
+
+    def take(self, buckets) -> Decision:
+        now = time.monotonic()
+        with self.lock:
+            levels = []
+            for scope, key, capacity, rate in buckets:
+                tokens, ts = self.state.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - ts) * rate)
+                levels.append(tokens)
+            for (scope, key, capacity, rate), tokens in zip(buckets, levels):
+                if tokens < 1:
+                    for (_, other_key, _, _), other_tokens in zip(buckets, levels):
+                        self.state[other_key] = (other_tokens, now)
+                    return Decision(False, scope, (1 - tokens) / rate)
+            for (scope, key, capacity, rate), tokens in zip(buckets, levels):
+                self.state[key] = (tokens - 1, now)
+            if len(self.state) > 50000:
+                # Drop the oldest half; idle buckets are full again anyway
+                for key in sorted(self.state, key=lambda k: self.state[k][1])[:25000]:
+                    del self.state[key]
+        return ALLOWED
+
+
+_local_buckets = LocalBuckets()
+_redis_down_until = 0.0
+_llm_inflight = 0
+_llm_lock = threading.Lock()
+
+
+def _script_args(buckets):
+    keys = [key for _, key, _, _ in buckets]
+    args = []
+    for _, _, capacity, rate in buckets:
+        args.extend([capacity, rate])
+    return keys, args
+
+
+def _decision_from_script(buckets, result) -> Decision:
+    denied, retry_after = int(result[0]), float(result[1])
+    if not denied:
+        return ALLOWED
+    return Decision(False, buckets[denied - 1][0], retry_after)
+
+
+def _redis_usable() -> bool:
+    return time.monotonic() >= _redis_down_until
+
+
+def _mark_redis_down():
+    global _redis_down_until
+    _redis_down_until = time.monotonic() + REDIS_RETRY_AFTER
+    logger.warning("Rate limiting falls back to local buckets for %.0fs", REDIS_RETRY_AFTER, exc_info=True)
+
+
+def _overloaded() -> Optional[Decision]:
+    max_inflight = getattr(settings, 'CHAT_MAX_LLM_INFLIGHT', 0)
+    if max_inflight and _llm_inflight >= max_inflight:
+        return Decision(False, 'overloaded', 1.0)
+    return None
+
+
+def check_admission(session_id: Optional[str], ip: Optional[str]) -> Decision:
+    """Admit or reject one chat turn; charges the rate-limit buckets when admitted"""
+    if not getattr(settings, 'CHAT_ADMISSION_CONTROL', False):
+        return ALLOWED
+    overloaded = _overloaded()
+    if overloaded:
+        return overloaded
+    buckets = _buckets(session_id, ip)
+    if not buckets:
+        return ALLOWED
+
+    client = get_redis() if _redis_usable() else None
+    if client is not None:
+        try:
+            keys, args = _script_args(buckets)
+            return _decision_from_script(buckets, client.eval(TOKEN_BUCKET_SCRIPT, len(keys), *keys, *args))
+        except Exception:
+            _mark_redis_down()
+    return _local_buckets.take(buckets)
+
+
+async def acheck_admission(session_id: Optional[str], ip: Optional[str]) -> Decision:
+    """Async variant of check_admission for ASGI views and ChatConsumer"""
+    if not getattr(settings, 'CHAT_ADMISSION_CONTROL', False):
+        return ALLOWED
+    overloaded = _overloaded()
+    if overloaded:
+        return overloaded
+    buckets = _buckets(session_id, ip)
+    if not buckets:
+        return ALLOWED
+
+    client = get_async_redis() if _redis_usable() else None
+    if client is not None:
+        try:
+            keys, args = _script_args(buckets)
+            result = await client.eval(TOKEN_BUCKET_SCRIPT, len(keys), *keys, *args)
+            return _decision_from_script(buckets, result)
+        except Exception:
+            _mark_redis_down()
+    return _local_buckets.take(buckets)
+
+
+@contextmanager
+def llm_slot():
+    """Count an outbound LLM call so admission can shed load when too many are in flight"""
+    global _llm_inflight
+    with _llm_lock:
+        _llm_inflight += 1
+    try:
+        yield
+    finally:
+        with _llm_lock:
+            _llm_inflight -= 1
+
+
+def _forwarded_client(forwarded: str) -> Optional[str]:
+    """Address that the outermost of CHAT_TRUSTED_PROXY_HOPS proxies saw the request come from
+
+    Each proxy appends the address it received the request from, so only the
+    last `hops` entries were written by proxies; anything left of them was
+    sent by the client and can be forged.
+    """
+    entries = [entry.strip() for entry in forwarded.split(',') if entry.strip()]
+    hops = max(getattr(settings, 'CHAT_TRUSTED_PROXY_HOPS', 1), 1)
+    if len(entries) < hops:
+        return None
+    return entries[-hops]
+
+
+def client_ip(meta: Dict) -> Optional[str]:
+    """Client address from a request's META, honouring X-Forwarded-For from trusted proxies"""
+    forwarded = meta.get('HTTP_X_FORWARDED_FOR')
+    if forwarded and getattr(settings, 'CHAT_TRUST_X_FORWARDED_FOR', False):
+        address = _forwarded_client(forwarded)
+        if address:
+            return address
+    return meta.get('REMOTE_ADDR')
+
+
+def scope_client_ip(scope: Dict) -> Optional[str]:
+    """Client address for an ASGI (WebSocket) scope"""
+    if getattr(settings, 'CHAT_TRUST_X_FORWARDED_FOR', False):
+        for name, value in scope.get('headers', []):
+            if name == b'x-forwarded-for':
+                address = _forwarded_client(value.decode('latin-1'))
+                if address:
+                    return address
+    client = scope.get('client')
+    return client[0] if client else None
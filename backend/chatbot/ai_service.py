@@ -1,10 +1,26 @@
-import openai
+import asyncio
+import functools
+import logging
 import os
 import time
 import re
+import weakref
 from typing import List, Dict, Optional, Tuple
 from django.conf import settings
-from .models import KnowledgeBaseEntry, ChatSession
+from .models import ChatSession
+from .admission import llm_slot
+from .answer_engine import answer as template_answer
+from .db_pool import release_connections
+from .faq import lookup_faq
+from .knowledge_index import get_knowledge_index
+from .llm_calls import LLMDeadlineExceeded, acomplete, complete, turn_deadline
+from .memory import recall
+from .model_routing import completion_options, length_instruction, select_route
+from .runtime_config import aget_runtime_config, get_runtime_config
+from .text_normalization import normalize_text
+from .tracing import span
+from .llm_stub import StubLLMClient, AsyncStubLLMClient
+from channels.db import database_sync_to_async
 import json
 
 # Try to import advanced RAG service, fallback to basic if not available
@@ -13,17 +29,81 @@ try:
     ADVANCED_RAG_AVAILABLE = True
 except ImportError:
     ADVANCED_RAG_AVAILABLE = False
-    print("Advanced RAG service not available, using basic implementation")
+
+logger = logging.getLogger(__name__)
+if not ADVANCED_RAG_AVAILABLE:
+    logger.debug("Advanced RAG service not available, using basic implementation")
+
+_async_clients = weakref.WeakKeyDictionary()
+
+# Persian scope keywords, normalized like the questions they are matched against; they are matched as
+# whole tokens or token sequences so 'درس' does not fire on 'آدرس' or 'کد' on 'کدام'
+PERSIAN_SCOPE_KEYWORDS = [normalize_text(keyword) for keyword in [
+    # Python & Programming
+    'پایتون', 'برنامه نویسی', 'کد', 'تابع', 'متغیر', 'کلاس', 'هوش مصنوعی', 'یادگیری ماشین',
+    'یادگیری عمیق', 'شبکه عصبی', 'علم داده', 'بینایی ماشین', 'پردازش زبان', 'الگوریتم',
+    
+    # Course & Training
+    'دوره', 'آموزش', 'درس', 'جلسه', 'ترم', 'استاد', 'مدرس', 'ثبت نام', 'هزینه', 'قیمت', 'شهریه',
+    'پرداخت', 'دلار', 'خصوصی', 'گروهی', 'آنلاین', 'گوگل میت', 'پیش نیاز', 'مبتدی', 'پیشرفته',
+    'مدرک', 'گواهی', 'ضبط', 'بازگشت وجه', 'شرایط',
+    
+    # Contact Information
+    'تماس', 'تلگرام', 'شماره', 'ایمیل', 'لینکدین', 'اینستاگرام', 'یوتیوب', 'ارتباط',
+    
+    # Instructor, projects and work
+    'متین', 'کفاشیان', 'سابقه', 'تجربه', 'رزومه', 'پروژه', 'نمونه کار', 'فریلنس', 'درآمد', 'شغل',
+    
+    # Common question words
+    'چیست', 'توضیح', 'یاد بگیرم', 'یادگیری', 'کمک',
+]]
+
+
+def get_async_client():
+    """AsyncOpenAI client for the running event loop; its connection pool is bound to that loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        if getattr(settings, 'LLM_STUB_LATENCY', None) is not None:
+            client = AsyncStubLLMClient(settings.LLM_STUB_LATENCY)
+        else:
+            import openai
+            # Retries are made by llm_calls, within the turn deadline
+            client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY, max_retries=0)
+        _async_clients[loop] = client
+    return client
+
+
+def reply_fields(ai_response: Dict) -> Dict:
+    """Message fields describing how an assistant reply was produced"""
+    return {
+        'response_time': ai_response['response_time'],
+        'in_scope': ai_response.get('in_scope'),
+        'answer_source': ai_response.get('answer_source', ''),
+        'route': ai_response.get('route', ''),
+        'llm_model': ai_response.get('llm_model', ''),
+        'prompt_tokens': ai_response.get('prompt_tokens'),
+        'completion_tokens': ai_response.get('completion_tokens'),
+        'truncated': ai_response.get('truncated'),
+        'hedge': ai_response.get('hedge', ''),
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def get_ai_service() -> 'AIService':
+    """Process-wide AIService; prompts are read and the OpenAI client is built only once"""
+    return AIService()
 
 
 class AIService:
     def __init__(self):
-        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        self._client = None
         if ADVANCED_RAG_AVAILABLE:
             self.rag_service = AdvancedRAGService()
         else:
             self.rag_service = None
         self.system_prompt = self._get_system_prompt()
+        self.system_prompt_fa = self._get_system_prompt_fa()
         
         # Intent patterns for better understanding
         self.intent_patterns = {
@@ -53,6 +133,18 @@ class AIService:
             ]
         }
     
+    @property
+    def client(self):
+        """OpenAI client, built on first use so importing and constructing the service stays cheap"""
+        if self._client is None:
+            if getattr(settings, 'LLM_STUB_LATENCY', None) is not None:
+                self._client = StubLLMClient(settings.LLM_STUB_LATENCY)
+            else:
+                import openai
+                # Retries are made by llm_calls, within the turn deadline
+                self._client = openai.OpenAI(api_key=settings.OPENAI_API_KEY, max_retries=0)
+        return self._client
+
     def _get_system_prompt(self):
         """Get the comprehensive system prompt with complete academy information"""
         base_instructions = (
@@ -124,43 +216,22 @@ Remember: You represent a premium AI education brand. Provide exceptional servic
 - برای سوالات تماس، همیشه شماره تلگرام +49 15731518417 و ایمیل kafashianmatin@gmail.com را ارائه بده.
 """
 
-    def _get_relevant_knowledge(self, query: str, limit: int = 5) -> List[Dict]:
+    def _get_relevant_knowledge(self, query: str, limit: int = None) -> List[Dict]:
         """Retrieve relevant knowledge base entries"""
-        # Simple keyword matching - in production, use vector search
-        entries = KnowledgeBaseEntry.objects.filter(is_active=True)
-        relevant_entries = []
-        
-        query_lower = query.lower()
-        for entry in entries:
-            score = 0
-            if query_lower in entry.title.lower():
-                score += 3
-            if query_lower in entry.content.lower():
-                score += 2
-            if entry.keywords:
-                for keyword in entry.keywords.split(','):
-                    if keyword.strip().lower() in query_lower:
-                        score += 1
-            
-            if score > 0:
-                relevant_entries.append({
-                    'title': entry.title,
-                    'content': entry.content,
-                    'category': entry.category,
-                    'score': score
-                })
-        
-        # Sort by score and return top entries
-        relevant_entries.sort(key=lambda x: x['score'], reverse=True)
-        return relevant_entries[:limit]
+        # Simple keyword matching over the versioned in-process index - in production, use vector search
+        if limit is None:
+            limit = get_runtime_config().retrieval_limit
+        return get_knowledge_index().search(query, limit)
 
     def _is_question_in_scope(self, question: str, language: str = 'en') -> bool:
         """Check if the question is within the scope of Python/AI/course topics (EN/FA)"""
         
-        # For Farsi, ALWAYS be in scope - any question should be answered
+        # Persian questions are matched on normalized text (character, ZWNJ and digit variants fold together);
+        # technical terms are often typed in English, so they fall through to the English keywords below
         if (language or 'en').lower() == 'fa':
-            # For Farsi, always return True - let the AI handle the response
-            return True
+            padded_question = f' {normalize_text(question)} '
+            if any(f' {keyword} ' in padded_question for keyword in PERSIAN_SCOPE_KEYWORDS):
+                return True
         
         # English scope detection (keep existing logic)
         scope_keywords = [
@@ -254,124 +325,368 @@ Remember: You represent a premium AI education brand. Provide exceptional servic
         
         return enhancements.get(intent, enhancements['general'])
 
-    def generate_response(self, user_message: str, session_id: str = None, language: str = 'en') -> Dict:
-        """Generate AI response with advanced intent recognition and context awareness"""
-        start_time = time.time()
-        
-        # Recognize user intent
-        intent, intent_confidence = self._recognize_intent(user_message)
-        contextual_enhancement = self._get_contextual_response_enhancement(intent, intent_confidence)
+    def _session_language(self, session_id: Optional[str], language: str) -> str:
+        """Language for scope, prompts and FAQ lookup: the session's, else the requested one"""
+        with span('ai.session_language'):
+            try:
+                if session_id:
+                    sess = ChatSession.objects.get(session_id=session_id)
+                    return (sess.language or language or 'en').lower()
+            except Exception:
+                pass
+            return (language or 'en').lower()
+
+    def _template_result(self, user_message: str, session_language: str, intent: str,
+                         intent_confidence: float, start_time: float) -> Optional[Dict]:
+        """Lookups of a single fact (contact details, prices, refund window...) are answered from typed KB facts"""
+        if not getattr(settings, 'CHAT_ANSWER_TEMPLATES', True):
+            return None
+        with span('ai.answer_template') as stage:
+            templated = template_answer(user_message, session_language, get_knowledge_index().facts())
+            confident = templated is not None and templated.confidence >= getattr(
+                settings, 'CHAT_ANSWER_TEMPLATE_MIN_CONFIDENCE', 0.8
+            )
+            stage.set('confidence', templated.confidence if templated else 0.0)
+            stage.set('hit', confident)
+        if not confident:
+            return None
+        return {
+            'response': templated.response,
+            'sources': templated.sources,
+            'response_time': time.time() - start_time,
+            'in_scope': True,
+            'answer_source': 'template',
+            'templates': templated.templates,
+            'template_confidence': templated.confidence,
+            'recognized_intent': intent,
+            'intent_confidence': intent_confidence
+        }
+
+    def _faq_result(self, user_message: str, session_language: str, intent: str,
+                    intent_confidence: float, start_time: float) -> Optional[Dict]:
+        """Frequent questions are answered from the precomputed FAQ table"""
+        with span('ai.faq_lookup') as stage:
+            faq_answer = lookup_faq(user_message, session_language)
+            stage.set('hit', bool(faq_answer))
+        if not faq_answer:
+            return None
+        return {
+            'response': faq_answer,
+            'sources': [],
+            'response_time': time.time() - start_time,
+            'in_scope': True,
+            'faq': True,
+            'answer_source': 'faq',
+            'recognized_intent': intent,
+            'intent_confidence': intent_confidence
+        }
+
+    def _check_scope(self, user_message: str, session_language: str) -> bool:
+        with span('ai.scope_check') as stage:
+            in_scope = self._is_question_in_scope(user_message, session_language)
+            stage.set('in_scope', in_scope)
+        return in_scope
+
+    def _out_of_scope_result(self, session_language: str, start_time: float) -> Dict:
+        # Determine language from session for out-of-scope reply
+        response = (
+            "متأسفم، فقط به پرسش‌های مرتبط با پایتون، هوش مصنوعی و اطلاعات دوره پاسخ می‌دهم. لطفاً سؤال خود را در این حوزه‌ها مطرح کنید." if session_language == 'fa' else
+            "I'm sorry, but I can only help with questions related to Python programming, Artificial Intelligence, and our course information. Please ask me about Python, AI concepts, or our training program instead."
+        )
+        return {
+            'response': response,
+            'sources': [],
+            'response_time': time.time() - start_time,
+            'in_scope': False,
+            'answer_source': 'refusal'
+        }
+
+    def _retrieve(self, user_message: str) -> List[Dict]:
+        # Get relevant knowledge using basic method
+        with span('ai.retrieval') as stage:
+            relevant_knowledge = self._get_relevant_knowledge(user_message)
+            stage.set('results', len(relevant_knowledge))
+        return relevant_knowledge
+
+    def _recall(self, user_message: str, session_id: Optional[str]) -> List[Dict]:
+        """Past exchanges of the session relevant to this question (see memory.py)"""
+        with span('ai.memory_recall') as stage:
+            memories = recall(session_id, user_message, get_runtime_config().memory_top_k)
+            stage.set('results', len(memories))
+        return memories
+
+    def _memory_context(self, memories: List[Dict]) -> str:
+        if not memories:
+            return ""
+        memory_chars = getattr(settings, 'CHAT_MEMORY_CHARS', 300)
+        context = "\n\nEarlier in this conversation:\n"
+        for memory in memories:
+            context += f"- User: {memory['question'][:memory_chars]}\n  Assistant: {memory['answer'][:memory_chars]}\n"
+        return context
+
+    def _build_turn(self, user_message: str, session_language: str, intent: str, intent_confidence: float,
+                    relevant_knowledge: List[Dict], memories: List[Dict] = ()) -> Dict:
+        """Chat messages and metadata for the completion"""
+        # Build context from knowledge base
+        context_chars = get_runtime_config().context_chars
+        context = ""
+        sources = []
+        if relevant_knowledge:
+            context = "\n\nRelevant information:\n"
+            for entry in relevant_knowledge:
+                context += f"- {entry['title']}: {entry['content'][:context_chars]}...\n"
+                sources.append(entry['title'])
+
+        # Prepare messages for OpenAI with enhanced context
+        system_prompt = (
+            self.system_prompt_fa if session_language == 'fa' else self.system_prompt
+        )
+        route = self._route(user_message, session_language, intent, intent_confidence)
+        enhanced_prompt = (
+            system_prompt + context + self._memory_context(memories)
+            + f"\n\nUser Intent: {intent} (confidence: {intent_confidence:.2f})"
+            + length_instruction(route, session_language)
+        )
+        return {
+            'messages': [
+                {"role": "system", "content": enhanced_prompt},
+                {"role": "user", "content": user_message}
+            ],
+            'sources': sources,
+            'confidence': 0.8,
+            'intents': [intent],
+            'recognized_intent': intent,
+            'intent_confidence': intent_confidence,
+            'route': route,
+            'language': session_language
+        }
+
+    def _route(self, user_message: str, session_language: str, intent: str, intent_confidence: float):
+        with span('ai.model_route') as stage:
+            route = select_route(
+                get_runtime_config().model_routes, intent, intent_confidence, user_message, session_language
+            )
+            stage.set('route', route.name)
+        return route
+
+    def _recognize_intent_traced(self, user_message: str) -> Tuple[str, float]:
+        with span('ai.intent') as stage:
+            intent, intent_confidence = self._recognize_intent(user_message)
+            stage.set('intent', intent)
+        return intent, intent_confidence
+
+    def _prepare_turn(self, user_message: str, session_id: str = None, language: str = 'en',
+                      start_time: float = None) -> Dict:
+        """Run every stage before the LLM call, one after the other.
+
+        Returns {'result': ...} when the turn is already answered (template, FAQ,
+        out of scope), otherwise the chat messages and metadata for the completion.
+        """
+        start_time = start_time or time.time()
+        intent, intent_confidence = self._recognize_intent_traced(user_message)
+        session_language = self._session_language(session_id, language)
+
+        result = self._template_result(user_message, session_language, intent, intent_confidence, start_time)
+        if result is None:
+            result = self._faq_result(user_message, session_language, intent, intent_confidence, start_time)
+        if result is not None:
+            return {'result': result}
         
-        try:
-            if self.rag_service:
-                # Use advanced RAG service
+        if self.rag_service:
+            # Use advanced RAG service
+            with span('ai.rag_retrieval'):
                 enhanced_system_prompt = self.rag_service.get_enhanced_system_prompt(user_message)
                 rag_result = self.rag_service.retrieve_relevant_information(user_message)
-                
-                # Check if question is in scope using advanced analysis
-                if not rag_result['is_relevant']:
-                    response = "I'm sorry, but I can only help with questions related to Python programming, Artificial Intelligence, and our course information. Please ask me about Python, AI concepts, or our training program instead."
-                    return {
-                        'response': response,
-                        'sources': [],
-                        'response_time': time.time() - start_time,
-                        'in_scope': False
-                    }
-                
-                # Prepare messages for OpenAI with enhanced context
-                messages = [
-                    {"role": "system", "content": enhanced_system_prompt},
-                    {"role": "user", "content": user_message}
-                ]
-                
-                # Extract sources from RAG results
-                sources = [entry['title'] for entry in rag_result['relevant_entries']]
-                confidence = rag_result['confidence']
-                intents = rag_result['intent_analysis']['intents']
-            else:
-                # Fallback to basic implementation
-                # Determine language from parameter or session for scope and prompts
-                session_language = (language or 'en').lower()
-                try:
-                    if session_id:
-                        sess = ChatSession.objects.get(session_id=session_id)
-                        session_language = (sess.language or language or 'en').lower()
-                except Exception:
-                    session_language = (language or 'en').lower()
-
-                if not self._is_question_in_scope(user_message, session_language):
-                    # Determine language from session for out-of-scope reply
-                    response = (
-                        "متأسفم، فقط به پرسش‌های مرتبط با پایتون، هوش مصنوعی و اطلاعات دوره پاسخ می‌دهم. لطفاً سؤال خود را در این حوزه‌ها مطرح کنید." if session_language == 'fa' else
-                        "I'm sorry, but I can only help with questions related to Python programming, Artificial Intelligence, and our course information. Please ask me about Python, AI concepts, or our training program instead."
-                    )
-                    return {
-                        'response': response,
-                        'sources': [],
-                        'response_time': time.time() - start_time,
-                        'in_scope': False
-                    }
-                
-                # Get relevant knowledge using basic method
-                relevant_knowledge = self._get_relevant_knowledge(user_message)
-                
-                # Build context from knowledge base
-                context = ""
-                sources = []
-                if relevant_knowledge:
-                    context = "\n\nRelevant information:\n"
-                    for entry in relevant_knowledge:
-                        context += f"- {entry['title']}: {entry['content'][:200]}...\n"
-                        sources.append(entry['title'])
-                
-                # session_language already determined above
-
-                # Prepare messages for OpenAI with enhanced context
-                system_prompt = (
-                    self._get_system_prompt_fa() if session_language == 'fa' else self.system_prompt
-                )
-                enhanced_prompt = system_prompt + context + f"\n\nUser Intent: {intent} (confidence: {intent_confidence:.2f})"
-                messages = [
-                    {"role": "system", "content": enhanced_prompt},
-                    {"role": "user", "content": user_message}
-                ]
-                confidence = 0.8
-                intents = [intent]
             
-            # Call OpenAI API
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                max_tokens=400,
-                temperature=0.3
-            )
-            
-            ai_response = response.choices[0].message.content
-            response_time = time.time() - start_time
+            # Check if question is in scope using advanced analysis
+            if not rag_result['is_relevant']:
+                response = "I'm sorry, but I can only help with questions related to Python programming, Artificial Intelligence, and our course information. Please ask me about Python, AI concepts, or our training program instead."
+                return {'result': {
+                    'response': response,
+                    'sources': [],
+                    'response_time': time.time() - start_time,
+                    'in_scope': False,
+                    'answer_source': 'refusal'
+                }}
             
+            # Prepare messages for OpenAI with enhanced context
+            memories = self._recall(user_message, session_id)
+            route = self._route(user_message, session_language, intent, intent_confidence)
             return {
-                'response': ai_response,
-                'sources': sources,
-                'response_time': response_time,
-                'in_scope': True,
-                'confidence': confidence,
-                'intents': intents,
+                'messages': [
+                    {"role": "system", "content": (
+                        enhanced_system_prompt + self._memory_context(memories)
+                        + length_instruction(route, session_language)
+                    )},
+                    {"role": "user", "content": user_message}
+                ],
+                'sources': [entry['title'] for entry in rag_result['relevant_entries']],
+                'confidence': rag_result['confidence'],
+                'intents': rag_result['intent_analysis']['intents'],
                 'recognized_intent': intent,
-                'intent_confidence': intent_confidence
+                'intent_confidence': intent_confidence,
+                'route': route,
+                'language': session_language
             }
+
+        # Fallback to basic implementation
+        if not self._check_scope(user_message, session_language):
+            return {'result': self._out_of_scope_result(session_language, start_time)}
+        relevant_knowledge = self._retrieve(user_message)
+        memories = self._recall(user_message, session_id)
+        return self._build_turn(user_message, session_language, intent, intent_confidence, relevant_knowledge, memories)
+
+    async def _aprepare_turn(self, user_message: str, session_id: str = None, language: str = 'en',
+                             start_time: float = None) -> Dict:
+        """Async _prepare_turn: the database and index stages run concurrently.
+
+        The session lookup, template and FAQ probes, retrieval and memory recall
+        start together, the probes speculatively with the requested language
+        (re-run if the session's differs). Results are taken in the sequential
+        precedence order (template, FAQ, scope, retrieval and memory), so the
+        first decisive answer returns at once and the stages still running are
+        cancelled.
+        """
+        start_time = start_time or time.time()
+        if self.rag_service:
+            return await database_sync_to_async(self._prepare_turn, thread_sensitive=False)(
+                user_message, session_id, language, start_time
+            )
+
+        def in_thread(stage, *args):
+            return asyncio.ensure_future(database_sync_to_async(stage, thread_sensitive=False)(*args))
+
+        intent, intent_confidence = self._recognize_intent_traced(user_message)
+        requested_language = (language or 'en').lower()
+        probe_args = (user_message, requested_language, intent, intent_confidence, start_time)
+        tasks = {
+            'session': in_thread(self._session_language, session_id, language),
+            'template': in_thread(self._template_result, *probe_args),
+            'faq': in_thread(self._faq_result, *probe_args),
+            'retrieval': in_thread(self._retrieve, user_message),
+            'memory': in_thread(self._recall, user_message, session_id),
+        }
+        try:
+            session_language = await tasks['session']
+            if session_language != requested_language:
+                probe_args = (user_message, session_language, intent, intent_confidence, start_time)
+                for name, stage in (('template', self._template_result), ('faq', self._faq_result)):
+                    tasks[name].cancel()
+                    tasks[name] = in_thread(stage, *probe_args)
+
+            for name in ('template', 'faq'):
+                result = await tasks[name]
+                if result is not None:
+                    return {'result': result}
+            if not self._check_scope(user_message, session_language):
+                return {'result': self._out_of_scope_result(session_language, start_time)}
+            relevant_knowledge = await tasks['retrieval']
+            memories = await tasks['memory']
+            return self._build_turn(
+                user_message, session_language, intent, intent_confidence, relevant_knowledge, memories
+            )
+        finally:
+            # Cancelled stages stop being awaited; a database call already running in its thread completes there
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+
+    def _completion_kwargs(self, turn: Dict) -> Dict:
+        """Model, budget and stop sequences of the turn's route (see model_routing.py)"""
+        config = get_runtime_config()
+        return {
+            'messages': turn['messages'],
+            'temperature': config.llm_temperature,
+            **completion_options(turn['route'], config, turn['language'])
+        }
+
+    def _completion_result(self, turn: Dict, completion_kwargs: Dict, completion, start_time: float) -> Dict:
+        response = completion.response
+        usage = getattr(response, 'usage', None)
+        return {
+            'response': response.choices[0].message.content,
+            'sources': turn['sources'],
+            'response_time': time.time() - start_time,
+            'in_scope': True,
+            'answer_source': 'llm',
+            'confidence': turn['confidence'],
+            'intents': turn['intents'],
+            'recognized_intent': turn['recognized_intent'],
+            'intent_confidence': turn['intent_confidence'],
+            'route': turn['route'].name,
+            'llm_model': completion_kwargs['model'],
+            'prompt_tokens': getattr(usage, 'prompt_tokens', None),
+            'completion_tokens': getattr(usage, 'completion_tokens', None),
+            'truncated': response.choices[0].finish_reason == 'length',
+            'hedge': completion.hedge
+        }
+
+    def _trace_completion(self, call, completion):
+        if completion.ttft is not None:
+            call.set('llm.ttft', round(completion.ttft, 4))
+        if completion.hedge:
+            call.set('llm.hedge_winner', completion.hedge)
+        usage = getattr(completion.response, 'usage', None)
+        if usage is not None:
+            call.set('llm.prompt_tokens', getattr(usage, 'prompt_tokens', 0))
+            call.set('llm.completion_tokens', getattr(usage, 'completion_tokens', 0))
+
+    def _error_result(self, error: Exception, start_time: float) -> Dict:
+        error_msg = str(error)
+        if isinstance(error, LLMDeadlineExceeded):
+            logger.warning("LLM call abandoned at the %ss turn deadline", getattr(settings, 'CHAT_LLM_DEADLINE_SECONDS', 30))
+            response = "I'm sorry, this is taking longer than expected. Please try again in a moment."
+        elif "invalid_api_key" in error_msg or "Incorrect API key" in error_msg:
+            response = "I'm currently experiencing an API configuration issue. Please contact the administrator to resolve this."
+        elif "rate_limit" in error_msg.lower():
+            response = "I'm currently experiencing high demand. Please try again in a few moments."
+        else:
+            response = f"I apologize, but I'm experiencing technical difficulties. Please try again later."
+        
+        return {
+            'response': response,
+            'sources': [],
+            'response_time': time.time() - start_time,
+            'in_scope': True,
+            'answer_source': 'error'
+        }
+
+    def generate_response(self, user_message: str, session_id: str = None, language: str = 'en') -> Dict:
+        """Generate AI response with advanced intent recognition and context awareness"""
+        start_time = time.time()
+        deadline = turn_deadline()
+        try:
+            turn = self._prepare_turn(user_message, session_id, language, start_time)
+            if 'result' in turn:
+                return turn['result']
+            
+            # Call OpenAI API; the pooled DB connection is not needed while waiting for it
+            release_connections()
+            completion_kwargs = self._completion_kwargs(turn)
+            with llm_slot(), span('llm.completion', model=completion_kwargs['model'], route=turn['route'].name) as call:
+                completion = complete(self.client, completion_kwargs, deadline)
+                self._trace_completion(call, completion)
+            return self._completion_result(turn, completion_kwargs, completion, start_time)
             
         except Exception as e:
-            error_msg = str(e)
-            if "invalid_api_key" in error_msg or "Incorrect API key" in error_msg:
-                response = "I'm currently experiencing an API configuration issue. Please contact the administrator to resolve this."
-            elif "rate_limit" in error_msg.lower():
-                response = "I'm currently experiencing high demand. Please try again in a few moments."
-            else:
-                response = f"I apologize, but I'm experiencing technical difficulties. Please try again later."
+            return self._error_result(e, start_time)
+
+    async def agenerate_response(self, user_message: str, session_id: str = None, language: str = 'en') -> Dict:
+        """Async variant of generate_response: pre-LLM stages run concurrently in worker threads, the LLM call is awaited"""
+        start_time = time.time()
+        deadline = turn_deadline()
+        try:
+            # Reload a changed configuration off the loop; the turn's stages then read the snapshot
+            await aget_runtime_config()
+            turn = await self._aprepare_turn(user_message, session_id, language, start_time)
+            if 'result' in turn:
+                return turn['result']
             
-            return {
-                'response': response,
-                'sources': [],
-                'response_time': time.time() - start_time,
-                'in_scope': True
-            }
+            completion_kwargs = self._completion_kwargs(turn)
+            with llm_slot(), span('llm.completion', model=completion_kwargs['model'], route=turn['route'].name) as call:
+                completion = await acomplete(get_async_client(), completion_kwargs, deadline)
+                self._trace_completion(call, completion)
+            return self._completion_result(turn, completion_kwargs, completion, start_time)
+            
+        except Exception as e:
+            return self._error_result(e, start_time)
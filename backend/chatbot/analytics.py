@@ -0,0 +1,326 @@
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import F, Min
+
+from .models import Message, MessageRollup, ProcessingCheckpoint, RouteRollup
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = 'message_rollups'
+BATCH_SIZE = 5000
+GRANULARITIES = ('hour', 'day')
+
+# Upper bounds (seconds) of the response-time histogram; the last slot counts everything slower
+RESPONSE_TIME_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0]
+
+COUNTER_FIELDS = [
+    'message_count', 'session_starts', 'in_scope_count', 'out_of_scope_count',
+    'helpful_count', 'unhelpful_count', 'response_time_count',
+    'llm_count', 'template_count', 'faq_count', 'refusal_count',
+]
+# Message.answer_source -> rollup counter; every source except 'llm' is served without a model call
+ANSWER_SOURCE_FIELDS = {
+    'llm': 'llm_count',
+    'template': 'template_count',
+    'faq': 'faq_count',
+    'refusal': 'refusal_count',
+}
+
+# RouteRollup counters, summed over the LLM replies of each model route
+ROUTE_COUNTER_FIELDS = ['call_count', 'truncated_count', 'hedged_count', 'hedge_win_count', 'prompt_tokens', 'completion_tokens']
+
+
+def bucket_start(timestamp, granularity: str):
+    """Truncate a timestamp to the start of its hourly or daily bucket"""
+    timestamp = timestamp.replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        timestamp = timestamp.replace(hour=0)
+    return timestamp
+
+
+def _histogram_slot(response_time: float) -> int:
+    for index, bound in enumerate(RESPONSE_TIME_BUCKETS):
+        if response_time <= bound:
+            return index
+    return len(RESPONSE_TIME_BUCKETS)
+
+
+def _empty_histogram() -> List[int]:
+    return [0] * (len(RESPONSE_TIME_BUCKETS) + 1)
+
+
+def _empty_aggregate() -> Dict:
+    aggregate = {field: 0 for field in COUNTER_FIELDS}
+    aggregate['response_time_sum'] = 0.0
+    aggregate['response_time_histogram'] = _empty_histogram()
+    return aggregate
+
+
+def _merge_histograms(left: List[int], right: List[int]) -> List[int]:
+    merged = _empty_histogram()
+    for histogram in (left, right):
+        for index, count in enumerate(histogram[:len(merged)]):
+            merged[index] += count
+    return merged
+
+
+def _empty_route_aggregate() -> Dict:
+    aggregate = {field: 0 for field in ROUTE_COUNTER_FIELDS}
+    aggregate['response_time_sum'] = 0.0
+    aggregate['response_time_histogram'] = _empty_histogram()
+    return aggregate
+
+
+def _aggregate_batch(messages: Iterable[Dict], first_message_ids: set) -> Dict:
+    aggregates = defaultdict(_empty_aggregate)
+    for message in messages:
+        for granularity in GRANULARITIES:
+            key = (
+                granularity,
+                bucket_start(message['timestamp'], granularity),
+                (message['session__language'] or 'en').lower(),
+                message['message_type'],
+            )
+            aggregate = aggregates[key]
+            aggregate['message_count'] += 1
+            if message['id'] in first_message_ids:
+                aggregate['session_starts'] += 1
+            if message['in_scope'] is True:
+                aggregate['in_scope_count'] += 1
+            elif message['in_scope'] is False:
+                aggregate['out_of_scope_count'] += 1
+            if message['is_helpful'] is True:
+                aggregate['helpful_count'] += 1
+            elif message['is_helpful'] is False:
+                aggregate['unhelpful_count'] += 1
+            if message['answer_source'] in ANSWER_SOURCE_FIELDS:
+                aggregate[ANSWER_SOURCE_FIELDS[message['answer_source']]] += 1
+            if message['response_time'] is not None:
+                aggregate['response_time_count'] += 1
+                aggregate['response_time_sum'] += message['response_time']
+                aggregate['response_time_histogram'][_histogram_slot(message['response_time'])] += 1
+    return aggregates
+
+
+def _aggregate_routes(messages: Iterable[Dict]) -> Dict:
+    aggregates = defaultdict(_empty_route_aggregate)
+    for message in messages:
+        if not message['route']:
+            continue
+        for granularity in GRANULARITIES:
+            key = (
+                granularity,
+                bucket_start(message['timestamp'], granularity),
+                message['route'],
+                message['llm_model'],
+                (message['session__language'] or 'en').lower(),
+            )
+            aggregate = aggregates[key]
+            aggregate['call_count'] += 1
+            if message['truncated']:
+                aggregate['truncated_count'] += 1
+            if message['hedge']:
+                aggregate['hedged_count'] += 1
+                if message['hedge'] == 'hedge':
+                    aggregate['hedge_win_count'] += 1
+            aggregate['prompt_tokens'] += message['prompt_tokens'] or 0
+            aggregate['completion_tokens'] += message['completion_tokens'] or 0
+            if message['response_time'] is not None:
+                aggregate['response_time_sum'] += message['response_time']
+                aggregate['response_time_histogram'][_histogram_slot(message['response_time'])] += 1
+    return aggregates
+
+
+def update_rollups(batch_size: int = BATCH_SIZE) -> Dict:
+    """Fold every message above the high-water mark into the rollup rows"""
+    stats = {'messages': 0, 'rows': 0}
+    while True:
+        with transaction.atomic():
+            checkpoint, _ = ProcessingCheckpoint.objects.select_for_update().get_or_create(name=CHECKPOINT_NAME)
+            messages = list(
+                Message.objects
+                .filter(id__gt=checkpoint.last_message_id)
+                .order_by('id')
+                .values('id', 'session_id', 'message_type', 'timestamp', 'in_scope',
+                        'is_helpful', 'response_time', 'answer_source', 'session__language',
+                        'route', 'llm_model', 'prompt_tokens', 'completion_tokens', 'truncated', 'hedge')
+                [:batch_size]
+            )
+            if not messages:
+                break
+
+            session_ids = {message['session_id'] for message in messages}
+            first_message_ids = set(
+                Message.objects
+                .filter(session_id__in=session_ids)
+                .values('session_id')
+                .annotate(first_id=Min('id'))
+                .values_list('first_id', flat=True)
+            )
+
+            aggregates = _aggregate_batch(messages, first_message_ids)
+            for (granularity, start, language, message_type), aggregate in aggregates.items():
+                rollup, _ = MessageRollup.objects.select_for_update().get_or_create(
+                    granularity=granularity,
+                    bucket_start=start,
+                    language=language,
+                    message_type=message_type,
+                    defaults={'response_time_histogram': _empty_histogram()},
+                )
+                for field in COUNTER_FIELDS:
+                    setattr(rollup, field, getattr(rollup, field) + aggregate[field])
+                rollup.response_time_sum += aggregate['response_time_sum']
+                rollup.response_time_histogram = _merge_histograms(
+                    rollup.response_time_histogram, aggregate['response_time_histogram']
+                )
+                rollup.save()
+
+            route_aggregates = _aggregate_routes(messages)
+            for (granularity, start, route, llm_model, language), aggregate in route_aggregates.items():
+                route_rollup, _ = RouteRollup.objects.select_for_update().get_or_create(
+                    granularity=granularity,
+                    bucket_start=start,
+                    route=route,
+                    llm_model=llm_model,
+                    language=language,
+                    defaults={'response_time_histogram': _empty_histogram()},
+                )
+                for field in ROUTE_COUNTER_FIELDS:
+                    setattr(route_rollup, field, getattr(route_rollup, field) + aggregate[field])
+                route_rollup.response_time_sum += aggregate['response_time_sum']
+                route_rollup.response_time_histogram = _merge_histograms(
+                    route_rollup.response_time_histogram, aggregate['response_time_histogram']
+                )
+                route_rollup.save()
+
+            checkpoint.last_message_id = messages[-1]['id']
+            checkpoint.save()
+
+        stats['messages'] += len(messages)
+        stats['rows'] += len(aggregates) + len(route_aggregates)
+    return stats
+
+
+def record_rating_change(message: Message, previous: Optional[bool]):
+    """Keep helpful counts right for messages that were rated after being rolled up"""
+    if message.is_helpful == previous:
+        return
+    with transaction.atomic():
+        checkpoint = (
+            ProcessingCheckpoint.objects.select_for_update()
+            .filter(name=CHECKPOINT_NAME)
+            .first()
+        )
+        if checkpoint is None or message.id > checkpoint.last_message_id:
+            # Not rolled up yet; the next run reads the current rating
+            return
+
+        deltas = {}
+        for value, sign in ((previous, -1), (message.is_helpful, 1)):
+            if value is True:
+                deltas['helpful_count'] = deltas.get('helpful_count', 0) + sign
+            elif value is False:
+                deltas['unhelpful_count'] = deltas.get('unhelpful_count', 0) + sign
+
+        language = (message.session.language or 'en').lower()
+        for granularity in GRANULARITIES:
+            MessageRollup.objects.filter(
+                granularity=granularity,
+                bucket_start=bucket_start(message.timestamp, granularity),
+                language=language,
+                message_type=message.message_type,
+            ).update(**{field: F(field) + delta for field, delta in deltas.items()})
+
+
+def estimate_percentile(histogram: List[int], quantile: float) -> Optional[float]:
+    """Estimate a response-time percentile by interpolating inside the histogram bucket"""
+    total = sum(histogram)
+    if not total:
+        return None
+    target = quantile * total
+    cumulative = 0
+    for index, count in enumerate(histogram):
+        if count and cumulative + count >= target:
+            lower = RESPONSE_TIME_BUCKETS[index - 1] if index > 0 else 0.0
+            if index >= len(RESPONSE_TIME_BUCKETS):
+                return lower
+            upper = RESPONSE_TIME_BUCKETS[index]
+            return lower + (upper - lower) * (target - cumulative) / count
+        cumulative += count
+    return RESPONSE_TIME_BUCKETS[-1]
+
+
+def summarize(rollups: Iterable[MessageRollup]) -> Dict:
+    """Combine rollup rows into the headline numbers served by the analytics endpoint"""
+    totals = _empty_aggregate()
+    for rollup in rollups:
+        for field in COUNTER_FIELDS:
+            totals[field] += getattr(rollup, field)
+        totals['response_time_sum'] += rollup.response_time_sum
+        totals['response_time_histogram'] = _merge_histograms(
+            totals['response_time_histogram'], rollup.response_time_histogram
+        )
+
+    rated = totals['helpful_count'] + totals['unhelpful_count']
+    scoped = totals['in_scope_count'] + totals['out_of_scope_count']
+    histogram = totals['response_time_histogram']
+    answered = sum(totals[field] for field in ANSWER_SOURCE_FIELDS.values())
+    return {
+        'message_count': totals['message_count'],
+        'session_starts': totals['session_starts'],
+        'messages_per_session': (
+            totals['message_count'] / totals['session_starts'] if totals['session_starts'] else None
+        ),
+        'helpful_ratio': totals['helpful_count'] / rated if rated else None,
+        'in_scope_rate': totals['in_scope_count'] / scoped if scoped else None,
+        'answer_sources': {source: totals[field] for source, field in ANSWER_SOURCE_FIELDS.items()},
+        'model_free_rate': (answered - totals['llm_count']) / answered if answered else None,
+        'template_rate': totals['template_count'] / answered if answered else None,
+        'response_time_avg': (
+            totals['response_time_sum'] / totals['response_time_count'] if totals['response_time_count'] else None
+        ),
+        'response_time_p50': estimate_percentile(histogram, 0.50),
+        'response_time_p95': estimate_percentile(histogram, 0.95),
+        'response_time_p99': estimate_percentile(histogram, 0.99),
+        'response_time_histogram': {
+            'bounds': RESPONSE_TIME_BUCKETS,
+            'counts': histogram,
+        },
+    }
+
+
+def summarize_routes(route_rollups: Iterable[RouteRollup]) -> Dict:
+    """Latency, token usage and truncation per model route, for tuning the routing table"""
+    totals = defaultdict(_empty_route_aggregate)
+    models = defaultdict(set)
+    for rollup in route_rollups:
+        route = totals[rollup.route]
+        for field in ROUTE_COUNTER_FIELDS:
+            route[field] += getattr(rollup, field)
+        route['response_time_sum'] += rollup.response_time_sum
+        route['response_time_histogram'] = _merge_histograms(
+            route['response_time_histogram'], rollup.response_time_histogram
+        )
+        models[rollup.route].add(rollup.llm_model)
+
+    summary = {}
+    for name, route in sorted(totals.items()):
+        calls = route['call_count']
+        histogram = route['response_time_histogram']
+        summary[name] = {
+            'calls': calls,
+            'models': sorted(models[name]),
+            'prompt_tokens_avg': route['prompt_tokens'] / calls if calls else None,
+            'completion_tokens_avg': route['completion_tokens'] / calls if calls else None,
+            'truncated_rate': route['truncated_count'] / calls if calls else None,
+            'hedge_rate': route['hedged_count'] / calls if calls else None,
+            # Share of hedged calls in which the second request finished first
+            'hedge_win_rate': route['hedge_win_count'] / route['hedged_count'] if route['hedged_count'] else None,
+            'response_time_avg': route['response_time_sum'] / sum(histogram) if sum(histogram) else None,
+            'response_time_p50': estimate_percentile(histogram, 0.50),
+            'response_time_p95': estimate_percentile(histogram, 0.95),
+        }
+    return summary
@@ -0,0 +1,322 @@
+"""
+Deterministic answers for structured lookups.
+
+Questions like "what is your Telegram number?" or "هزینه کلاس خصوصی چقدر است؟"
+only restate a fact, so they are answered from typed facts stored on knowledge
+base entries (`KnowledgeBaseEntry.facts`) with fixed English/Persian templates
+instead of a completion. A template matches when every one of its cue groups
+occurs in the normalized question; its confidence is the share of question
+tokens explained by cues and filler words. Anything asking for reasoning, long
+questions, questions with unexplained content words and questions naming a
+unit or currency the facts are not stored in stay below
+CHAT_ANSWER_TEMPLATE_MIN_CONFIDENCE and fall through to the LLM.
+"""
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+
+from .text_normalization import is_persian, normalize_text
+
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+PHONE_RE = re.compile(r'^\+?[0-9][0-9 ()-]{5,}$')
+LATIN_RE = re.compile('[a-zA-Z]')
+
+
+def _money(value) -> str:
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError('expected a number')
+    if amount < 0:
+        raise ValueError('expected a non-negative amount')
+    return f'{amount.normalize():f}'
+
+
+def _count(value) -> str:
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ValueError('expected a non-negative integer')
+    return str(value)
+
+
+def _pattern(regex, label):
+    def check(value) -> str:
+        if not isinstance(value, str) or not regex.match(value.strip()):
+            raise ValueError(f'expected {label}')
+        return value.strip()
+    return check
+
+
+def _text(value) -> str:
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError('expected non-empty text')
+    return value.strip()
+
+
+# Fact type -> formatter that validates a stored value and renders it for templates
+FACT_TYPES = {
+    'phone': _pattern(PHONE_RE, 'a phone number'),
+    'email': _pattern(EMAIL_RE, 'an email address'),
+    'url': _pattern(re.compile(r'^https?://\S+$'), 'an http(s) URL'),
+    'text': _text,
+    'money': _money,
+    'count': _count,
+}
+
+# Known fact keys and their types; prices are USD per semester
+FACTS = {
+    'telegram': 'phone',
+    'email': 'email',
+    'linkedin': 'url',
+    'youtube': 'url',
+    'instagram': 'text',
+    'reply_hours': 'count',
+    'private_class_price': 'money',
+    'group_class_price': 'money',
+    'refund_days': 'count',
+    'session_minutes': 'count',
+    'sessions_per_semester': 'count',
+    'semesters': 'count',
+    'program_months': 'count',
+}
+
+
+def validate_facts(facts: Dict):
+    """Raise ValidationError unless `facts` maps known keys to values of their type"""
+    if not isinstance(facts, dict):
+        raise ValidationError({'facts': 'Facts must be a JSON object.'})
+    errors = []
+    for key, value in facts.items():
+        if key not in FACTS:
+            errors.append(f'Unknown fact "{key}" (known: {", ".join(sorted(FACTS))}).')
+            continue
+        try:
+            FACT_TYPES[FACTS[key]](value)
+        except ValueError as error:
+            errors.append(f'{key}: {error}.')
+    if errors:
+        raise ValidationError({'facts': errors})
+
+
+def _cues(*phrases: str) -> List[Tuple[str, ...]]:
+    """Cue phrases as normalized token tuples"""
+    return [tuple(normalize_text(phrase).split()) for phrase in phrases]
+
+
+PRICE_CUES = _cues(
+    'price', 'prices', 'pricing', 'cost', 'costs', 'fee', 'fees', 'tuition', 'how much',
+    'هزینه', 'قیمت', 'شهریه', 'چقدر', 'چقدره', 'چنده',
+)
+
+
+class Template(NamedTuple):
+    name: str
+    requires: List[List[Tuple[str, ...]]]
+    answers: Dict[str, str]
+    subsumes: Tuple[str, ...] = ()
+
+
+TEMPLATES = [
+    Template(
+        'contact',
+        [_cues('contact', 'reach', 'get in touch', 'تماس', 'ارتباط')],
+        {
+            'en': 'You can reach Matin Kafashian on Telegram at {telegram} or by email at {email}. '
+                  'Replies usually come within {reply_hours} hours.',
+            'fa': 'برای ارتباط با متین کفاشیان: تلگرام {telegram} و ایمیل {email}. '
+                  'معمولاً ظرف {reply_hours} ساعت پاسخ داده می‌شود.',
+        },
+    ),
+    Template(
+        'telegram',
+        [_cues('telegram', 'تلگرام')],
+        {
+            'en': 'You can reach Matin Kafashian on Telegram at {telegram}.',
+            'fa': 'شماره تلگرام متین کفاشیان: {telegram}',
+        },
+        subsumes=('contact',),
+    ),
+    Template(
+        'email',
+        [_cues('email', 'e mail', 'mail', 'ایمیل')],
+        {
+            'en': 'You can email Matin Kafashian at {email}.',
+            'fa': 'ایمیل متین کفاشیان: {email}',
+        },
+        subsumes=('contact',),
+    ),
+    Template(
+        'social',
+        [_cues('instagram', 'youtube', 'linkedin', 'social media', 'اینستاگرام', 'یوتیوب', 'لینکدین')],
+        {
+            'en': 'LinkedIn: {linkedin}, Instagram: {instagram}, YouTube: {youtube}',
+            'fa': 'لینکدین: {linkedin}، اینستاگرام: {instagram}، یوتیوب: {youtube}',
+        },
+        subsumes=('contact',),
+    ),
+    Template(
+        'pricing',
+        [PRICE_CUES],
+        {
+            'en': 'Private classes are ${private_class_price} per semester and group classes are '
+                  '${group_class_price} per semester.',
+            'fa': 'هزینه کلاس خصوصی {private_class_price} دلار و کلاس گروهی {group_class_price} دلار برای هر ترم است.',
+        },
+    ),
+    Template(
+        'private_price',
+        [_cues('private', 'one on one', 'خصوصی'), PRICE_CUES],
+        {
+            'en': 'Private classes are ${private_class_price} per semester.',
+            'fa': 'هزینه کلاس خصوصی {private_class_price} دلار برای هر ترم است.',
+        },
+        subsumes=('pricing',),
+    ),
+    Template(
+        'group_price',
+        [_cues('group', 'گروهی'), PRICE_CUES],
+        {
+            'en': 'Group classes are ${group_class_price} per semester.',
+            'fa': 'هزینه کلاس گروهی {group_class_price} دلار برای هر ترم است.',
+        },
+        subsumes=('pricing',),
+    ),
+    Template(
+        'refund',
+        [_cues('refund', 'refunds', 'refund policy', 'money back', 'بازگشت وجه', 'بازپرداخت', 'پس گرفتن پول')],
+        {
+            'en': 'You can request a refund within the first {refund_days} days if you are not satisfied.',
+            'fa': 'در صورت نارضایتی می‌توانید تا {refund_days} روز اول درخواست بازگشت وجه بدهید.',
+        },
+    ),
+    Template(
+        'session_length',
+        [
+            _cues('session', 'sessions', 'class', 'classes', 'lesson', 'lessons', 'جلسه', 'کلاس'),
+            _cues('how long', 'length', 'duration', 'minutes', 'hours', 'مدت', 'چند دقیقه', 'چند ساعت', 'طول'),
+        ],
+        {
+            'en': 'Each session is {session_minutes} minutes, with {sessions_per_semester} sessions per semester.',
+            'fa': 'هر جلسه {session_minutes} دقیقه است و هر ترم {sessions_per_semester} جلسه دارد.',
+        },
+    ),
+    Template(
+        'program_duration',
+        [
+            _cues('course', 'program', 'programme', 'دوره'),
+            _cues('how long', 'length', 'duration', 'months', 'take', 'مدت', 'چند ماه', 'طول', 'طول میکشد', 'طول میکشه'),
+        ],
+        {
+            'en': 'The program takes {program_months} months: {semesters} semesters of '
+                  '{sessions_per_semester} sessions each.',
+            'fa': 'دوره {program_months} ماه طول می‌کشد: {semesters} ترم و هر ترم {sessions_per_semester} جلسه.',
+        },
+        subsumes=('session_length',),
+    ),
+]
+
+# Words that carry no content of their own in a lookup question
+FILLER_WORDS = set(normalize_text(' '.join([
+    'what whats is are was the a an your you my i me to of for in on at by how much many long does do can could',
+    'please tell give send share know want would like it its this that there any about with and or per each one',
+    'get find hi hello thanks thank number id address info information details class classes course',
+    'semester account official current s vs versus policy',
+    'چیست چیه چی است هست هستش شما من به از را رو برای در و یا چقدر چند چه کجا چطور چطوری چگونه لطفا',
+    'میخواستم بدونم بگید بگویید بدید بفرمایید هر یک این اون ان سلام ممنون مرسی شماره ادرس اطلاعات',
+    'دارید دارین کلاس دوره ترم با بگیرم بگیریم کشد',
+])).split())
+# Questions asking for reasoning or exceptions need the LLM even when they mention a fact
+BLOCKER_WORDS = set(normalize_text(' '.join([
+    'why should recommend better best worth explain compare if but discount discounts installment installments',
+    'cheaper instead except',
+    'چرا بهتر بهترین توصیه مقایسه اگر اما ولی تخفیف قسط قسطی ارزان',
+])).split())
+# Units and currencies no template answers in (prices are stored in USD, durations in minutes/months);
+# a question asking for one needs a conversion, so the fact as stored would be a wrong answer
+OTHER_UNIT_WORDS = set(normalize_text(' '.join([
+    'euro euros eur pound pounds gbp sterling lira liras yen rupee rupees toman tomans rial rials week weeks year years',
+    'یورو پوند لیر تومان تومن ریال هفته سال',
+])).split())
+OTHER_UNIT_SYMBOLS_RE = re.compile('[€£¥₺₹﷼]')
+MAX_COMBINED = 2
+
+
+class TemplateAnswer(NamedTuple):
+    response: str
+    templates: List[str]
+    confidence: float
+    sources: List[str]
+
+
+def _find(tokens: List[str], cue: Tuple[str, ...]) -> List[int]:
+    """Indices covered by every occurrence of a cue phrase"""
+    covered = []
+    for start in range(len(tokens) - len(cue) + 1):
+        if tuple(tokens[start:start + len(cue)]) == cue:
+            covered.extend(range(start, start + len(cue)))
+    return covered
+
+
+def _match(template: Template, tokens: List[str]) -> Optional[set]:
+    covered = set()
+    for group in template.requires:
+        group_covered = set()
+        for cue in group:
+            group_covered.update(_find(tokens, cue))
+        if not group_covered:
+            return None
+        covered |= group_covered
+    return covered
+
+
+def answer(question: str, language: str, facts: Dict[str, Tuple[object, str]]) -> Optional[TemplateAnswer]:
+    """Templated answer for a lookup question, or None when no template applies
+
+    `facts` maps fact keys to (value, source entry title), see KnowledgeIndex.facts().
+    """
+    tokens = normalize_text(question).split()
+    if not tokens or BLOCKER_WORDS.intersection(tokens):
+        return None
+
+    matches = {}
+    for template in TEMPLATES:
+        covered = _match(template, tokens)
+        if covered is not None:
+            matches[template.name] = (template, covered)
+    for template, _ in list(matches.values()):
+        for name in template.subsumes:
+            matches.pop(name, None)
+    if not matches or len(matches) > MAX_COMBINED:
+        return None
+
+    covered = set()
+    for _, template_covered in matches.values():
+        covered |= template_covered
+    explained = sum(1 for index, token in enumerate(tokens) if index in covered or token in FILLER_WORDS)
+    confidence = explained / len(tokens)
+    if OTHER_UNIT_WORDS.intersection(tokens) or OTHER_UNIT_SYMBOLS_RE.search(question):
+        confidence = 0.0
+
+    # Answer in the script the question was typed in; only script-less questions follow the session language
+    if is_persian(question):
+        language = 'fa'
+    elif LATIN_RE.search(question):
+        language = 'en'
+    else:
+        language = 'fa' if (language or 'en').lower() == 'fa' else 'en'
+    parts, sources = [], []
+    for template, _ in matches.values():
+        values = {}
+        for key in re.findall(r'{(\w+)}', template.answers[language]):
+            if key not in facts:
+                return None
+            value, source = facts[key]
+            try:
+                values[key] = FACT_TYPES[FACTS[key]](value)
+            except ValueError:
+                return None
+            if source not in sources:
+                sources.append(source)
+        parts.append(template.answers[language].format(**values))
+    return TemplateAnswer(' '.join(parts), list(matches), round(confidence, 3), sources)
@@ -0,0 +1,195 @@
+"""
+Async versions of the chat endpoints.
+
+They return the same payloads as the DRF views in views.py but await the
+database and the LLM, so an ASGI worker keeps serving other requests while a
+reply is being generated. Enabled with CHAT_ASYNC_VIEWS (see urls.py).
+"""
+import json
+import uuid
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .admission import acheck_admission, client_ip
+from .ai_service import get_ai_service, reply_fields
+from .analytics import record_rating_change
+from .db_router import read_replica, session_key
+from .fast_serializers import serialize_session, serialize_sessions
+from .memory import remember_exchange
+from .models import ChatSession, Message
+from .renderers import dumps_json
+from .tracing import current_context
+from .serializers import ChatMessageSerializer, ChatResponseSerializer, ChatSessionSerializer, RatingSerializer
+
+
+def json_response(data, status=200):
+    return HttpResponse(dumps_json(data), status=status, content_type='application/json')
+
+
+def not_found():
+    return json_response({'detail': 'Not found.'}, status=404)
+
+
+def parse_json_body(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+
+
+def not_an_object():
+    return json_response({'detail': 'Expected a JSON object.'}, status=400)
+
+
+@csrf_exempt
+@require_POST
+async def send_message(request):
+    """Send a message to the chatbot and get response"""
+    data = parse_json_body(request)
+    if data is None:
+        return json_response({'detail': 'JSON parse error'}, status=400)
+    serializer = ChatMessageSerializer(data=data)
+    if not serializer.is_valid():
+        return json_response(serializer.errors, status=400)
+
+    # Rejected turns are answered before any DB or LLM work
+    decision = await acheck_admission(data.get('session_id'), client_ip(request.META))
+    if not decision.allowed:
+        response = json_response(decision.payload(), status=decision.status_code)
+        response['Retry-After'] = decision.retry_after_header
+        return response
+
+    user_message = serializer.validated_data['message']
+    session_id = serializer.validated_data.get('session_id')
+    language = serializer.validated_data.get('language', 'en')
+
+    # Get or create session
+    if session_id:
+        try:
+            session = await ChatSession.objects.aget(session_id=session_id)
+            # Update session language if provided
+            if language != 'en':
+                session.language = language
+                await session.asave()
+        except ChatSession.DoesNotExist:
+            session = await ChatSession.objects.acreate(session_id=session_id, language=language)
+    else:
+        session = await ChatSession.objects.acreate(session_id=str(uuid.uuid4()), language=language)
+
+    # Save user message
+    user_msg = await Message.objects.acreate(
+        session=session,
+        message_type='user',
+        content=user_message
+    )
+
+    if serializer.validated_data.get('async_job') or getattr(settings, 'CHAT_GENERATION_MODE', 'inline') == 'celery':
+        # Imported on demand so web workers that never queue jobs do not load Celery
+        from .tasks import generate_response_task
+        job = await sync_to_async(generate_response_task.delay)(
+            session.session_id, user_message, language, trace_context=current_context(), user_message_id=user_msg.id
+        )
+        return json_response({
+            'job_id': job.id,
+            'status': 'queued',
+            'session_id': session.session_id,
+            'message_id': user_msg.id
+        }, status=202)
+
+    # Get AI response
+    ai_service = get_ai_service()
+    ai_response = await ai_service.agenerate_response(user_message, session.session_id, language)
+
+    # Save AI response
+    ai_msg = await Message.objects.acreate(
+        session=session,
+        message_type='assistant',
+        content=ai_response['response'],
+        **reply_fields(ai_response)
+    )
+    await database_sync_to_async(remember_exchange)(user_msg, ai_msg, ai_response)
+
+    response_serializer = ChatResponseSerializer({
+        'response': ai_response['response'],
+        'session_id': session.session_id,
+        'message_id': ai_msg.id,
+        'response_time': ai_response['response_time'],
+        'sources': ai_response.get('sources', [])
+    })
+    return json_response(response_serializer.data)
+
+
+@require_GET
+@read_replica(session_key)
+async def get_session(request, session_id):
+    """Get chat session with all messages"""
+    if getattr(settings, 'CHAT_FAST_SERIALIZATION', False):
+        data = await sync_to_async(serialize_session)(session_id)
+        return json_response(data) if data is not None else not_found()
+    try:
+        session = await ChatSession.objects.prefetch_related('messages').aget(session_id=session_id)
+    except ChatSession.DoesNotExist:
+        return not_found()
+    return json_response(ChatSessionSerializer(session).data)
+
+
+@csrf_exempt
+@require_POST
+async def create_session(request):
+    """Create a new chat session"""
+    data = parse_json_body(request)
+    if not isinstance(data, dict):
+        return not_an_object()
+    preferred_language = data.get('language', 'en')
+    if preferred_language not in ['en', 'fa']:
+        preferred_language = 'en'
+    session = await ChatSession.objects.acreate(
+        session_id=str(uuid.uuid4()),
+        context_window={},
+        conversation_summary="",
+        language=preferred_language
+    )
+    data = await sync_to_async(lambda: ChatSessionSerializer(session).data)()
+    return json_response(data, status=201)
+
+
+@require_GET
+@read_replica()
+async def get_sessions(request):
+    """Get all chat sessions"""
+    if getattr(settings, 'CHAT_FAST_SERIALIZATION', False):
+        queryset = ChatSession.objects.all().order_by('-created_at')
+        return json_response(await sync_to_async(serialize_sessions)(queryset))
+    sessions = [
+        session async for session in
+        ChatSession.objects.all().order_by('-created_at').prefetch_related('messages')
+    ]
+    return json_response(ChatSessionSerializer(sessions, many=True).data)
+
+
+@csrf_exempt
+@require_POST
+async def rate_message(request, message_id):
+    """Rate a message as helpful or not helpful"""
+    try:
+        message = await Message.objects.select_related('session').aget(id=message_id)
+    except Message.DoesNotExist:
+        return not_found()
+    data = parse_json_body(request)
+    if not isinstance(data, dict):
+        return not_an_object()
+    serializer = RatingSerializer(data=data)
+
+    if serializer.is_valid():
+        previous = message.is_helpful
+        message.is_helpful = serializer.validated_data['is_helpful']
+        await message.asave()
+        await sync_to_async(record_rating_change)(message, previous)
+        return json_response({'status': 'success'})
+
+    return json_response(serializer.errors, status=400)
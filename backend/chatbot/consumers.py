@@ -1,8 +1,19 @@
+import asyncio
 import json
+import threading
+import time
+from django.conf import settings
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from .models import ChatSession, Message
-from .ai_service import AIService
+from .admission import acheck_admission, scope_client_ip
+from .ai_service import get_ai_service, reply_fields
+from .delivery import SessionDelivery
+from .memory import remember_exchange
+from .tracing import span
+
+# Close code sent when a socket stays idle for longer than CHAT_WS_IDLE_TIMEOUT
+IDLE_CLOSE_CODE = 4000
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
@@ -10,15 +21,34 @@ class ChatConsumer(AsyncWebsocketConsumer):
         self.session_id = self.scope['url_route']['kwargs']['session_id']
         self.room_group_name = f'chat_{self.session_id}'
 
+        # Per-connection flow control: turns run one at a time, at most max_pending are accepted
+        self.max_pending = getattr(settings, 'CHAT_WS_MAX_PENDING', 2)
+        self.idle_timeout = getattr(settings, 'CHAT_WS_IDLE_TIMEOUT', 300)
+        self.turn_lock = asyncio.Lock()
+        self.pending_turns = {}
+        self.last_activity = time.monotonic()
+
         # Join room group
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
 
+        self.delivery = SessionDelivery(self, self.session_id, self.room_group_name)
+        await self.delivery.join()
+
         await self.accept()
+        self.idle_watcher = asyncio.ensure_future(self.watch_idle()) if self.idle_timeout else None
 
     async def disconnect(self, close_code):
+        # Abandoned turns must not keep spending LLM quota
+        self.cancel_turns()
+        if getattr(self, 'idle_watcher', None):
+            self.idle_watcher.cancel()
+
+        if getattr(self, 'delivery', None):
+            await self.delivery.leave()
+
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
@@ -27,8 +57,46 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     # Receive message from WebSocket
     async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
-        message = text_data_json['message']
+        self.last_activity = time.monotonic()
+        try:
+            text_data_json = json.loads(text_data)
+        except ValueError:
+            await self.send_control('error', 'Invalid JSON frame.')
+            return
+
+        if text_data_json.get('type') == 'cancel':
+            cancelled = self.cancel_turns()
+            await self.send_control('cancelled', f'Cancelled {cancelled} pending message(s).')
+            return
+
+        message = text_data_json.get('message')
+        if not message:
+            await self.send_control('error', 'The message field is required.')
+            return
+
+        if len(self.pending_turns) >= self.max_pending:
+            await self.send_control('busy', 'Still working on your previous message. Please wait for the reply.')
+            return
+
+        decision = await acheck_admission(self.session_id, scope_client_ip(self.scope))
+        if not decision.allowed:
+            await self.send_control('busy', decision.message)
+            return
+
+        # Run the turn in the background so cancel frames are read while it is in progress
+        cancel_event = threading.Event()
+        task = asyncio.ensure_future(self.handle_turn(message, cancel_event))
+        self.pending_turns[task] = cancel_event
+        task.add_done_callback(lambda done: self.pending_turns.pop(done, None))
+
+    async def handle_turn(self, message, cancel_event):
+        async with self.turn_lock:
+            with span('ws.turn', session_id=self.session_id) as turn_span:
+                await self.run_turn(message, cancel_event, turn_span)
+
+    async def run_turn(self, message, cancel_event, turn_span):
+        if cancel_event.is_set():
+            return
 
         # Get or create session
         session = await self.get_or_create_session()
@@ -36,9 +104,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
         # Save user message
         user_message = await self.save_message(session, 'user', message)
 
-        # Send user message to room group
-        await self.channel_layer.group_send(
-            self.room_group_name,
+        # Send user message to this socket and any other socket of the session
+        await self.delivery.publish(
             {
                 'type': 'chat_message',
                 'message': message,
@@ -49,23 +116,54 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
         # Get AI response
         ai_response = await self.get_ai_response(message)
+        if cancel_event.is_set():
+            return
 
         # Save AI response
-        ai_message = await self.save_message(session, 'assistant', ai_response['response'])
+        ai_message = await self.save_message(
+            session, 'assistant', ai_response['response'], **reply_fields(ai_response)
+        )
+        await database_sync_to_async(remember_exchange)(user_message, ai_message, ai_response)
 
-        # Send AI response to room group
-        await self.channel_layer.group_send(
-            self.room_group_name,
+        # Send AI response to this socket and any other socket of the session
+        await self.delivery.publish(
             {
                 'type': 'chat_message',
                 'message': ai_response['response'],
                 'message_type': 'assistant',
                 'message_id': ai_message.id,
                 'response_time': ai_response['response_time'],
-                'sources': ai_response.get('sources', [])
+                'sources': ai_response.get('sources', []),
+                'trace_id': turn_span.trace_id
             }
         )
 
+    def cancel_turns(self):
+        """Cancel queued and running turns; cancelling a running turn's task cancels its LLM request"""
+        turns = list(self.pending_turns.items())
+        for task, cancel_event in turns:
+            cancel_event.set()
+            task.cancel()
+        return len(turns)
+
+    async def watch_idle(self):
+        while True:
+            await asyncio.sleep(min(self.idle_timeout, 30))
+            idle_for = time.monotonic() - self.last_activity
+            if idle_for >= self.idle_timeout and not self.pending_turns:
+                await self.close(code=IDLE_CLOSE_CODE)
+                return
+
+    async def send_control(self, frame_type, message):
+        await self.send(text_data=json.dumps({
+            'type': frame_type,
+            'message': message
+        }))
+
+    # Another socket of the session connected or disconnected
+    async def presence_update(self, event):
+        self.delivery.update(event['count'])
+
     # Receive message from room group
     async def chat_message(self, event):
         # Send message to WebSocket
@@ -74,7 +172,9 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'message_type': event['message_type'],
             'message_id': event['message_id'],
             'response_time': event.get('response_time'),
-            'sources': event.get('sources', [])
+            'sources': event.get('sources', []),
+            'job_id': event.get('job_id'),
+            'trace_id': event.get('trace_id')
         }))
 
     @database_sync_to_async
@@ -86,14 +186,14 @@ class ChatConsumer(AsyncWebsocketConsumer):
         return session
 
     @database_sync_to_async
-    def save_message(self, session, message_type, content):
+    def save_message(self, session, message_type, content, **fields):
         return Message.objects.create(
             session=session,
             message_type=message_type,
-            content=content
+            content=content,
+            **fields
         )
 
-    @database_sync_to_async
-    def get_ai_response(self, message):
-        ai_service = AIService()
-        return ai_service.generate_response(message, self.session_id)
+    async def get_ai_response(self, message):
+        # The LLM request is awaited on this loop, so cancelling the turn's task closes it at once
+        return await get_ai_service().agenerate_response(message, self.session_id)
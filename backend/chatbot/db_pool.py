@@ -0,0 +1,115 @@
+"""
+PostgreSQL connection pool helpers and metrics.
+
+With CHAT_DB_POOL (see settings.py) every PostgreSQL alias uses Django's
+psycopg pool: one bounded pool per process and alias, shared by all threads,
+instead of a persistent connection per thread. Closing a connection returns
+it to the pool, so a thread holds one only while it runs queries:
+
+- `database_sync_to_async` (consumers, async views) closes old connections
+  before and after every call, so a WebSocket holds no connection between
+  messages, and nothing is left behind when it disconnects.
+- Sync views return theirs when the request finishes.
+- A chat turn returns its connection before the LLM call (`release_connections`),
+  so slow or streamed completions do not pin pool slots.
+
+A thread that finds the pool exhausted waits up to CHAT_DB_POOL_TIMEOUT
+seconds and then gets an OperationalError. `pool_stats` reports occupancy and
+waits per alias (health endpoint), and a daemon thread logs a warning for
+every CHAT_DB_POOL_LOG_SECONDS interval in which requests had to wait.
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def pooled_aliases() -> List[str]:
+    return [alias for alias, database in settings.DATABASES.items() if database.get('OPTIONS', {}).get('pool')]
+
+
+def release_connections():
+    """Return this thread's pooled connections before a long wait that needs no database"""
+    _monitor.ensure_started()
+    for connection in connections.all(initialized_only=True):
+        if connection.alias in _monitor.aliases and not connection.in_atomic_block:
+            connection.close()
+
+
+def pool_stats(alias: str) -> Optional[Dict]:
+    """Occupancy, waits and connection churn of one alias' pool since the process started"""
+    pool = connections[alias].pool
+    if pool is None:
+        return None
+    stats = pool.get_stats()
+    size, available, max_size = stats.get('pool_size', 0), stats.get('pool_available', 0), stats.get('pool_max', 0)
+    requests = stats.get('requests_num', 0)
+    return {
+        'max_size': max_size,
+        'size': size,
+        'in_use': size - available,
+        'saturation': round((size - available) / max_size, 3) if max_size else None,
+        'waiting': stats.get('requests_waiting', 0),
+        'requests': requests,
+        'requests_queued': stats.get('requests_queued', 0),
+        'wait_ms_avg': round(stats.get('requests_wait_ms', 0) / requests, 2) if requests else 0.0,
+        'timeouts': stats.get('requests_errors', 0),
+        'connections_opened': stats.get('connections_num', 0),
+        'connections_lost': stats.get('connections_lost', 0),
+    }
+
+
+def all_pool_stats() -> Dict[str, Dict]:
+    _monitor.ensure_started()
+    return {alias: pool_stats(alias) for alias in _monitor.aliases}
+
+
+class PoolMonitor:
+    """Logs pool saturation: requests that waited or timed out since the previous interval"""
+
+    def __init__(self):
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+        self.aliases: List[str] = []
+        self.previous: Dict[str, Dict] = {}
+
+    def ensure_started(self):
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.aliases = pooled_aliases()
+            self.thread = threading.Thread(target=self._run, name='db-pool-monitor', daemon=True)
+            if self.aliases and getattr(settings, 'CHAT_DB_POOL_LOG_SECONDS', 60) > 0:
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(getattr(settings, 'CHAT_DB_POOL_LOG_SECONDS', 60))
+            for alias in self.aliases:
+                try:
+                    self.report(alias)
+                except Exception:
+                    logger.warning("Could not read pool stats of %s", alias, exc_info=True)
+
+    def report(self, alias: str):
+        stats = pool_stats(alias)
+        previous = self.previous.get(alias, {})
+        self.previous[alias] = stats
+        queued = stats['requests_queued'] - previous.get('requests_queued', 0)
+        timeouts = stats['timeouts'] - previous.get('timeouts', 0)
+        if queued or timeouts:
+            logger.warning(
+                "DB pool %s saturated: %s requests waited for a connection and %s timed out "
+                "(%s of %s connections in use, %.1f ms average wait since start)",
+                alias, queued, timeouts, stats['in_use'], stats['max_size'], stats['wait_ms_avg'],
+            )
+
+
+_monitor = PoolMonitor()
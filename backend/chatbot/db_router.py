@@ -0,0 +1,263 @@
+"""
+Read replica routing.
+
+Databases listed in DATABASE_REPLICA_URLS become the `replica_<n>` aliases
+(see settings.py). Writes and ordinary reads always use `default`. Reads go to
+a replica only inside `replica_reads()` or a `@read_replica` view: the
+read-only history and knowledge endpoints, admin changelists and knowledge
+index loads. A request that reads and then writes never mixes databases.
+
+Read-your-writes: saving a chat session, one of its messages or a knowledge
+base entry marks a sticky key for CHAT_REPLICA_STICKY_SECONDS (in Redis when
+configured, so every worker sees it), and reads under that key stay on the
+primary until the replicas have caught up. A daemon thread checks every
+replica each CHAT_REPLICA_CHECK_SECONDS (a query, and on PostgreSQL the replay
+lag against CHAT_REPLICA_MAX_LAG_SECONDS). Failing replicas are skipped, and
+a read-only view that hits a replica error is retried once on the primary.
+"""
+import asyncio
+import contextvars
+import functools
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from .redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = 'default'
+REPLICA_PREFIX = 'replica_'
+STICKY_PREFIX = 'chat:sticky:'
+# Sticky key of the knowledge base endpoints
+KNOWLEDGE_KEY = 'knowledge'
+
+# Replication delay in seconds; 0 while the replica has replayed everything it received
+LAG_SQL = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+
+_read_alias = contextvars.ContextVar('chat_read_alias', default=None)
+
+
+def replica_aliases() -> List[str]:
+    return [alias for alias in settings.DATABASES if alias.startswith(REPLICA_PREFIX)]
+
+
+def session_key(session_id) -> str:
+    """Sticky key of one chat session's history"""
+    return f'session:{session_id}'
+
+
+class ReplicaRouter:
+    """Reads follow the alias chosen by `replica_reads()`, everything else uses the primary"""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaMonitor:
+    """Per-process view of which replicas are reachable and caught up"""
+
+    def __init__(self):
+        self.healthy: List[str] = []
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+        self._turn = itertools.count()
+
+    def choose(self) -> str:
+        """A healthy replica (round robin), or the primary when there is none"""
+        if self.thread is None:
+            self.start()
+        healthy = self.healthy
+        if not healthy:
+            return PRIMARY
+        return healthy[next(self._turn) % len(healthy)]
+
+    def mark_failed(self, alias: str):
+        """Skip `alias` until the next check finds it healthy again"""
+        self.healthy = [healthy for healthy in self.healthy if healthy != alias]
+        logger.warning("Read replica %s failed; reading from the primary until it passes a check", alias)
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run, name='replica-monitor', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            self.check_all()
+            time.sleep(getattr(settings, 'CHAT_REPLICA_CHECK_SECONDS', 5))
+
+    def check_all(self):
+        healthy = [alias for alias in replica_aliases() if self.check(alias)]
+        if healthy != self.healthy:
+            logger.info("Healthy read replicas: %s", ', '.join(healthy) or 'none')
+        self.healthy = healthy
+
+    def check(self, alias: str) -> bool:
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor != 'postgresql':
+                    cursor.execute('SELECT 1')
+                    return True
+                cursor.execute(LAG_SQL)
+                lag = cursor.fetchone()[0] or 0
+            max_lag = getattr(settings, 'CHAT_REPLICA_MAX_LAG_SECONDS', 10)
+            if lag > max_lag:
+                logger.warning("Read replica %s is %.1fs behind (limit %ss)", alias, lag, max_lag)
+                return False
+            return True
+        except Exception:
+            logger.warning("Read replica %s is unreachable", alias, exc_info=True)
+            return False
+        finally:
+            # The checking thread must not hold on to a connection the server may have dropped
+            connection.close()
+
+
+_monitor = ReplicaMonitor()
+# Process-local sticky keys: key -> monotonic expiry, for deployments without Redis
+_local_sticky: Dict[str, float] = {}
+
+
+def mark_written(key: str):
+    """Keep reads under `key` on the primary for the next CHAT_REPLICA_STICKY_SECONDS"""
+    seconds = getattr(settings, 'CHAT_REPLICA_STICKY_SECONDS', 5)
+    if not replica_aliases() or seconds <= 0:
+        return
+    _local_sticky[key] = time.monotonic() + seconds
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        client.set(STICKY_PREFIX + key, 1, ex=seconds)
+    except Exception:
+        logger.warning("Could not share sticky key %s; other workers may read it from a replica", key, exc_info=True)
+
+
+def _locally_sticky(key: str) -> bool:
+    expires = _local_sticky.get(key)
+    if expires is None:
+        return False
+    if expires > time.monotonic():
+        return True
+    _local_sticky.pop(key, None)
+    return False
+
+
+def is_sticky(key: str) -> bool:
+    if _locally_sticky(key):
+        return True
+    client = get_redis()
+    if client is None:
+        return False
+    try:
+        return bool(client.exists(STICKY_PREFIX + key))
+    except Exception:
+        # Without the shared keys a recent write elsewhere cannot be ruled out
+        return True
+
+
+async def ais_sticky(key: str) -> bool:
+    if _locally_sticky(key):
+        return True
+    client = get_async_redis()
+    if client is None:
+        return False
+    try:
+        return bool(await client.exists(STICKY_PREFIX + key))
+    except Exception:
+        return True
+
+
+def read_alias(sticky_key: Optional[str] = None) -> str:
+    """Database for a read-only unit of work: a healthy replica unless `sticky_key` was just written"""
+    if not replica_aliases() or (sticky_key and is_sticky(sticky_key)):
+        return PRIMARY
+    return _monitor.choose()
+
+
+async def aread_alias(sticky_key: Optional[str] = None) -> str:
+    if not replica_aliases() or (sticky_key and await ais_sticky(sticky_key)):
+        return PRIMARY
+    return _monitor.choose()
+
+
+def replica_failed(alias: str):
+    """Report a database error on a replica; reads skip it until its next successful check"""
+    _monitor.mark_failed(alias)
+
+
+@contextmanager
+def reading_from(alias: str):
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+@contextmanager
+def replica_reads(sticky_key: Optional[str] = None):
+    """Send the ORM reads of the block to a replica (see `read_alias`); yields the alias used"""
+    with reading_from(read_alias(sticky_key)) as alias:
+        yield alias
+
+
+def read_replica(sticky_key: Callable[..., str] = None):
+    """Decorator for read-only views (sync or async) that may be served from a replica
+
+    `sticky_key` receives the view's URL arguments and names the writes the view
+    must see. A database error on the replica is retried once on the primary.
+    """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                alias = await aread_alias(sticky_key(*args, **kwargs) if sticky_key else None)
+                try:
+                    with reading_from(alias):
+                        return await view(request, *args, **kwargs)
+                except DatabaseError:
+                    if alias == PRIMARY:
+                        raise
+                    replica_failed(alias)
+                with reading_from(PRIMARY):
+                    return await view(request, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            alias = read_alias(sticky_key(*args, **kwargs) if sticky_key else None)
+            try:
+                with reading_from(alias):
+                    return view(request, *args, **kwargs)
+            except DatabaseError:
+                if alias == PRIMARY:
+                    raise
+                replica_failed(alias)
+            with reading_from(PRIMARY):
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
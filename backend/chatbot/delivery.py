@@ -0,0 +1,145 @@
+import logging
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from .redis_client import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_KEY = 'chat:presence:{}'
+PRESENCE_TTL = 24 * 3600
+# How long a socket trusts its cached count; joins and leaves also push the new count to the group
+PRESENCE_CACHE_SECONDS = 5
+
+# Decrement without going below zero, and keep the expiry so a crashed process's sockets age out
+LEAVE_SCRIPT = """
+local count = redis.call('DECR', KEYS[1])
+if count <= 0 then
+    redis.call('DEL', KEYS[1])
+    return 0
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return count
+"""
+
+
+class LocalPresence:
+    """Socket counts per chat session for a single process (in-memory channel layer mode)"""
+
+    def __init__(self):
+        self.counts = Counter()
+
+    async def join(self, session_id):
+        self.counts[session_id] += 1
+        return self.counts[session_id]
+
+    async def leave(self, session_id):
+        self.counts[session_id] -= 1
+        if self.counts[session_id] <= 0:
+            del self.counts[session_id]
+        return self.counts[session_id]
+
+    async def count(self, session_id):
+        return self.counts[session_id]
+
+
+class RedisPresence:
+    """Socket counts per chat session shared by every process through Redis
+
+    join() and leave() return the new count.
+    """
+
+    async def join(self, session_id):
+        key = PRESENCE_KEY.format(session_id)
+        client = get_async_redis()
+        async with client.pipeline(transaction=True) as pipe:
+            count, _ = await pipe.incr(key).expire(key, PRESENCE_TTL).execute()
+        return count
+
+    async def leave(self, session_id):
+        return await get_async_redis().eval(LEAVE_SCRIPT, 1, PRESENCE_KEY.format(session_id), PRESENCE_TTL)
+
+    async def count(self, session_id):
+        value = await get_async_redis().get(PRESENCE_KEY.format(session_id))
+        return int(value or 0)
+
+
+_presence = None
+
+
+def get_presence():
+    global _presence
+    if _presence is None:
+        if getattr(settings, 'CHANNEL_LAYER_MODE', 'redis') == 'memory':
+            _presence = LocalPresence()
+        else:
+            _presence = RedisPresence()
+    return _presence
+
+
+class SessionDelivery:
+    """Delivers chat frames straight to the local socket unless other sockets share the session.
+
+    The consumer still joins the channel-layer group, so frames published by other
+    processes (other devices, Celery jobs) keep reaching it. The socket count is
+    cached: a join or leave sends the new count to the group (`presence_update`),
+    and the count is read again once it is PRESENCE_CACHE_SECONDS old.
+    """
+
+    def __init__(self, consumer, session_id, group_name):
+        self.consumer = consumer
+        self.session_id = session_id
+        self.group_name = group_name
+        self.presence = get_presence()
+        self.joined = False
+        self.count = None
+        self.counted_at = 0.0
+
+    def update(self, count):
+        self.count = count
+        self.counted_at = time.monotonic()
+
+    async def announce(self, count):
+        await self.consumer.channel_layer.group_send(self.group_name, {'type': 'presence_update', 'count': count})
+
+    async def join(self):
+        try:
+            count = await self.presence.join(self.session_id)
+            self.joined = True
+        except Exception:
+            logger.warning("Presence tracking unavailable; using group delivery", exc_info=True)
+            return
+        self.update(count)
+        if count > 1:
+            # The sockets already connected must switch to group delivery now
+            await self.announce(count)
+
+    async def leave(self):
+        if not self.joined:
+            return
+        try:
+            count = await self.presence.leave(self.session_id)
+        except Exception:
+            logger.warning("Could not release presence for %s", self.session_id, exc_info=True)
+            return
+        if count:
+            await self.announce(count)
+
+    async def is_alone(self):
+        if not self.joined:
+            return False
+        if self.count is None or time.monotonic() - self.counted_at > PRESENCE_CACHE_SECONDS:
+            try:
+                self.update(await self.presence.count(self.session_id))
+            except Exception:
+                return False
+        return self.count <= 1
+
+    async def publish(self, event):
+        if await self.is_alone():
+            # Same handler the group would have invoked, minus the channel-layer round trip
+            await getattr(self.consumer, event['type'])(event)
+        else:
+            await self.consumer.channel_layer.group_send(self.group_name, event)
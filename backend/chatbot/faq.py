@@ -0,0 +1,182 @@
+import logging
+from datetime import timedelta
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .knowledge_index import current_version
+from .text_normalization import normalize_text
+from .models import FAQEntry, Message, ProcessingCheckpoint
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = 'faq'
+BATCH_SIZE = 2000
+
+
+def normalize_question(text: str) -> str:
+    """Normalize a user question into the key used to cluster and look it up"""
+    return normalize_text(text)[:255]
+
+
+def lookup_faq(question: str, language: str = 'en') -> Optional[str]:
+    """Return the precomputed answer for a frequent question, if there is one"""
+    key = normalize_question(question)
+    if not key:
+        return None
+    min_count = getattr(settings, 'FAQ_MIN_ASK_COUNT', 3)
+    return (
+        FAQEntry.objects
+        .filter(language=(language or 'en').lower(), question_key=key, is_active=True, ask_count__gte=min_count)
+        .exclude(answer='')
+        .values_list('answer', flat=True)
+        .first()
+    )
+
+
+def _rating_score(is_helpful) -> int:
+    if is_helpful is None:
+        return 0
+    return 1 if is_helpful else -1
+
+
+def _kb_fingerprint() -> str:
+    return f"kb-v{current_version()}"
+
+
+def invalidate_answers():
+    """Answers were produced against the old KB; keep the clusters but drop their answers
+
+    Called in the transaction of every KB change, so stale answers stop being
+    served at once rather than at the next build_faq run.
+    """
+    FAQEntry.objects.exclude(answer='').update(answer='', answer_score=0, answer_source='')
+
+
+def _collect_pairs(messages, pending: Dict[int, Dict]):
+    """Pair each user question with the assistant reply that follows it in its session"""
+    for message in messages:
+        if message['message_type'] == 'user':
+            pending[message['session_id']] = message
+        elif message['message_type'] == 'assistant':
+            question = pending.pop(message['session_id'], None)
+            if question is not None:
+                yield question, message
+
+
+def build_faq(batch_size: int = BATCH_SIZE) -> Dict:
+    """Fold messages newer than the last run into the FAQ clusters.
+
+    Only messages older than FAQ_SETTLE_MINUTES are processed so that users
+    have had a chance to rate the answers before they are considered. After
+    a KB change, replies written before it still count towards ask_count but
+    are never picked as answers, in this run or any later one. Each
+    cluster keeps the answer with the highest net rating (helpful minus
+    unhelpful ratings of identical replies); ratings of the answer already
+    stored, including replies served from the FAQ, add to its score.
+    """
+    checkpoint, _ = ProcessingCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+    fingerprint = _kb_fingerprint()
+    kb_changed = bool(checkpoint.fingerprint) and checkpoint.fingerprint != fingerprint
+    if kb_changed:
+        invalidate_answers()
+        # Kept on the checkpoint: the settle lag means later runs still see replies written before the change
+        checkpoint.answers_since = timezone.now()
+        checkpoint.save()
+        logger.info("Knowledge base changed, FAQ answers cleared")
+    answers_since = checkpoint.answers_since
+
+    settle = timedelta(minutes=getattr(settings, 'FAQ_SETTLE_MINUTES', 60))
+    cutoff = timezone.now() - settle
+    stats = {'messages': 0, 'questions': 0, 'answers_updated': 0, 'kb_changed': kb_changed}
+    pending = {}
+    last_id = checkpoint.last_message_id
+
+    while True:
+        messages = list(
+            Message.objects
+            .filter(id__gt=last_id, timestamp__lt=cutoff, message_type__in=['user', 'assistant'])
+            .order_by('id')
+            .values('id', 'session_id', 'message_type', 'content', 'is_helpful', 'timestamp', 'session__language')
+            [:batch_size]
+        )
+        if not messages:
+            break
+
+        clusters = {}
+        for question, answer in _collect_pairs(messages, pending):
+            language = (question['session__language'] or 'en').lower()
+            key = normalize_question(question['content'])
+            if not key:
+                continue
+            cluster = clusters.setdefault((language, key), {
+                'sample_question': question['content'],
+                'count': 0,
+                'answers': {},
+            })
+            cluster['count'] += 1
+            if answers_since and answer['timestamp'] < answers_since:
+                continue
+            answers = cluster['answers']
+            answers[answer['content']] = answers.get(answer['content'], 0) + _rating_score(answer['is_helpful'])
+
+        with transaction.atomic():
+            for (language, key), cluster in clusters.items():
+                entry, _ = FAQEntry.objects.select_for_update().get_or_create(
+                    language=language,
+                    question_key=key,
+                    defaults={'sample_question': cluster['sample_question']},
+                )
+                entry.ask_count += cluster['count']
+                answers = cluster['answers']
+                if entry.answer and entry.answer in answers:
+                    entry.answer_score += answers.pop(entry.answer)
+                    if entry.answer_score < 0:
+                        # Rated down since it was picked; a better answer or a new generated one replaces it
+                        entry.answer, entry.answer_score, entry.answer_source = '', 0, ''
+                        stats['answers_updated'] += 1
+                best = max(answers.items(), key=lambda item: item[1], default=None)
+                if best and best[1] > 0 and (not entry.answer or best[1] > entry.answer_score):
+                    entry.answer, entry.answer_score = best
+                    entry.answer_source = 'history'
+                    stats['answers_updated'] += 1
+                entry.save()
+
+            last_id = messages[-1]['id']
+            checkpoint.last_message_id = last_id
+            checkpoint.fingerprint = fingerprint
+            if answers_since and messages[-1]['timestamp'] >= answers_since:
+                # The high-water mark has passed the KB change; every later reply is current
+                answers_since = checkpoint.answers_since = None
+            checkpoint.save()
+
+        stats['messages'] += len(messages)
+        stats['questions'] += sum(cluster['count'] for cluster in clusters.values())
+
+    if checkpoint.fingerprint != fingerprint:
+        checkpoint.fingerprint = fingerprint
+        checkpoint.save()
+    return stats
+
+
+def generate_missing_answers(limit: int) -> int:
+    """Pre-generate answers for the most frequent clusters that have none yet"""
+    from .ai_service import get_ai_service
+
+    min_count = getattr(settings, 'FAQ_MIN_ASK_COUNT', 3)
+    entries = FAQEntry.objects.filter(is_active=True, answer='', ask_count__gte=min_count)[:limit]
+    ai_service = get_ai_service()
+    generated = 0
+    for entry in entries:
+        result = ai_service.generate_response(entry.sample_question, language=entry.language)
+        if not result.get('in_scope') or result.get('answer_source') not in ('llm', 'template'):
+            # Out of scope, a refusal or an error reply; never cache those
+            continue
+        entry.answer = result['response']
+        entry.answer_score = 0
+        entry.answer_source = 'generated'
+        entry.save(update_fields=['answer', 'answer_score', 'answer_source', 'updated_at'])
+        generated += 1
+    return generated
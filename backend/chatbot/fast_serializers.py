@@ -0,0 +1,83 @@
+"""
+Fast-path serialization for the read-heavy endpoints.
+
+Builds the same payloads as the DRF serializers in serializers.py straight
+from `.values()` rows, with the per-field conversions worked out once per
+field list instead of once per row.
+"""
+from typing import Callable, Dict, Iterable, List
+
+from django.db import models
+from django.utils import timezone
+
+from .models import ChatSession, KnowledgeBaseEntry, Message
+from .serializers import ChatSessionSerializer, KnowledgeBaseEntrySerializer, MessageSerializer
+
+
+def format_datetime(value):
+    """Same output as DRF's DateTimeField: ISO 8601 in the current timezone, UTC as 'Z'"""
+    if value is None:
+        return None
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def compile_row(model, fields: List[str]) -> Callable[[Dict], Dict]:
+    """Precompute the converters for `fields` and return a row -> payload function"""
+    converters = [
+        (name, format_datetime if isinstance(model._meta.get_field(name), models.DateTimeField) else None)
+        for name in fields
+    ]
+
+    def convert(row: Dict) -> Dict:
+        return {
+            name: converter(row[name]) if converter else row[name]
+            for name, converter in converters
+        }
+    return convert
+
+
+MESSAGE_FIELDS = list(MessageSerializer.Meta.fields)
+SESSION_FIELDS = [name for name in ChatSessionSerializer.Meta.fields if name != 'messages']
+KNOWLEDGE_FIELDS = list(KnowledgeBaseEntrySerializer.Meta.fields)
+
+message_row = compile_row(Message, MESSAGE_FIELDS)
+session_row = compile_row(ChatSession, SESSION_FIELDS)
+knowledge_row = compile_row(KnowledgeBaseEntry, KNOWLEDGE_FIELDS)
+
+
+def serialize_sessions(queryset) -> List[Dict]:
+    """ChatSessionSerializer(many=True) equivalent: two queries, no model instances"""
+    sessions = [session_row(row) for row in queryset.values(*SESSION_FIELDS)]
+    if not sessions:
+        return sessions
+
+    messages_by_session = {session['id']: [] for session in sessions}
+    rows = (
+        Message.objects
+        .filter(session_id__in=list(messages_by_session))
+        .order_by(*Message._meta.ordering)
+        .values('session_id', *MESSAGE_FIELDS)
+    )
+    for row in rows.iterator(chunk_size=2000):
+        messages_by_session[row['session_id']].append(message_row(row))
+
+    for session in sessions:
+        # Keep the serializer's key order: session fields first, then messages
+        session['messages'] = messages_by_session[session['id']]
+    return sessions
+
+
+def serialize_session(session_id: str):
+    """Single-session payload, or None when the session does not exist"""
+    sessions = serialize_sessions(ChatSession.objects.filter(session_id=session_id))
+    return sessions[0] if sessions else None
+
+
+def serialize_knowledge(queryset: Iterable) -> List[Dict]:
+    """KnowledgeBaseEntrySerializer(many=True) equivalent built from .values() rows"""
+    return [knowledge_row(row) for row in queryset.values(*KNOWLEDGE_FIELDS)]
@@ -0,0 +1,175 @@
+"""
+Knowledge index file shared by the worker processes of one host.
+
+The active KB entries are serialized into one compact, versioned file that
+every worker maps read-only, so the pages live once in the OS page cache
+however many workers run, and a booting worker maps the file instead of
+loading and normalizing the whole KB. A new version is written to a temporary
+file in the same directory and moved over the old one with os.replace():
+readers that still map the old file keep a valid mapping until they swap, and
+no reader ever sees a partly written file.
+
+Layout (little endian):
+
+- header: MAGIC, FORMAT_VERSION, KB version, entry count, facts offset and length, file size
+- table: one RECORD per entry: id, priority, created_at and the (offset, length) of its strings
+- strings: UTF-8 title, content, category, normalized title and content, comma-joined keywords
+- facts: JSON of the merged KB facts, {key: [value, entry title]}
+
+Search scores entries directly on the mapped bytes: UTF-8 substrings match
+exactly where the decoded strings do, so only the returned entries are decoded.
+"""
+import fcntl
+import json
+import mmap
+import os
+import struct
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+MAGIC = b'CKBI'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sH2xQIQQQ')
+# id, priority, created_at, then (offset, length) per TEXT_FIELDS entry
+RECORD = struct.Struct('<qid12I')
+TEXT_FIELDS = ('title', 'content', 'category', 'title_normalized', 'content_normalized', 'keywords')
+MAX_FILE_SIZE = 0xFFFFFFFF
+
+
+def encode(version: int, entries: Dict[int, Dict], facts: Dict[str, Tuple[object, str]]) -> bytes:
+    """File contents for index rows (see knowledge_index._index_row) at KB `version`"""
+    strings_start = HEADER.size + RECORD.size * len(entries)
+    table = bytearray()
+    strings = bytearray()
+    for entry_id, entry in entries.items():
+        spans = []
+        for field in TEXT_FIELDS:
+            value = ','.join(entry['keywords']) if field == 'keywords' else entry[field]
+            data = value.encode('utf-8')
+            spans += (strings_start + len(strings), len(data))
+            strings += data
+        table += RECORD.pack(entry_id, entry['priority'], entry['created_at'], *spans)
+    facts_data = json.dumps(facts, ensure_ascii=False).encode('utf-8')
+    facts_offset = strings_start + len(strings)
+    size = facts_offset + len(facts_data)
+    if size > MAX_FILE_SIZE:
+        raise ValueError(f'knowledge index of {size} bytes exceeds the 4 GiB file format limit')
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, version, len(entries), facts_offset, len(facts_data), size)
+    return b''.join([header, table, strings, facts_data])
+
+
+@contextmanager
+def builder_lock(path: str, blocking: bool = True):
+    """Hold the lock that makes one process at a time build `path`; yields False if `blocking` is off and it is taken"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(f'{path}.lock', 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_index_file(path: str, version: int, entries: Dict[int, Dict], facts: Dict[str, Tuple[object, str]]) -> int:
+    """Publish the index atomically at `path` (call under builder_lock); returns the file size"""
+    data = encode(version, entries, facts)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.kb-index-')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(data)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return len(data)
+
+
+def file_version(path: str) -> Optional[int]:
+    """KB version of the index file at `path`, None when it is missing or not an index file"""
+    try:
+        with open(path, 'rb') as index_file:
+            header = index_file.read(HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(header) < HEADER.size:
+        return None
+    magic, format_version, version = HEADER.unpack(header)[:3]
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        return None
+    return version
+
+
+def file_identity(path: str) -> Optional[Tuple[int, int]]:
+    """(device, inode) of `path`; every publish creates a new inode"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+class MappedIndex:
+    """Read-only view of one index file
+
+    The mapping is never closed explicitly: a search running in another thread
+    may still use it after a newer file was swapped in, and it is unmapped when
+    the last reference goes away.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as index_file:
+            stat = os.fstat(index_file.fileno())
+            self.buffer = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.identity = (stat.st_dev, stat.st_ino)
+        if len(self.buffer) < HEADER.size:
+            raise ValueError(f'{path} is not a knowledge index file')
+        magic, format_version, self.version, self.count, facts_offset, facts_length, size = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or format_version != FORMAT_VERSION or size != len(self.buffer):
+            raise ValueError(f'{path} is not a knowledge index file of format {FORMAT_VERSION}')
+        self.table = memoryview(self.buffer)[HEADER.size:HEADER.size + RECORD.size * self.count]
+        facts = json.loads(self.buffer[facts_offset:facts_offset + facts_length].decode('utf-8'))
+        self.facts = {key: (value, title) for key, (value, title) in facts.items()}
+
+    def _text(self, record: Tuple, field: int) -> str:
+        offset, length = record[3 + 2 * field], record[4 + 2 * field]
+        return self.buffer[offset:offset + length].decode('utf-8')
+
+    def search(self, normalized_query: str, limit: int) -> List[Dict]:
+        """Same scoring and order as KnowledgeIndex.search over in-process entries"""
+        needle = normalized_query.encode('utf-8')
+        buffer = self.buffer
+        matches = []
+        for record in RECORD.iter_unpack(self.table):
+            title_at, title_length, content_at, content_length, keywords_at, keywords_length = record[9:15]
+            score = 0
+            if buffer.find(needle, title_at, title_at + title_length) != -1:
+                score += 3
+            if buffer.find(needle, content_at, content_at + content_length) != -1:
+                score += 2
+            if keywords_length:
+                for keyword in buffer[keywords_at:keywords_at + keywords_length].split(b','):
+                    if keyword in needle:
+                        score += 1
+            if score > 0:
+                matches.append((score, record[1], record[2], record))
+
+        matches.sort(key=lambda match: match[:3], reverse=True)
+        return [
+            {
+                'title': self._text(record, 0),
+                'content': self._text(record, 1),
+                'category': self._text(record, 2),
+                'score': score,
+            }
+            for score, _, _, record in matches[:limit]
+        ]
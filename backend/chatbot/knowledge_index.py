@@ -0,0 +1,294 @@
+"""
+Versioned in-process knowledge base index.
+
+Every KnowledgeBaseEntry save or delete appends a KnowledgeBaseChange row in the
+same transaction (see signals.py); the newest change id is the KB version.
+Bulk writes skip those signals and must call signals.record_bulk_change(),
+which logs a 'reload' change that makes every worker load the whole KB again.
+After commit the version is broadcast on a Redis channel. Each worker keeps a
+KnowledgeIndex that applies only the changes newer than its own version, so
+retrieval reads precomputed entries from memory and never serves a stale KB
+for longer than the broadcast (or, without Redis, the poll interval) takes.
+Refreshes read from a read replica when one is healthy, and from the primary
+when the replica has not caught up with the announced version.
+
+With CHAT_KB_INDEX_PATH set, the workers of a host share one memory-mapped
+index file (see knowledge_file.py) instead of each holding the entries. The
+first worker that finds the file behind the KB version rebuilds it under a
+file lock while the others keep searching the file they mapped; everyone maps
+the new file when it is swapped in. Without a usable file the worker falls
+back to the in-process entries.
+"""
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Max
+
+from .db_router import PRIMARY, read_alias, reading_from, replica_failed
+from .knowledge_file import MappedIndex, builder_lock, file_identity, file_version, write_index_file
+from .models import KnowledgeBaseChange, KnowledgeBaseEntry
+from .redis_client import get_pubsub, get_redis
+from .text_normalization import normalize_keywords, normalize_text
+
+logger = logging.getLogger(__name__)
+
+VERSION_CHANNEL = 'chat:kb:version'
+ENTRY_FIELDS = [
+    'id', 'title', 'content', 'category', 'keywords', 'is_active', 'priority', 'created_at',
+    'normalized_title', 'normalized_content', 'normalized_keywords', 'facts',
+]
+
+
+def current_version() -> int:
+    """Latest committed KB version (0 before the first logged change)"""
+    return KnowledgeBaseChange.objects.aggregate(version=Max('id'))['version'] or 0
+
+
+def publish_version(version: int):
+    """Tell this process and every other worker that the KB moved to `version`"""
+    get_knowledge_index().announce(version)
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        client.publish(VERSION_CHANNEL, version)
+    except Exception:
+        logger.warning("Could not broadcast KB version %s; other workers will pick it up by polling", version, exc_info=True)
+
+
+def _index_row(entry: Dict) -> Dict:
+    """Search fields normalized once per entry (stored on save) instead of once per query"""
+    # Rows written with bulk_create/update() skip KnowledgeBaseEntry.save(), so normalize them here
+    normalized_title = entry['normalized_title'] or normalize_text(entry['title'])
+    normalized_content = entry['normalized_content'] or normalize_text(entry['content'])
+    normalized_keywords = entry['normalized_keywords'] or normalize_keywords(entry['keywords'])
+    return {
+        'title': entry['title'],
+        'content': entry['content'],
+        'category': entry['category'],
+        'priority': entry['priority'],
+        'created_at': entry['created_at'].timestamp(),
+        'title_normalized': normalized_title,
+        'content_normalized': normalized_content,
+        'keywords': normalized_keywords.split(',') if normalized_keywords else [],
+        'facts': entry['facts'] or {},
+    }
+
+
+def merge_facts(entries: Iterable[Dict]) -> Dict[str, Tuple[object, str]]:
+    """Typed facts of index rows as key -> (value, entry title); higher priority wins"""
+    facts = {}
+    for entry in sorted(entries, key=lambda entry: (entry['priority'], entry['created_at'])):
+        for key, value in entry['facts'].items():
+            facts[key] = (value, entry['title'])
+    return facts
+
+
+def index_file_path() -> str:
+    return str(getattr(settings, 'CHAT_KB_INDEX_PATH', '') or '')
+
+
+def load_entries() -> Tuple[int, Dict[int, Dict]]:
+    """KB version and index rows of all active entries, read from the current database alias"""
+    # Read the version first: changes committed during the load are replayed on the next refresh
+    version = current_version()
+    entries = KnowledgeBaseEntry.objects.filter(is_active=True).values(*ENTRY_FIELDS)
+    return version, {entry['id']: _index_row(entry) for entry in entries}
+
+
+def build_index_file(path: str) -> Tuple[int, int, int]:
+    """Write the index file for the current KB version from the primary (call under builder_lock)
+
+    Returns the version, the entry count and the file size.
+    """
+    version, entries = load_entries()
+    size = write_index_file(path, version, entries, merge_facts(entries.values()))
+    return version, len(entries), size
+
+
+class KnowledgeIndex:
+    """Active KB entries of one process, refreshed incrementally from the change log"""
+
+    def __init__(self):
+        self.version = None
+        self.entries: Dict[int, Dict] = {}
+        self.announced = 0
+        self.checked_at = 0.0
+        self.refresh_lock = threading.Lock()
+        self.listener: Optional[threading.Thread] = None
+        self.mapped: Optional[MappedIndex] = None
+        self._facts: Dict[str, Tuple[object, str]] = {}
+        self._facts_entries = None
+
+    def announce(self, version: int):
+        if version > self.announced:
+            self.announced = version
+
+    def ensure_current(self):
+        """Catch up with the KB when a newer version was announced or the poll interval elapsed"""
+        if self.listener is None:
+            self.start_listener()
+        poll_seconds = getattr(settings, 'KB_INDEX_POLL_SECONDS', 30)
+        stale = self.version is None or self.announced > self.version
+        if not stale and time.monotonic() - self.checked_at < poll_seconds:
+            return
+        with self.refresh_lock:
+            path = index_file_path()
+            if path and self._refresh_file(path):
+                self.checked_at = time.monotonic()
+                return
+            alias = read_alias()
+            try:
+                with reading_from(alias):
+                    self._refresh()
+            except DatabaseError:
+                if alias == PRIMARY:
+                    raise
+                replica_failed(alias)
+            if self.version is None or self.version < self.announced:
+                # The replica failed or has not replayed the announced change yet
+                self._refresh()
+            self.checked_at = time.monotonic()
+
+    def _refresh_file(self, path: str) -> bool:
+        """Map the current index file, rebuilding it first if it is behind; False when there is none to use"""
+        version = current_version()
+        self.announce(version)
+        try:
+            self._map_file(path)
+            if self.mapped is None or self.mapped.version != version:
+                with builder_lock(path, blocking=False) as building:
+                    # Another worker holding the lock is building it; keep the mapped file until it is swapped in
+                    if building and file_version(path) != version:
+                        version, count, size = build_index_file(path)
+                        logger.info("Wrote KB index file %s: %s entries at version %s (%s bytes)", path, count, version, size)
+                self._map_file(path)
+        except (OSError, ValueError):
+            logger.warning("KB index file %s is unusable; using the in-process index", path, exc_info=True)
+        if self.mapped is None:
+            return False
+        self.version = self.mapped.version
+        return True
+
+    def _map_file(self, path: str):
+        """Swap in the file at `path` if it was replaced since it was mapped"""
+        identity = file_identity(path)
+        if identity is None or (self.mapped is not None and self.mapped.identity == identity):
+            return
+        mapped = MappedIndex(path)
+        self.mapped = mapped
+        # The file replaces the in-process entries for good
+        self.entries = {}
+        logger.info("Mapped KB index file %s at version %s (%s entries)", path, mapped.version, mapped.count)
+
+    def _refresh(self):
+        if self.version is None:
+            self._load_all()
+        else:
+            self._apply_changes()
+
+    def _load_all(self):
+        version, self.entries = load_entries()
+        self.version = version
+        logger.info("Loaded %s KB entries at version %s", len(self.entries), version)
+
+    def _apply_changes(self):
+        changes = list(
+            KnowledgeBaseChange.objects.filter(id__gt=self.version).order_by('id').values_list('id', 'entry_id', 'action')
+        )
+        if not changes:
+            return
+        if any(action == 'reload' for _, _, action in changes):
+            self._load_all()
+            return
+        entry_ids = {entry_id for _, entry_id, _ in changes}
+        rows = {
+            entry['id']: entry
+            for entry in KnowledgeBaseEntry.objects.filter(id__in=entry_ids).values(*ENTRY_FIELDS)
+        }
+        # Copy and swap so concurrent searches never see a half-applied update
+        entries = dict(self.entries)
+        for entry_id in entry_ids:
+            entry = rows.get(entry_id)
+            if entry is not None and entry['is_active']:
+                entries[entry_id] = _index_row(entry)
+            else:
+                entries.pop(entry_id, None)
+        self.entries = entries
+        self.version = changes[-1][0]
+        logger.info("Applied %s KB changes, now at version %s", len(changes), self.version)
+
+    def search(self, query: str, limit: int = 5) -> List[Dict]:
+        """Keyword scoring of the original DB scan, on normalized text so Persian spellings match"""
+        self.ensure_current()
+        normalized_query = normalize_text(query)
+        if not normalized_query:
+            return []
+        mapped = self.mapped
+        if mapped is not None:
+            return mapped.search(normalized_query, limit)
+        matches = []
+        for entry in self.entries.values():
+            score = 0
+            if normalized_query in entry['title_normalized']:
+                score += 3
+            if normalized_query in entry['content_normalized']:
+                score += 2
+            for keyword in entry['keywords']:
+                if keyword in normalized_query:
+                    score += 1
+            if score > 0:
+                matches.append((score, entry))
+
+        # Ties keep the model ordering: priority first, then newest
+        matches.sort(key=lambda match: (match[0], match[1]['priority'], match[1]['created_at']), reverse=True)
+        return [
+            {'title': entry['title'], 'content': entry['content'], 'category': entry['category'], 'score': score}
+            for score, entry in matches[:limit]
+        ]
+
+    def facts(self) -> Dict[str, Tuple[object, str]]:
+        """Typed facts of all active entries as key -> (value, entry title); higher priority wins"""
+        self.ensure_current()
+        mapped = self.mapped
+        if mapped is not None:
+            return mapped.facts
+        entries = self.entries
+        # Rebuilt only when a refresh swapped in a new entries dict
+        if self._facts_entries is not entries:
+            self._facts, self._facts_entries = merge_facts(entries.values()), entries
+        return self._facts
+
+    def start_listener(self):
+        """Subscribe to version broadcasts in a daemon thread (no-op without Redis)"""
+        with self.refresh_lock:
+            if self.listener is not None:
+                return
+            self.listener = threading.Thread(target=self._listen, name='kb-version-listener', daemon=True)
+            if getattr(settings, 'REDIS_URL', None):
+                self.listener.start()
+
+    def _listen(self):
+        backoff = 1.0
+        while True:
+            try:
+                pubsub = get_pubsub()
+                pubsub.subscribe(VERSION_CHANNEL)
+                backoff = 1.0
+                for message in pubsub.listen():
+                    self.announce(int(message['data']))
+            except Exception:
+                logger.warning("KB version listener disconnected; retrying in %.0fs", backoff, exc_info=True)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+
+_index = KnowledgeIndex()
+
+
+def get_knowledge_index() -> KnowledgeIndex:
+    return _index
@@ -0,0 +1,327 @@
+"""
+Deadline-bound and hedged LLM completions.
+
+Chat completions are streamed and collected into a regular response, so the
+time to the first token (TTFT) of every call is known. Each turn has a
+deadline, CHAT_LLM_DEADLINE_SECONDS from its start, that bounds the whole
+call: once it passes, the call is abandoned with LLMDeadlineExceeded and the
+turn gets an error reply, so a stuck connection never hangs a worker. The
+clients are built with the SDK's retries off; failed requests are retried here
+instead, each try with only the time left before the deadline. Sync requests
+run on a bounded thread pool and end by the deadline at the latest.
+
+With CHAT_LLM_HEDGING, a call that has produced no token by the p95 TTFT of
+recent calls to the same model gets a second, identical request. The first to
+finish wins and the other is cancelled (an async task is cancelled at once, a
+sync request stops at its next chunk or at the deadline). Hedges are paid from
+a budget that earns CHAT_LLM_HEDGE_MAX_RATE hedges per call, so at most that
+share of calls is doubled. Every reply records whether it was hedged and which
+request won (Message.hedge); the route rollups count hedges and hedge wins.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from types import SimpleNamespace
+from typing import Dict, NamedTuple, Optional
+
+from django.conf import settings
+
+from .admission import llm_slot
+
+logger = logging.getLogger(__name__)
+
+STREAM_OPTIONS = {'stream': True, 'stream_options': {'include_usage': True}}
+# Recent TTFTs kept per model, and how many are needed before hedging starts
+TTFT_WINDOW = 500
+MIN_TTFT_SAMPLES = 20
+# Unused hedges that can be saved up, so a short burst of slow calls can still be hedged
+HEDGE_BURST = 5
+# Retries of a failed request before its first token, with the SDK's default backoff
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.5
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """The turn's deadline passed before the completion finished"""
+
+
+class Completion(NamedTuple):
+    response: SimpleNamespace
+    ttft: Optional[float]
+    # '' when not hedged, else the request that won: 'primary' or 'hedge'
+    hedge: str
+
+
+class TTFTWindow:
+    """Recent times to first token per model"""
+
+    def __init__(self):
+        self.samples: Dict[str, deque] = {}
+        self.lock = threading.Lock()
+
+    def record(self, model: str, seconds: float):
+        with self.lock:
+            self.samples.setdefault(model, deque(maxlen=TTFT_WINDOW)).append(seconds)
+
+    def p95(self, model: str) -> Optional[float]:
+        with self.lock:
+            samples = sorted(self.samples.get(model, ()))
+        if len(samples) < MIN_TTFT_SAMPLES:
+            return None
+        return samples[int(0.95 * (len(samples) - 1))]
+
+
+class HedgeBudget:
+    """Token bucket that caps hedges at CHAT_LLM_HEDGE_MAX_RATE of all calls"""
+
+    def __init__(self):
+        self.tokens = 0.0
+        self.lock = threading.Lock()
+
+    def earn(self):
+        with self.lock:
+            self.tokens = min(self.tokens + getattr(settings, 'CHAT_LLM_HEDGE_MAX_RATE', 0.05), HEDGE_BURST)
+
+    def spend(self) -> bool:
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+_ttft = TTFTWindow()
+_budget = HedgeBudget()
+
+
+def turn_deadline() -> float:
+    """Monotonic deadline of a turn that starts now"""
+    return time.monotonic() + getattr(settings, 'CHAT_LLM_DEADLINE_SECONDS', 30)
+
+
+def _remaining(deadline: float) -> float:
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise LLMDeadlineExceeded('LLM call passed the turn deadline')
+    return remaining
+
+
+def _retryable(error: Exception) -> bool:
+    """Failures the SDK would retry: connection errors, timeouts, 408, 409, 429 and 5xx"""
+    import openai
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    return isinstance(error, openai.APIStatusError) and (error.status_code in (408, 409, 429) or error.status_code >= 500)
+
+
+def _retry_delay(error: Exception, retry: int, collector: '_Collector', deadline: float) -> Optional[float]:
+    """Seconds to wait before retrying a failed request; None when it is not retried"""
+    if retry >= MAX_RETRIES or collector.ttft is not None or not _retryable(error):
+        return None
+    delay = RETRY_BACKOFF * 2 ** retry
+    if time.monotonic() + delay >= deadline:
+        return None
+    logger.info("Retrying %s call in %.1fs after %s", collector.model, delay, type(error).__name__)
+    return delay
+
+
+def _hedge_delay(model: str) -> Optional[float]:
+    """Seconds to wait for the first token before hedging; None when the call is not hedged"""
+    if not getattr(settings, 'CHAT_LLM_HEDGING', False):
+        return None
+    _budget.earn()
+    return _ttft.p95(model)
+
+
+class _Collector:
+    """Assembles streamed chunks into the shape of a non-streamed chat completion"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.started = time.monotonic()
+        self.parts = []
+        self.finish_reason = None
+        self.usage = None
+        self.ttft = None
+
+    def add(self, chunk) -> bool:
+        """Take a chunk; True when it carried the first token"""
+        if getattr(chunk, 'usage', None) is not None:
+            self.usage = chunk.usage
+        first = False
+        for choice in chunk.choices:
+            if choice.delta.content:
+                if self.ttft is None:
+                    self.ttft = time.monotonic() - self.started
+                    _ttft.record(self.model, self.ttft)
+                    first = True
+                self.parts.append(choice.delta.content)
+            if choice.finish_reason:
+                self.finish_reason = choice.finish_reason
+        return first
+
+    def response(self) -> SimpleNamespace:
+        message = SimpleNamespace(role='assistant', content=''.join(self.parts))
+        return SimpleNamespace(
+            model=self.model,
+            choices=[SimpleNamespace(message=message, finish_reason=self.finish_reason)],
+            usage=self.usage,
+        )
+
+
+def _completion(winner: str, collector: _Collector, hedged: bool) -> Completion:
+    if hedged:
+        logger.debug("Hedged %s call won by the %s request", collector.model, winner)
+    return Completion(collector.response(), collector.ttft, winner if hedged else '')
+
+
+def _stream(client, kwargs: Dict, deadline: float, collector: _Collector, progressed: threading.Event,
+            stop: threading.Event) -> Optional[_Collector]:
+    stream = client.chat.completions.create(timeout=_remaining(deadline), **STREAM_OPTIONS, **kwargs)
+    try:
+        for chunk in stream:
+            if collector.add(chunk):
+                progressed.set()
+            if stop.is_set():
+                return None
+            _remaining(deadline)
+    finally:
+        stream.close()
+    return collector
+
+
+def _attempt(client, kwargs: Dict, deadline: float, progressed: threading.Event, stop: threading.Event):
+    try:
+        retry = 0
+        while True:
+            collector = _Collector(kwargs['model'])
+            try:
+                return _stream(client, kwargs, deadline, collector, progressed, stop)
+            except Exception as error:
+                delay = _retry_delay(error, retry, collector, deadline)
+                if delay is None:
+                    raise
+            if stop.wait(delay):
+                return None
+            retry += 1
+    finally:
+        progressed.set()
+
+
+def _hedge_attempt(*args):
+    with llm_slot():
+        return _attempt(*args)
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Threads for sync requests: room for a primary and a hedge per admitted LLM call"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                calls = getattr(settings, 'CHAT_MAX_LLM_INFLIGHT', 32) or 32
+                _executor = ThreadPoolExecutor(max_workers=2 * calls, thread_name_prefix='llm-call')
+    return _executor
+
+
+def complete(client, kwargs: Dict, deadline: float) -> Completion:
+    """Chat completion for `kwargs` within `deadline`, hedged when enabled and the budget allows
+
+    Requests run on the shared thread pool, so the caller returns at the
+    deadline even if a connection is stuck; the request itself stops at its
+    next chunk or when its timeout, the time that was left, runs out.
+    """
+    delay = _hedge_delay(kwargs['model'])
+    progressed = threading.Event()
+    stop = threading.Event()
+    executor = _get_executor()
+    attempts = {executor.submit(_attempt, client, kwargs, deadline, progressed, stop): 'primary'}
+    try:
+        if delay is not None and not progressed.wait(min(delay, _remaining(deadline))) and _budget.spend():
+            attempts[executor.submit(_hedge_attempt, client, kwargs, deadline, threading.Event(), stop)] = 'hedge'
+        error = None
+        pending = set(attempts)
+        while pending:
+            done, pending = wait(pending, timeout=_remaining(deadline), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return _completion(attempts[future], future.result(), len(attempts) > 1)
+                error = error or future.exception()
+        raise error
+    finally:
+        stop.set()
+
+
+async def _astream(client, kwargs: Dict, deadline: float, collector: _Collector, progressed: asyncio.Event):
+    stream = await client.chat.completions.create(timeout=_remaining(deadline), **STREAM_OPTIONS, **kwargs)
+    try:
+        async for chunk in stream:
+            if collector.add(chunk):
+                progressed.set()
+    finally:
+        await stream.close()
+    return collector
+
+
+async def _aattempt(client, kwargs: Dict, deadline: float, progressed: asyncio.Event):
+    try:
+        retry = 0
+        while True:
+            collector = _Collector(kwargs['model'])
+            try:
+                return await _astream(client, kwargs, deadline, collector, progressed)
+            except Exception as error:
+                delay = _retry_delay(error, retry, collector, deadline)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            retry += 1
+    finally:
+        progressed.set()
+
+
+async def _ahedge_attempt(*args):
+    with llm_slot():
+        return await _aattempt(*args)
+
+
+def _discard_result(task: asyncio.Task):
+    # A request that lost the race may still fail later; its error is not news
+    if not task.cancelled():
+        task.exception()
+
+
+async def acomplete(client, kwargs: Dict, deadline: float) -> Completion:
+    """Async variant of complete(); the losing request is cancelled at once"""
+    delay = _hedge_delay(kwargs['model'])
+    progressed = asyncio.Event()
+    attempts = {asyncio.ensure_future(_aattempt(client, kwargs, deadline, progressed)): 'primary'}
+    try:
+        if delay is not None:
+            try:
+                await asyncio.wait_for(progressed.wait(), min(delay, _remaining(deadline)))
+            except asyncio.TimeoutError:
+                if _budget.spend():
+                    hedge = asyncio.ensure_future(_ahedge_attempt(client, kwargs, deadline, asyncio.Event()))
+                    attempts[hedge] = 'hedge'
+        error = None
+        pending = set(attempts)
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=_remaining(deadline), return_when=FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return _completion(attempts[task], task.result(), len(attempts) > 1)
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in attempts:
+            task.add_done_callback(_discard_result)
+            if not task.done():
+                task.cancel()
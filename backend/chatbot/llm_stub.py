@@ -0,0 +1,85 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+STUB_REPLY = "This is a stub reply used for load testing. Unset LLM_STUB_LATENCY to use OpenAI."
+
+
+def _chunks(kwargs):
+    """The stub reply as streamed chunks: one per word, then the finish reason, then usage"""
+    completion = _completion(kwargs)
+    words = STUB_REPLY.split(' ')
+    for index, word in enumerate(words):
+        delta = SimpleNamespace(content=word if index == 0 else ' ' + word)
+        yield SimpleNamespace(model=completion.model, choices=[SimpleNamespace(delta=delta, finish_reason=None)], usage=None)
+    yield SimpleNamespace(model=completion.model, choices=[SimpleNamespace(delta=SimpleNamespace(content=None), finish_reason='stop')], usage=None)
+    yield SimpleNamespace(model=completion.model, choices=[], usage=completion.usage)
+
+
+class _Stream:
+    def __init__(self, kwargs):
+        self.chunks = _chunks(kwargs)
+
+    def __iter__(self):
+        return self.chunks
+
+    def close(self):
+        self.chunks.close()
+
+
+class _AsyncStream(_Stream):
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def close(self):
+        self.chunks.close()
+
+
+def _completion(kwargs):
+    prompt_tokens = sum(len(message['content'].split()) for message in kwargs.get('messages', []))
+    completion_tokens = len(STUB_REPLY.split())
+    return SimpleNamespace(
+        model=kwargs.get('model'),
+        choices=[SimpleNamespace(message=SimpleNamespace(role='assistant', content=STUB_REPLY), finish_reason='stop')],
+        usage=SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens
+        )
+    )
+
+
+class StubLLMClient:
+    """Stand-in for openai.OpenAI that answers, or starts streaming, after a fixed latency (LLM_STUB_LATENCY)"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, timeout=None, stream=False, stream_options=None, **kwargs):
+        if timeout is not None and timeout < self.latency:
+            time.sleep(timeout)
+            raise TimeoutError('stub request timed out')
+        time.sleep(self.latency)
+        return _Stream(kwargs) if stream else _completion(kwargs)
+
+
+class AsyncStubLLMClient:
+    """Stand-in for openai.AsyncOpenAI that answers after a fixed latency (LLM_STUB_LATENCY)"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, timeout=None, stream=False, stream_options=None, **kwargs):
+        if timeout is not None and timeout < self.latency:
+            await asyncio.sleep(timeout)
+            raise TimeoutError('stub request timed out')
+        await asyncio.sleep(self.latency)
+        return _AsyncStream(kwargs) if stream else _completion(kwargs)
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from chatbot.retention import archive_inactive_sessions, get_archive_dir, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Move inactive chat sessions and their messages into compressed archive files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'CHAT_RETENTION_DAYS', 90),
+                            help='Archive sessions with no activity for this many days')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Sessions per archive file and transaction')
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Stop after this many batches (default: until nothing is left)')
+        parser.add_argument('--archive-dir', default=None,
+                            help='Directory for the archive files (default: CHAT_ARCHIVE_DIR)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many sessions and messages would be archived')
+
+    def handle(self, *args, **options):
+        stats = archive_inactive_sessions(
+            days=options['days'],
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            archive_dir=options['archive_dir'],
+            dry_run=options['dry_run'],
+        )
+        if stats['dry_run']:
+            self.stdout.write(f"Would archive {stats['sessions']} sessions and {stats['messages']} messages")
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {stats['sessions']} sessions and {stats['messages']} messages "
+            f"into {len(stats['files'])} files ({stats['bytes']} bytes) in {stats['duration']:.2f}s "
+            f"under {options['archive_dir'] or get_archive_dir()}"
+        ))
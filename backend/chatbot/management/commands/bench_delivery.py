@@ -0,0 +1,70 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from channels.layers import InMemoryChannelLayer
+
+from chatbot.delivery import LocalPresence, RedisPresence, SessionDelivery
+
+
+class Command(BaseCommand):
+    help = 'Benchmark chat frame delivery: channel-layer group round trip vs the direct-send fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--layer', choices=['memory', 'redis'],
+                            default=getattr(settings, 'CHANNEL_LAYER_MODE', 'redis'))
+        parser.add_argument('--frames', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        results = asyncio.run(self.run(options['layer'], options['frames']))
+        for name, frames_per_second in results.items():
+            self.stdout.write(f"{options['layer']:>6} {name:<12} {frames_per_second:>12,.0f} frames/sec")
+
+    def make_layer(self, mode):
+        if mode == 'memory':
+            return InMemoryChannelLayer(), LocalPresence()
+        from channels_redis.core import RedisChannelLayer
+        return RedisChannelLayer(hosts=[settings.REDIS_URL]), RedisPresence()
+
+    async def run(self, mode, frames):
+        layer, presence = self.make_layer(mode)
+        group = 'chat_bench'
+        session_id = 'bench'
+        channel = await layer.new_channel()
+        await layer.group_add(group, channel)
+        event = {
+            'type': 'chat_message',
+            'message': 'x' * 200,
+            'message_type': 'assistant',
+            'message_id': 1,
+            'response_time': 0.5,
+            'sources': ['Complete Contact Information'],
+        }
+        sent = []
+
+        async def chat_message(message):
+            # Stand-in for ChatConsumer.chat_message -> self.send()
+            sent.append(json.dumps(message))
+
+        delivery = SessionDelivery(SimpleNamespace(chat_message=chat_message, channel_layer=layer), session_id, group)
+        delivery.presence = presence
+        await delivery.join()
+        try:
+            started = time.perf_counter()
+            for _ in range(frames):
+                await layer.group_send(group, event)
+                await chat_message(await layer.receive(channel))
+            group_rate = frames / (time.perf_counter() - started)
+
+            started = time.perf_counter()
+            for _ in range(frames):
+                await delivery.publish(event)
+            direct_rate = frames / (time.perf_counter() - started)
+        finally:
+            await delivery.leave()
+            await layer.group_discard(group, channel)
+
+        return {'group_send': group_rate, 'direct_send': direct_rate}
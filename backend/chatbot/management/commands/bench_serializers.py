@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from chatbot.fast_serializers import serialize_knowledge, serialize_sessions
+from chatbot.models import ChatSession, KnowledgeBaseEntry, Message
+from chatbot.renderers import FastJSONRenderer
+from chatbot.serializers import ChatSessionSerializer, KnowledgeBaseEntrySerializer
+from chatbot.signals import record_bulk_change
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark DRF serializers against the fast .values() serialization path (synthetic data, rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=100)
+        parser.add_argument('--messages', type=int, default=20, help='Messages per session')
+        parser.add_argument('--entries', type=int, default=500, help='Knowledge base entries')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.create_data(options)
+                self.run(options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def create_data(self, options):
+        sessions = ChatSession.objects.bulk_create([
+            ChatSession(session_id=f'bench-{index}') for index in range(options['sessions'])
+        ])
+        Message.objects.bulk_create([
+            Message(session=session, message_type='user' if turn % 2 == 0 else 'assistant',
+                    content='How much does the Python course cost? ' * 5, response_time=1.2)
+            for session in sessions for turn in range(options['messages'])
+        ])
+        KnowledgeBaseEntry.objects.bulk_create([
+            KnowledgeBaseEntry(title=f'Entry {index}', content='Python and AI course details. ' * 20,
+                               category='general', keywords='python, ai, course')
+            for index in range(options['entries'])
+        ])
+        record_bulk_change()
+
+    def timed(self, repeat, build, renderer):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            body = renderer.render(build())
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, len(body)
+
+    def run(self, repeat):
+        sessions = ChatSession.objects.filter(session_id__startswith='bench-').order_by('-created_at')
+        entries = KnowledgeBaseEntry.objects.filter(is_active=True)
+        cases = [
+            ('sessions', lambda: ChatSessionSerializer(sessions.prefetch_related('messages'), many=True).data,
+             lambda: serialize_sessions(sessions)),
+            ('knowledge', lambda: KnowledgeBaseEntrySerializer(entries, many=True).data,
+             lambda: serialize_knowledge(entries)),
+        ]
+        for name, drf_build, fast_build in cases:
+            drf_time, drf_size = self.timed(repeat, drf_build, JSONRenderer())
+            fast_time, fast_size = self.timed(repeat, fast_build, FastJSONRenderer())
+            self.stdout.write(
+                f'{name:<10} DRF {drf_time * 1000:8.1f} ms ({drf_size} B)   '
+                f'fast {fast_time * 1000:8.1f} ms ({fast_size} B)   {drf_time / fast_time:5.1f}x'
+            )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from chatbot.faq import build_faq, generate_missing_answers, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Incrementally cluster frequent user questions and select their best-rated answers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Number of messages processed per transaction')
+        parser.add_argument('--generate-missing', type=int, default=0, metavar='N',
+                            help='Pre-generate answers for up to N frequent questions that have none')
+
+    def handle(self, *args, **options):
+        stats = build_faq(batch_size=options['batch_size'])
+        if stats['kb_changed']:
+            self.stdout.write(self.style.WARNING('Knowledge base changed since the last run; FAQ answers were reset'))
+        self.stdout.write(
+            f"Processed {stats['messages']} messages, {stats['questions']} questions, "
+            f"{stats['answers_updated']} answers updated"
+        )
+
+        if options['generate_missing']:
+            generated = generate_missing_answers(options['generate_missing'])
+            self.stdout.write(f'Generated {generated} missing answers')
+
+        self.stdout.write(self.style.SUCCESS('FAQ table is up to date'))
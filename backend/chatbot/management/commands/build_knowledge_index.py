@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from chatbot.knowledge_file import builder_lock, file_version
+from chatbot.knowledge_index import build_index_file, current_version, index_file_path
+
+
+class Command(BaseCommand):
+    help = 'Write the shared knowledge index file (CHAT_KB_INDEX_PATH) for the current KB version'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None,
+                            help='Index file to write (default: CHAT_KB_INDEX_PATH)')
+        parser.add_argument('--force', action='store_true',
+                            help='Rewrite the file even if it already holds the current version')
+
+    def handle(self, *args, **options):
+        path = options['path'] or index_file_path()
+        if not path:
+            raise CommandError('Set CHAT_KB_INDEX_PATH or pass --path')
+
+        # Workers rebuild under the same lock, so only one process writes at a time
+        with builder_lock(path):
+            if not options['force'] and file_version(path) == current_version():
+                self.stdout.write(self.style.SUCCESS(f'{path} is already at version {file_version(path)}'))
+                return
+            version, count, size = build_index_file(path)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {count} entries at version {version} to {path} ({size} bytes)'))
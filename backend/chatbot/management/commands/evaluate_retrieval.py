@@ -0,0 +1,79 @@
+import io
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from chatbot.models import KnowledgeBaseEntry
+from chatbot.retrieval_eval import QUERY_SET_PATH, RETRIEVERS, evaluate, load_queries, synthetic_entries
+from chatbot.signals import record_bulk_change
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Evaluate registered retrievers on the labeled query set at several KB sizes (synthetic data, rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', default=str(QUERY_SET_PATH), help='Labeled query set (JSON)')
+        parser.add_argument('--retriever', action='append', choices=sorted(RETRIEVERS),
+                            help='Retriever to evaluate (repeatable, default all)')
+        parser.add_argument('--sizes', type=int, nargs='+', default=[0, 1000, 5000],
+                            help='Synthetic distractor entries added to the real KB')
+        parser.add_argument('--k', type=int, nargs='+', default=[1, 3, 5])
+        parser.add_argument('--repeat', type=int, default=5, help='Query passes for latency percentiles')
+        parser.add_argument('--output', help='Results file (default eval_results/retrieval-<timestamp>.json)')
+
+    def handle(self, *args, **options):
+        queries = load_queries(Path(options['queries']))
+        retrievers = options['retriever'] or sorted(RETRIEVERS)
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'query_set': options['queries'],
+            'queries': len(queries),
+            'k': options['k'],
+            'runs': [],
+        }
+
+        try:
+            with transaction.atomic():
+                # The labeled queries refer to the titles of the default knowledge base
+                call_command('populate_knowledge_base', stdout=io.StringIO())
+                base_size = KnowledgeBaseEntry.objects.count()
+                added = 0
+                for size in sorted(options['sizes']):
+                    KnowledgeBaseEntry.objects.bulk_create(synthetic_entries(size - added, seed=added), batch_size=500)
+                    record_bulk_change()
+                    added = size
+                    for name in retrievers:
+                        result = evaluate(RETRIEVERS[name](), queries, options['k'], options['repeat'])
+                        report['runs'].append(dict(result, retriever=name, kb_size=base_size + size))
+                        self.write_run(name, base_size + size, result)
+                raise Rollback
+        except Rollback:
+            pass
+
+        output = Path(options['output'] or Path(settings.BASE_DIR) / 'eval_results' /
+                      f"retrieval-{timezone.now():%Y%m%dT%H%M%S}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as results_file:
+            json.dump(report, results_file, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Results written to {output}'))
+
+    def write_run(self, name, kb_size, result):
+        overall = result['quality']['all']
+        recalls = '  '.join(f'{metric} {value:.2f}' for metric, value in overall.items() if metric.startswith('recall'))
+        by_language = '  '.join(
+            f"{language} mrr {quality['mrr']:.2f}"
+            for language, quality in sorted(result['quality'].items()) if language != 'all'
+        )
+        self.stdout.write(
+            f"{name:<16} kb={kb_size:<6} {recalls}  mrr {overall['mrr']:.2f}  ({by_language})  "
+            f"p50 {result['latency_ms']['p50']:.2f} ms  p99 {result['latency_ms']['p99']:.2f} ms"
+        )
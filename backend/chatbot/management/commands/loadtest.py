@@ -0,0 +1,361 @@
+"""
+End-to-end load generator for the chat API.
+
+Virtual users ramp up over --ramp-up seconds. Each one repeatedly creates a
+session and plays a scripted English or Persian conversation
+(chatbot/data/loadtest_conversations.json) over `send-message/` or over
+`ws/chat/<session_id>/`, pausing --think-time seconds (on average) between
+turns. Per endpoint it reports throughput, p50/p95/p99 latency, error rate
+and time to first token (first byte of the reply), plus p95 per interval
+against the number of active users so the point where latency degrades is
+visible. --start-server runs a local uvicorn server with the stub LLM.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+CONVERSATIONS_PATH = Path(__file__).resolve().parents[2] / 'data' / 'loadtest_conversations.json'
+ENDPOINTS = ['create-session', 'send-message', 'ws-connect', 'ws-turn']
+
+
+def percentile(values, quantile):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(quantile * len(ordered))) - 1))
+    return ordered[index]
+
+
+def latency_summary(values):
+    return {'p50': percentile(values, 0.50), 'p95': percentile(values, 0.95), 'p99': percentile(values, 0.99)}
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies = []
+        self.ttfts = []
+        self.errors = defaultdict(int)
+
+    def ok(self, latency, ttft=None):
+        self.latencies.append(latency)
+        if ttft is not None:
+            self.ttfts.append(ttft)
+
+    def fail(self, reason):
+        self.errors[reason] += 1
+
+    def summary(self, duration):
+        errors = sum(self.errors.values())
+        total = len(self.latencies) + errors
+        return {
+            'requests': total,
+            'throughput': len(self.latencies) / duration if duration else 0.0,
+            'errors': errors,
+            'error_rate': errors / total if total else 0.0,
+            'error_reasons': dict(self.errors),
+            'latency': latency_summary(self.latencies),
+            'ttft': latency_summary(self.ttfts),
+        }
+
+
+class LoadTest:
+    def __init__(self, options, conversations):
+        self.options = options
+        self.conversations = {
+            language: [item['turns'] for item in conversations if item['language'] == language]
+            for language in ('en', 'fa')
+        }
+        self.base = options['url'].rstrip('/')
+        self.api = self.base + '/api/chatbot'
+        self.ws_base = 'ws' + self.base[len('http'):] if self.base.startswith('http') else self.base
+        self.random = random.Random(options['seed'])
+        self.stats = defaultdict(EndpointStats)
+        self.turn_log = []  # (finished at, latency) of every answered turn, for the interval report
+        self.user_starts = []
+        self.remaining = options['requests']
+
+    def take_turn(self) -> bool:
+        """Charge one turn against --requests and --duration; False once either is used up"""
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            return False
+        if self.remaining is not None:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+        return True
+
+    async def think(self):
+        think_time = self.options['think_time']
+        if think_time > 0:
+            await asyncio.sleep(self.random.uniform(0.5, 1.5) * think_time)
+
+    async def run(self):
+        users = self.options['users']
+        limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+        async with httpx.AsyncClient(timeout=self.options['timeout'], limits=limits) as client:
+            self.started = time.perf_counter()
+            self.deadline = self.started + self.options['duration'] if self.options['duration'] else None
+            await asyncio.gather(*(self.user(client, index) for index in range(users)))
+            duration = time.perf_counter() - self.started
+        return self.report(duration)
+
+    async def user(self, client, index):
+        users = self.options['users']
+        await asyncio.sleep(self.options['ramp_up'] * index / users if users > 1 else 0)
+        self.user_starts.append(time.perf_counter())
+        while True:
+            language = 'fa' if self.random.random() < self.options['fa_share'] else 'en'
+            scripts = self.conversations[language] or self.conversations['en'] or self.conversations['fa']
+            turns = self.random.choice(scripts)
+            session_id = await self.create_session(client, language)
+            if session_id is None:
+                # A failed start counts as a turn so a broken server cannot keep the run going forever
+                if not self.take_turn():
+                    return
+                await asyncio.sleep(0.1)
+                continue
+            if self.random.random() < self.options['ws_share']:
+                finished = await self.ws_conversation(session_id, language, turns)
+            else:
+                finished = await self.http_conversation(client, session_id, language, turns)
+            if not finished:
+                return
+
+    async def create_session(self, client, language):
+        started = time.perf_counter()
+        try:
+            response = await client.post(f'{self.api}/create-session/', json={'language': language})
+        except httpx.HTTPError as error:
+            self.stats['create-session'].fail(type(error).__name__)
+            return None
+        if response.status_code not in (200, 201):
+            self.stats['create-session'].fail(f'http {response.status_code}')
+            return None
+        self.stats['create-session'].ok(time.perf_counter() - started)
+        return response.json()['session_id']
+
+    async def http_conversation(self, client, session_id, language, turns) -> bool:
+        for message in turns:
+            if not self.take_turn():
+                return False
+            stats = self.stats['send-message']
+            started = time.perf_counter()
+            ttft = None
+            body = b''
+            try:
+                async with client.stream('POST', f'{self.api}/send-message/', json={
+                    'message': message, 'session_id': session_id, 'language': language,
+                }) as response:
+                    async for chunk in response.aiter_bytes():
+                        if ttft is None:
+                            ttft = time.perf_counter() - started
+                        body += chunk
+            except httpx.HTTPError as error:
+                stats.fail(type(error).__name__)
+                continue
+            latency = time.perf_counter() - started
+            if response.status_code != 200:
+                stats.fail(f'http {response.status_code}')
+            elif not json.loads(body or b'{}').get('response'):
+                stats.fail('empty reply')
+            else:
+                stats.ok(latency, ttft)
+                self.turn_log.append((time.perf_counter(), latency))
+            await self.think()
+        return True
+
+    async def ws_conversation(self, session_id, language, turns) -> bool:
+        import websockets
+
+        stats = self.stats['ws-turn']
+        started = time.perf_counter()
+        try:
+            socket = await asyncio.wait_for(
+                websockets.connect(f'{self.ws_base}/ws/chat/{session_id}/', open_timeout=None),
+                self.options['timeout'],
+            )
+        except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as error:
+            self.stats['ws-connect'].fail(type(error).__name__)
+            await asyncio.sleep(0.1)
+            return self.take_turn()
+        self.stats['ws-connect'].ok(time.perf_counter() - started)
+        try:
+            for message in turns:
+                if not self.take_turn():
+                    return False
+                started = time.perf_counter()
+                try:
+                    await socket.send(json.dumps({'message': message}))
+                    outcome, ttft = await asyncio.wait_for(self.ws_reply(socket, started), self.options['timeout'])
+                except asyncio.TimeoutError:
+                    stats.fail('timeout')
+                    return True
+                except websockets.WebSocketException as error:
+                    stats.fail(type(error).__name__)
+                    return True
+                latency = time.perf_counter() - started
+                if outcome == 'ok':
+                    stats.ok(latency, ttft)
+                    self.turn_log.append((time.perf_counter(), latency))
+                else:
+                    stats.fail(outcome)
+                await self.think()
+            return True
+        finally:
+            await socket.close()
+
+    async def ws_reply(self, socket, started):
+        """Read frames until the assistant reply (or a control frame) for the turn just sent"""
+        ttft = None
+        while True:
+            frame = json.loads(await socket.recv())
+            if frame.get('type'):
+                return frame['type'], ttft
+            if frame.get('message_type') == 'assistant':
+                # Replies are not streamed yet: the first assistant frame is also the last
+                ttft = time.perf_counter() - started
+                return ('ok' if frame.get('message') else 'empty reply'), ttft
+
+    def intervals(self):
+        """p95 turn latency and throughput per --interval window, against the users active in it"""
+        width = self.options['interval']
+        windows = defaultdict(list)
+        for finished, latency in self.turn_log:
+            windows[int((finished - self.started) // width)].append(latency)
+        return [
+            {
+                'start': index * width,
+                'active_users': sum(1 for started in self.user_starts if started - self.started < (index + 1) * width),
+                'turns': len(windows[index]),
+                'throughput': len(windows[index]) / width,
+                'p95': percentile(windows[index], 0.95),
+            }
+            for index in range(max(windows) + 1 if windows else 0)
+        ]
+
+    def report(self, duration):
+        return {
+            'url': self.base,
+            'users': self.options['users'],
+            'duration': duration,
+            'endpoints': {name: self.stats[name].summary(duration) for name in ENDPOINTS if name in self.stats},
+            'intervals': self.intervals(),
+        }
+
+
+class Command(BaseCommand):
+    help = ('Load test the chat HTTP and WebSocket API with multi-turn English/Persian sessions '
+            '(use --start-server for a local server with a stub LLM)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the server under test')
+        parser.add_argument('--users', '--concurrency', dest='users', type=int, default=50,
+                            help='Simultaneous chatting users')
+        parser.add_argument('--requests', type=int, default=None,
+                            help='Stop after this many chat turns (default 500 unless --duration is given)')
+        parser.add_argument('--duration', type=float, default=None, help='Stop after this many seconds')
+        parser.add_argument('--ramp-up', type=float, default=0.0, help='Seconds over which users are started')
+        parser.add_argument('--think-time', type=float, default=0.0,
+                            help='Mean pause between turns of a user in seconds (uniform 0.5x-1.5x)')
+        parser.add_argument('--ws-share', type=float, default=0.5, help='Share of conversations held over WebSocket')
+        parser.add_argument('--fa-share', type=float, default=0.3, help='Share of Persian conversations')
+        parser.add_argument('--conversations', default=str(CONVERSATIONS_PATH), help='JSON file of scripted conversations')
+        parser.add_argument('--interval', type=float, default=5.0, help='Window of the per-interval report in seconds')
+        parser.add_argument('--timeout', type=float, default=60.0)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--start-server', action='store_true',
+                            help='Start a local uvicorn server with the stub LLM on the --url port for the run')
+        parser.add_argument('--server-workers', type=int, default=1)
+        parser.add_argument('--stub-latency', type=float, default=1.0, help='Stub LLM latency for --start-server')
+        parser.add_argument('--admission', action='store_true',
+                            help='Keep admission control on in the started server (off by default: one client IP)')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        # httpx logs every request at INFO
+        logging.getLogger('httpx').setLevel(logging.WARNING)
+        if options['requests'] is None and options['duration'] is None:
+            options['requests'] = 500
+        with open(options['conversations'], encoding='utf-8') as conversations_file:
+            conversations = json.load(conversations_file)
+        if not conversations:
+            raise CommandError('No conversations to play')
+
+        server = self.start_server(options) if options['start_server'] else None
+        try:
+            report = asyncio.run(LoadTest(options, conversations).run())
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.print_report(report)
+
+    def start_server(self, options):
+        port = httpx.URL(options['url']).port or 8000
+        env = dict(os.environ, LLM_STUB_LATENCY=str(options['stub_latency']))
+        if not options['admission']:
+            env['CHAT_ADMISSION_CONTROL'] = 'False'
+        if options['server_workers'] == 1:
+            env.setdefault('CHANNEL_LAYER_MODE', 'memory')
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'chatbot_backend.asgi:application', '--host', '127.0.0.1',
+             '--port', str(port), '--workers', str(options['server_workers']), '--log-level', 'warning'],
+            cwd=settings.BASE_DIR, env=env,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Server exited with code {server.returncode}')
+            try:
+                if httpx.get(options['url'].rstrip('/') + '/api/chatbot/health/', timeout=1.0).status_code == 200:
+                    return server
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        server.terminate()
+        raise CommandError('Server did not become healthy within 30s')
+
+    def print_report(self, report):
+        self.stdout.write(f"{report['users']} users against {report['url']}, {report['duration']:.1f}s")
+        self.stdout.write(
+            f"{'endpoint':16} {'reqs':>6} {'req/s':>7} {'errors':>7} {'p50':>8} {'p95':>8} {'p99':>8} "
+            f"{'ttft p50':>9} {'ttft p95':>9}"
+        )
+
+        def seconds(value):
+            return f'{value:.3f}s' if value is not None else '-'
+
+        for name, endpoint in report['endpoints'].items():
+            latency, ttft = endpoint['latency'], endpoint['ttft']
+            self.stdout.write(
+                f"{name:16} {endpoint['requests']:>6} {endpoint['throughput']:>7.1f} {endpoint['error_rate']:>7.1%} "
+                f"{seconds(latency['p50']):>8} {seconds(latency['p95']):>8} {seconds(latency['p99']):>8} "
+                f"{seconds(ttft['p50']):>9} {seconds(ttft['p95']):>9}"
+            )
+            if endpoint['error_reasons']:
+                reasons = ', '.join(f'{reason} x{count}' for reason, count in endpoint['error_reasons'].items())
+                self.stdout.write(f"{'':16} errors: {reasons}")
+
+        if report['intervals']:
+            self.stdout.write('')
+            self.stdout.write(f"{'window':>8} {'users':>6} {'turns/s':>8} {'turn p95':>9}")
+            for window in report['intervals']:
+                self.stdout.write(
+                    f"{window['start']:>7.0f}s {window['active_users']:>6} {window['throughput']:>8.1f} "
+                    f"{seconds(window['p95']):>9}"
+                )
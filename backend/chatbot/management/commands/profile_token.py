@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from chatbot.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = 'Print a signed X-Chat-Profile header value that makes ProfilingMiddleware profile a request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--session-id', default='', help='Only profile requests for this chat session')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"X-Chat-Profile: {make_token(options['session_id'])}")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from chatbot.retention import restore_archive, get_archive_dir
+from pathlib import Path
+
+
+class Command(BaseCommand):
+    help = 'Restore archived chat sessions from archive files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+',
+                            help='Archive files (absolute or relative to CHAT_ARCHIVE_DIR)')
+        parser.add_argument('--session-id', action='append', dest='session_ids',
+                            help='Only restore these sessions (may be given several times)')
+
+    def handle(self, *args, **options):
+        total_sessions = total_messages = 0
+        for name in options['files']:
+            path = Path(name)
+            if not path.exists():
+                path = get_archive_dir() / name
+            if not path.exists():
+                raise CommandError(f'Archive file not found: {name}')
+
+            stats = restore_archive(path, options['session_ids'])
+            total_sessions += stats['sessions']
+            total_messages += stats['messages']
+            for session_id in stats['skipped']:
+                self.stdout.write(self.style.WARNING(f'Skipped {session_id}: a session with this id already exists'))
+
+        self.stdout.write(self.style.SUCCESS(f'Restored {total_sessions} sessions and {total_messages} messages'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from chatbot.analytics import update_rollups, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Fold new messages into the hourly/daily analytics rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Number of messages processed per transaction')
+
+    def handle(self, *args, **options):
+        stats = update_rollups(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f"Rolled up {stats['messages']} messages into {stats['rows']} bucket updates")
+        )
@@ -0,0 +1,62 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.tracing import get_trace_file
+
+
+class Command(BaseCommand):
+    help = 'Print the span tree of a trace (X-Trace-Id / trace_id) from the JSONL trace file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('trace_id', nargs='?', help='Trace to show (omit with --slowest)')
+        parser.add_argument('--file', help='Trace file (default CHAT_TRACE_FILE)')
+        parser.add_argument('--slowest', type=int, default=0, help='List the N slowest root spans instead')
+
+    def handle(self, *args, **options):
+        path = Path(options['file'] or get_trace_file())
+        if not path.exists():
+            raise CommandError(f'No trace file at {path}')
+
+        if options['slowest']:
+            spans = list(self.read(path))
+            span_ids = {span['span_id'] for span in spans}
+            # Roots include spans continuing a remote traceparent whose parent is not in this file
+            roots = [span for span in spans if span['parent_id'] not in span_ids]
+            roots.sort(key=lambda span: span['duration_ms'], reverse=True)
+            for root in roots[:options['slowest']]:
+                self.stdout.write(f"{root['trace_id']}  {root['duration_ms']:>10.1f} ms  {root['name']}  {self.describe(root)}")
+            return
+
+        if not options['trace_id']:
+            raise CommandError('Give a trace id or --slowest N')
+        spans = [span for span in self.read(path) if span['trace_id'] == options['trace_id']]
+        if not spans:
+            raise CommandError(f"Trace {options['trace_id']} not found in {path}")
+
+        span_ids = {span['span_id'] for span in spans}
+        children = {}
+        for span in spans:
+            parent = span['parent_id'] if span['parent_id'] in span_ids else None
+            children.setdefault(parent, []).append(span)
+        trace_start = min(span['start'] for span in spans)
+        self.print_tree(children, None, trace_start, 0)
+
+    def read(self, path):
+        with open(path, encoding='utf-8') as trace_file:
+            for line in trace_file:
+                if line.strip():
+                    yield json.loads(line)
+
+    def describe(self, span):
+        return ' '.join(f'{key}={value}' for key, value in span['attributes'].items())
+
+    def print_tree(self, children, parent_id, trace_start, depth):
+        for span in sorted(children.get(parent_id, []), key=lambda span: span['start']):
+            offset = (span['start'] - trace_start) * 1000
+            status = '' if span['status'] == 'ok' else f" [{span['status']}]"
+            self.stdout.write(
+                f"{offset:>9.1f} ms {span['duration_ms']:>9.1f} ms  {'  ' * depth}{span['name']}{status}  {self.describe(span)}"
+            )
+            self.print_tree(children, span['span_id'], trace_start, depth + 1)
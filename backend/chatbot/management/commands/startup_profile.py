@@ -0,0 +1,108 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so every phase is measured cold
+FIRST_REQUEST_SCRIPT = """
+import json, time
+timings = {}
+started = time.perf_counter()
+mark = started
+
+def phase(name):
+    global mark
+    now = time.perf_counter()
+    timings[name] = now - mark
+    mark = now
+
+import django
+django.setup()
+phase('django_setup')
+
+from django.urls import get_resolver
+get_resolver().url_patterns
+phase('urlconf_and_views')
+
+from django.db import connection
+connection.ensure_connection()
+phase('db_connect')
+
+from chatbot.ai_service import get_ai_service
+service = get_ai_service()
+phase('ai_service_prompts')
+
+service.client
+phase('llm_client')
+
+service._get_relevant_knowledge('python')
+phase('kb_first_query')
+
+from django.test import Client
+client = Client(SERVER_NAME='localhost')
+response = client.get('/api/chatbot/health/')
+phase('first_request_health')
+
+response = client.get('/api/chatbot/health/')
+phase('second_request_health')
+
+timings['total'] = time.perf_counter() - started
+print('STARTUP_PROFILE ' + json.dumps(timings))
+"""
+
+
+class Command(BaseCommand):
+    help = 'Report import-time and first-request startup costs, each measured in a fresh process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help='Number of slowest imports to list')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'chatbot_backend.settings'))
+        cwd = str(settings.BASE_DIR)
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Import time (cold, cumulative per top-level package)'))
+        imports = self.profile_imports(env, cwd)
+        total = sum(imports.values())
+        for package, micros in sorted(imports.items(), key=lambda item: item[1], reverse=True)[:options['top']]:
+            self.stdout.write(f'  {package:<32} {micros / 1000:>9.1f} ms  {micros / total:>6.1%}')
+        self.stdout.write(f"  {'total':<32} {total / 1000:>9.1f} ms")
+
+        self.stdout.write(self.style.MIGRATE_HEADING('First request breakdown (cold process)'))
+        for phase, seconds in self.profile_first_request(env, cwd).items():
+            self.stdout.write(f'  {phase:<32} {seconds * 1000:>9.1f} ms')
+
+    def profile_imports(self, env, cwd):
+        code = 'import django; django.setup(); from django.urls import get_resolver; get_resolver().url_patterns'
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            env=env, cwd=cwd, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise CommandError(result.stderr[-2000:])
+
+        packages = defaultdict(int)
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, _, rest = line.partition('import time:')
+            _, cumulative, name = [part for part in rest.split('|')]
+            # Only top-level imports (no indentation) so nested costs are not counted twice
+            if name.startswith('  '):
+                continue
+            packages[name.strip().split('.')[0]] += int(cumulative)
+        return packages
+
+    def profile_first_request(self, env, cwd):
+        result = subprocess.run(
+            [sys.executable, '-c', FIRST_REQUEST_SCRIPT],
+            env=env, cwd=cwd, capture_output=True, text=True
+        )
+        for line in result.stdout.splitlines():
+            if line.startswith('STARTUP_PROFILE '):
+                return json.loads(line[len('STARTUP_PROFILE '):])
+        raise CommandError(result.stderr[-2000:] or 'No profile output')
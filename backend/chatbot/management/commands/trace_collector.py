@@ -0,0 +1,78 @@
+import json
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from chatbot.tracing import get_trace_file, write_jsonl
+
+
+def _attribute_value(value):
+    for kind in ('stringValue', 'boolValue', 'doubleValue'):
+        if kind in value:
+            return value[kind]
+    if 'intValue' in value:
+        return int(value['intValue'])
+    return None
+
+
+def otlp_to_records(payload):
+    """Flatten an OTLP/HTTP JSON export into the JSONL span records show_trace reads"""
+    records = []
+    for resource_spans in payload.get('resourceSpans', []):
+        for scope_spans in resource_spans.get('scopeSpans', []):
+            for span in scope_spans.get('spans', []):
+                start_ns = int(span['startTimeUnixNano'])
+                records.append({
+                    'trace_id': span['traceId'],
+                    'span_id': span['spanId'],
+                    'parent_id': span.get('parentSpanId') or None,
+                    'name': span['name'],
+                    'start': start_ns / 1e9,
+                    'duration_ms': round((int(span['endTimeUnixNano']) - start_ns) / 1e6, 3),
+                    'attributes': {item['key']: _attribute_value(item['value']) for item in span.get('attributes', [])},
+                    'status': 'error' if span.get('status', {}).get('code') == 2 else 'ok',
+                })
+    return records
+
+
+class Command(BaseCommand):
+    help = 'Run a local OTLP/HTTP (JSON) trace collector that appends received spans to a JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=4318)
+        parser.add_argument('--file', help='Where to write spans (default CHAT_TRACE_FILE)')
+
+    def handle(self, *args, **options):
+        path = Path(options['file'] or get_trace_file())
+        stdout = self.stdout
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != '/v1/traces' or 'json' not in self.headers.get('Content-Type', ''):
+                    self.send_error(415 if self.path == '/v1/traces' else 404)
+                    return
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                try:
+                    records = otlp_to_records(json.loads(body))
+                except (ValueError, KeyError):
+                    self.send_error(400)
+                    return
+                write_jsonl(records, path)
+                stdout.write(f'Received {len(records)} spans')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(b'{}')
+
+            def log_message(self, format, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', options['port']), Handler)
+        self.stdout.write(f"Collecting OTLP spans on http://127.0.0.1:{options['port']}/v1/traces into {path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,205 @@
+"""
+Long-term memory of a chat session.
+
+Every answered exchange (question and reply) is embedded when it is saved and
+stored as a ConversationMemory row: a packed float32 vector and an importance
+score. The embedding is computed locally without extra dependencies: signed
+feature hashing of the normalized words and word pairs into EMBEDDING_DIM
+dimensions, L2 normalized, so English and Persian go through the same
+normalization as retrieval. Only non-zero dimensions are stored: packed uint16
+indices followed by packed float32 values, a few hundred bytes per exchange.
+
+Before a completion the question is embedded the same way and the session's
+memories are scored by similarity x importance x recency (recency halves every
+CHAT_MEMORY_HALF_LIFE_TURNS exchanges, a rating raises or lowers importance).
+The best `memory_top_k` (runtime configuration) go into the prompt, each cut to
+CHAT_MEMORY_CHARS. A session keeps at most CHAT_MEMORY_MAX_PER_SESSION
+memories and evicts the ones with the lowest importance x rating x recency, so
+prompt size and scoring cost stay bounded however long the conversation runs.
+"""
+import bisect
+import heapq
+import math
+import zlib
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .models import ConversationMemory, Message
+from .text_normalization import normalize_text
+
+# Large enough that unrelated words rarely share a dimension; indices are stored as uint16
+EMBEDDING_DIM = 4096
+# Feature weights: the question says what the exchange is about, a long reply should not drown it out
+QUESTION_WEIGHT = 1.0
+ANSWER_WEIGHT = 0.5
+BIGRAM_WEIGHT = 0.5
+
+STOP_WORDS = set(normalize_text(' '.join([
+    'a an the is are was were be been to of in on at by for with and or but it its this that these those',
+    'what whats which who how do does did can could would should will i me you your we our they them he she',
+    'please tell about there here so if then than just also very much many some any',
+    'و در به از که را با این آن است هست برای یا هم تا چه چی چیست چطور من شما ما او هر یک',
+])).split())
+
+# Answers that are not worth recalling: refusals and error replies
+NOT_REMEMBERED = {'refusal', 'error'}
+# Lookups answered from KB facts or the FAQ can be answered again at no cost
+SOURCE_IMPORTANCE = {'template': 0.3, 'faq': 0.3}
+# Words with which users tell the assistant about themselves ("I am a beginner", "my project")
+PERSONAL_WORDS = set(normalize_text('my mine myself im am ive من هستم دارم میخواهم میخوام').split())
+# Rating of the reply -> importance multiplier
+RATING_WEIGHTS = {True: 1.5, False: 0.3, None: 1.0}
+
+
+def _add_features(weights: Dict[int, float], text: str, scale: float):
+    tokens = [token for token in normalize_text(text).split() if token not in STOP_WORDS]
+    features = [(token, scale) for token in tokens]
+    features += [(f'{first} {second}', scale * BIGRAM_WEIGHT) for first, second in zip(tokens, tokens[1:])]
+    for feature, weight in features:
+        digest = zlib.crc32(feature.encode('utf-8'))
+        index = digest % EMBEDDING_DIM
+        # An independent hash bit picks the sign, so colliding features tend to cancel out
+        sign = 1.0 if digest & 0x80000000 else -1.0
+        weights[index] = weights.get(index, 0.0) + sign * weight
+
+
+def embed(question: str, answer: str = '') -> Dict[int, float]:
+    """Sparse unit-length embedding as {dimension: value}; empty when the text has no content words"""
+    weights: Dict[int, float] = {}
+    _add_features(weights, question, QUESTION_WEIGHT)
+    if answer:
+        _add_features(weights, answer, ANSWER_WEIGHT)
+    norm = math.sqrt(sum(value * value for value in weights.values()))
+    if not norm:
+        return {}
+    return {index: value / norm for index, value in weights.items() if value}
+
+
+def pack(vector: Dict[int, float]) -> bytes:
+    indices = sorted(vector)
+    return array('H', indices).tobytes() + array('f', [vector[index] for index in indices]).tobytes()
+
+
+def unpack(data) -> Tuple[memoryview, memoryview]:
+    """Stored vector as (indices, values) views, without copying (bytes from SQLite, memoryview from psycopg)"""
+    data = memoryview(data).cast('B')
+    count = len(data) // 6
+    return data[:2 * count].cast('H'), data[2 * count:].cast('f')
+
+
+def dense(vector: Dict[int, float]) -> array:
+    values = array('f', bytes(4 * EMBEDDING_DIM))
+    for index, value in vector.items():
+        values[index] = value
+    return values
+
+
+def similarity(query: array, stored) -> float:
+    """Cosine similarity of a dense query and an unpacked stored vector"""
+    indices, values = stored
+    return sum(query[index] * value for index, value in zip(indices, values))
+
+
+def importance_of(question: str, result: Dict) -> float:
+    """Base importance of an exchange, 0 when it should not be remembered"""
+    if result.get('answer_source') in NOT_REMEMBERED:
+        return 0.0
+    importance = SOURCE_IMPORTANCE.get(result.get('answer_source'), 0.5)
+    tokens = normalize_text(question).split()
+    if PERSONAL_WORDS.intersection(tokens):
+        importance += 0.3
+    if len(tokens) >= 12:
+        importance += 0.1
+    return min(importance, 1.0)
+
+
+def remember_exchange(user_message: Message, assistant_message: Message, result: Dict) -> Optional[ConversationMemory]:
+    """Embed and store an answered exchange; called after the assistant reply is saved"""
+    if not getattr(settings, 'CHAT_MEMORY', True) or user_message is None:
+        return None
+    importance = importance_of(user_message.content, result)
+    vector = embed(user_message.content, assistant_message.content) if importance else {}
+    if not vector:
+        return None
+    memory = ConversationMemory.objects.create(
+        session_id=assistant_message.session_id,
+        user_message=user_message,
+        assistant_message=assistant_message,
+        semantic_vector=pack(vector),
+        importance_score=importance,
+    )
+    _evict(assistant_message.session_id)
+    return memory
+
+
+def _recency(age: int) -> float:
+    return 0.5 ** (age / getattr(settings, 'CHAT_MEMORY_HALF_LIFE_TURNS', 50))
+
+
+def _ages(user_message_ids: List[int], **session) -> List[int]:
+    """Questions asked in the session after each of `user_message_ids`, remembered or not"""
+    if not user_message_ids:
+        return []
+    asked = list(
+        Message.objects.filter(message_type='user', id__gte=min(user_message_ids), **session)
+        .order_by('id').values_list('id', flat=True)
+    )
+    return [len(asked) - bisect.bisect_right(asked, message_id) for message_id in user_message_ids]
+
+
+def _value(importance: float, is_helpful: Optional[bool], age: int) -> float:
+    """What a memory is worth regardless of the question: importance x rating x recency"""
+    return importance * RATING_WEIGHTS[is_helpful] * _recency(age)
+
+
+def _evict(session_pk: int):
+    """Drop the least valuable memories of a session above CHAT_MEMORY_MAX_PER_SESSION"""
+    limit = getattr(settings, 'CHAT_MEMORY_MAX_PER_SESSION', 200)
+    memories = ConversationMemory.objects.filter(session_id=session_pk)
+    excess = memories.count() - limit
+    if excess <= 0:
+        return
+    rows = list(memories.order_by('id').values_list(
+        'id', 'importance_score', 'assistant_message__is_helpful', 'user_message_id'
+    ))
+    ages = _ages([row[3] for row in rows], session_id=session_pk)
+    evicted = heapq.nsmallest(
+        excess, ((_value(importance, is_helpful, age), memory_id)
+                 for (memory_id, importance, is_helpful, _), age in zip(rows, ages))
+    )
+    ConversationMemory.objects.filter(id__in=[memory_id for _, memory_id in evicted]).delete()
+
+
+def recall(session_id: Optional[str], question: str, limit: int) -> List[Dict]:
+    """The `limit` past exchanges of a session that best match `question`, oldest first"""
+    if not session_id or limit <= 0 or not getattr(settings, 'CHAT_MEMORY', True):
+        return []
+    vector = embed(question)
+    if not vector:
+        return []
+    query = dense(vector)
+    rows = list(
+        ConversationMemory.objects.filter(session__session_id=session_id).order_by('id').values_list(
+            'id', 'semantic_vector', 'importance_score', 'assistant_message__is_helpful', 'user_message_id'
+        )
+    )
+    min_similarity = getattr(settings, 'CHAT_MEMORY_MIN_SIMILARITY', 0.15)
+    ages = _ages([row[4] for row in rows], session__session_id=session_id)
+    scored = []
+    for (memory_id, vector, importance, is_helpful, _), age in zip(rows, ages):
+        match = similarity(query, unpack(vector))
+        if match < min_similarity:
+            continue
+        scored.append((match * _value(importance, is_helpful, age), memory_id))
+    best = {memory_id: score for score, memory_id in heapq.nlargest(limit, scored)}
+    if not best:
+        return []
+    exchanges = ConversationMemory.objects.filter(id__in=list(best)).order_by('id').values_list(
+        'id', 'user_message__content', 'assistant_message__content'
+    )
+    return [
+        {'question': question_text, 'answer': answer_text, 'score': round(best[memory_id], 4)}
+        for memory_id, question_text, answer_text in exchanges
+    ]
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Brotli/gzip compression for large responses (CHAT_COMPRESS_MIN_BYTES and up)"""
+
+    def process_response(self, request, response):
+        min_bytes = getattr(settings, 'CHAT_COMPRESS_MIN_BYTES', 2048)
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or len(response.content) < min_bytes
+        ):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = request.META.get('HTTP_ACCEPT_ENCODING', '').lower()
+        if brotli is not None and 'br' in accepted:
+            compressed, encoding = brotli.compress(response.content, quality=4), 'br'
+        elif 'gzip' in accepted:
+            compressed, encoding = compress_string(response.content), 'gzip'
+        else:
+            return response
+
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        return response
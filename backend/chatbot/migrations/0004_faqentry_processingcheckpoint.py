@@ -0,0 +1,45 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0003_alter_chatsession_language_delete_conversationmemory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FAQEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(default='en', max_length=10)),
+                ('question_key', models.CharField(help_text='Normalized question text', max_length=255)),
+                ('sample_question', models.TextField()),
+                ('ask_count', models.IntegerField(default=0)),
+                ('answer', models.TextField(blank=True)),
+                ('answer_score', models.IntegerField(default=0)),
+                ('answer_source', models.CharField(blank=True, choices=[('history', 'Best-rated answer from history'), ('generated', 'Pre-generated answer')], max_length=10)),
+                ('is_active', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-ask_count'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProcessingCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('last_message_id', models.BigIntegerField(default=0)),
+                ('fingerprint', models.CharField(blank=True, max_length=200)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='faqentry',
+            constraint=models.UniqueConstraint(fields=('language', 'question_key'), name='unique_faq_question'),
+        ),
+    ]
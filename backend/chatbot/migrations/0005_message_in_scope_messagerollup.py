@@ -0,0 +1,45 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0004_faqentry_processingcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('language', models.CharField(max_length=10)),
+                ('message_type', models.CharField(choices=[('user', 'User'), ('assistant', 'Assistant'), ('system', 'System')], max_length=10)),
+                ('message_count', models.IntegerField(default=0)),
+                ('session_starts', models.IntegerField(default=0)),
+                ('in_scope_count', models.IntegerField(default=0)),
+                ('out_of_scope_count', models.IntegerField(default=0)),
+                ('helpful_count', models.IntegerField(default=0)),
+                ('unhelpful_count', models.IntegerField(default=0)),
+                ('response_time_count', models.IntegerField(default=0)),
+                ('response_time_sum', models.FloatField(default=0.0)),
+                ('response_time_histogram', models.JSONField(default=list, help_text='Counts per RESPONSE_TIME_BUCKETS bound, plus overflow')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-bucket_start', 'language', 'message_type'],
+            },
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='in_scope',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='messagerollup',
+            constraint=models.UniqueConstraint(fields=('granularity', 'bucket_start', 'language', 'message_type'), name='unique_message_rollup_bucket'),
+        ),
+    ]
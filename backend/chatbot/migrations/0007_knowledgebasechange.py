@@ -0,0 +1,25 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0006_chatsession_updated_at_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KnowledgeBaseChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_id', models.BigIntegerField(db_index=True)),
+                ('action', models.CharField(choices=[('save', 'Saved'), ('delete', 'Deleted')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
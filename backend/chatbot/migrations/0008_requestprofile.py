@@ -0,0 +1,31 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0007_knowledgebasechange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255)),
+                ('method', models.CharField(max_length=10)),
+                ('session_id', models.CharField(blank=True, max_length=100)),
+                ('trigger', models.CharField(choices=[('header', 'Signed header'), ('session', 'Profiled session'), ('sample', 'Random sample')], max_length=10)),
+                ('status_code', models.IntegerField()),
+                ('duration', models.FloatField(help_text='Wall time in seconds')),
+                ('sample_count', models.IntegerField(default=0)),
+                ('file_name', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
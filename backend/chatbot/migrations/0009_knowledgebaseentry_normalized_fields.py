@@ -0,0 +1,43 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:33
+
+from django.db import migrations, models
+
+from chatbot.text_normalization import normalize_keywords, normalize_text
+
+
+def normalize_entries(apps, schema_editor):
+    KnowledgeBaseEntry = apps.get_model('chatbot', 'KnowledgeBaseEntry')
+    entries = list(KnowledgeBaseEntry.objects.all())
+    for entry in entries:
+        entry.normalized_title = normalize_text(entry.title)
+        entry.normalized_content = normalize_text(entry.content)
+        entry.normalized_keywords = normalize_keywords(entry.keywords)
+    KnowledgeBaseEntry.objects.bulk_update(
+        entries, ['normalized_title', 'normalized_content', 'normalized_keywords'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0008_requestprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knowledgebaseentry',
+            name='normalized_content',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='knowledgebaseentry',
+            name='normalized_keywords',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='knowledgebaseentry',
+            name='normalized_title',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(normalize_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0009_knowledgebaseentry_normalized_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knowledgebaseentry',
+            name='facts',
+            field=models.JSONField(blank=True, default=dict, help_text='Typed facts for templated answers (see answer_engine.FACTS)'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='answer_source',
+            field=models.CharField(blank=True, choices=[('llm', 'LLM completion'), ('template', 'Answer template'), ('faq', 'FAQ'), ('refusal', 'Out-of-scope reply'), ('error', 'Error reply')], max_length=10),
+        ),
+        migrations.AddField(
+            model_name='messagerollup',
+            name='faq_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='messagerollup',
+            name='llm_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='messagerollup',
+            name='refusal_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='messagerollup',
+            name='template_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0010_answer_templates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationMemory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('semantic_vector', models.BinaryField(help_text='Sparse embedding: packed uint16 dimensions, then float32 values')),
+                ('importance_score', models.FloatField(default=0.5)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('assistant_message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='chatbot.message')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memories', to='chatbot.chatsession')),
+                ('user_message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='chatbot.message')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0011_conversationmemory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('route', models.CharField(max_length=50)),
+                ('llm_model', models.CharField(max_length=100)),
+                ('language', models.CharField(max_length=10)),
+                ('call_count', models.IntegerField(default=0)),
+                ('truncated_count', models.IntegerField(default=0)),
+                ('prompt_tokens', models.BigIntegerField(default=0)),
+                ('completion_tokens', models.BigIntegerField(default=0)),
+                ('response_time_sum', models.FloatField(default=0.0)),
+                ('response_time_histogram', models.JSONField(default=list, help_text='Counts per RESPONSE_TIME_BUCKETS bound, plus overflow')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-bucket_start', 'route'],
+            },
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='completion_tokens',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='llm_model',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='prompt_tokens',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='route',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='truncated',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='routerollup',
+            constraint=models.UniqueConstraint(fields=('granularity', 'bucket_start', 'route', 'llm_model', 'language'), name='unique_route_rollup_bucket'),
+        ),
+    ]
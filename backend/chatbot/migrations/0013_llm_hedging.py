@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-19 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0012_model_routing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='hedge',
+            field=models.CharField(blank=True, choices=[('primary', 'Hedged, first request won'), ('hedge', 'Hedged, second request won')], max_length=10),
+        ),
+        migrations.AddField(
+            model_name='routerollup',
+            name='hedge_win_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='routerollup',
+            name='hedged_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 14:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0013_llm_hedging'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='knowledgebasechange',
+            name='action',
+            field=models.CharField(choices=[('save', 'Saved'), ('delete', 'Deleted'), ('reload', 'Bulk write; reload the whole KB')], max_length=10),
+        ),
+    ]
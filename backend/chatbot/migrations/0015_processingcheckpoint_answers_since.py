@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 14:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0014_knowledgebasechange_reload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingcheckpoint',
+            name='answers_since',
+            field=models.DateTimeField(blank=True, help_text='Answers older than this predate the current KB', null=True),
+        ),
+    ]
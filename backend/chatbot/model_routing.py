@@ -0,0 +1,160 @@
+"""
+Model routing: the model tier, completion budget and length policy of a turn.
+
+Routes come from the `model_routes` runtime option, a JSON list in
+ChatbotConfiguration (see runtime_config.py); DEFAULT_ROUTES applies without
+one. The first route whose conditions all hold is used, else DEFAULT_ROUTE:
+
+- `intents`: recognized intents (AIService._recognize_intent), any if omitted
+- `min_confidence`: lowest intent confidence
+- `max_words`: longest question, in words
+- `languages`: session languages, any if omitted
+
+A route sets the model `tier` (`fast` is the `llm_fast_model` option,
+`standard` is `llm_model`), `max_tokens` (default `llm_max_tokens`, scaled up
+for languages that take more tokens per word), optional `stop` sequences and
+`max_sentences`, which is added to the system prompt so short answers end
+well before their token budget instead of being cut off.
+"""
+import json
+from typing import Dict, NamedTuple, Optional, Tuple
+
+INTENTS = ('course_info', 'contact', 'instructor', 'technical', 'projects', 'support', 'general')
+TIERS = ('fast', 'standard')
+# Persian text takes roughly half again as many tokens per word as English
+LANGUAGE_TOKEN_FACTORS = {'fa': 1.5}
+MAX_COMPLETION_TOKENS = 4096
+
+
+class Route(NamedTuple):
+    name: str
+    tier: str = 'standard'
+    max_tokens: Optional[int] = None
+    stop: Tuple[str, ...] = ()
+    max_sentences: Optional[int] = None
+    intents: Tuple[str, ...] = ()
+    min_confidence: float = 0.0
+    max_words: Optional[int] = None
+    languages: Tuple[str, ...] = ()
+
+    def matches(self, intent: str, confidence: float, words: int, language: str) -> bool:
+        return (
+            (not self.intents or intent in self.intents)
+            and confidence >= self.min_confidence
+            and (self.max_words is None or words <= self.max_words)
+            and (not self.languages or language in self.languages)
+        )
+
+
+DEFAULT_ROUTE = Route('default')
+DEFAULT_ROUTES = (
+    # Short factual questions that templates and the FAQ did not answer
+    Route('lookup', tier='fast', max_tokens=150, max_sentences=3,
+          intents=('contact', 'course_info', 'instructor'), min_confidence=0.3, max_words=20),
+    # Intent patterns are English, so Persian questions always look 'general'
+    Route('smalltalk', tier='fast', max_tokens=120, max_sentences=2, intents=('general',), max_words=8,
+          languages=('en',)),
+    # Explanations and code need room
+    Route('technical', tier='standard', max_tokens=700, intents=('technical', 'support')),
+    DEFAULT_ROUTE,
+)
+
+SENTENCE_LIMITS = {
+    'en': "\n\nAnswer in at most {count} sentences.",
+    'fa': "\n\nحداکثر در {count} جمله پاسخ بده.",
+}
+
+
+def _strings(value, field: str, allowed=None) -> Tuple[str, ...]:
+    if not isinstance(value, list) or not all(isinstance(item, str) and item for item in value):
+        raise ValueError(f'{field} must be a list of strings')
+    if allowed is not None:
+        unknown = sorted(set(value) - set(allowed))
+        if unknown:
+            raise ValueError(f'unknown {field} {", ".join(unknown)} (known: {", ".join(allowed)})')
+    return tuple(value)
+
+
+def _number(value, field: str, kind, minimum, maximum):
+    if isinstance(value, bool) or not isinstance(value, (int, float) if kind is float else int):
+        raise ValueError(f'{field} must be {"a number" if kind is float else "an integer"}')
+    if not minimum <= value <= maximum:
+        raise ValueError(f'{field} must be between {minimum} and {maximum}')
+    return kind(value)
+
+
+def _route(spec: Dict) -> Route:
+    if not isinstance(spec, dict) or not isinstance(spec.get('name'), str) or not spec['name']:
+        raise ValueError('every route needs a "name"')
+    name = spec['name']
+    unknown = sorted(set(spec) - set(Route._fields))
+    if unknown:
+        raise ValueError(f'route {name}: unknown field {", ".join(unknown)}')
+    try:
+        fields = {'name': name}
+        if 'tier' in spec:
+            if spec['tier'] not in TIERS:
+                raise ValueError(f'tier must be one of {", ".join(TIERS)}')
+            fields['tier'] = spec['tier']
+        if 'max_tokens' in spec:
+            fields['max_tokens'] = _number(spec['max_tokens'], 'max_tokens', int, 1, MAX_COMPLETION_TOKENS)
+        if 'stop' in spec:
+            fields['stop'] = _strings(spec['stop'], 'stop')
+            if len(fields['stop']) > 4:
+                raise ValueError('stop takes at most 4 sequences')
+        if 'max_sentences' in spec:
+            fields['max_sentences'] = _number(spec['max_sentences'], 'max_sentences', int, 1, 50)
+        if 'intents' in spec:
+            fields['intents'] = _strings(spec['intents'], 'intents', INTENTS)
+        if 'min_confidence' in spec:
+            fields['min_confidence'] = _number(spec['min_confidence'], 'min_confidence', float, 0, 1)
+        if 'max_words' in spec:
+            fields['max_words'] = _number(spec['max_words'], 'max_words', int, 1, 1000)
+        if 'languages' in spec:
+            fields['languages'] = _strings(spec['languages'], 'languages')
+    except ValueError as error:
+        raise ValueError(f'route {name}: {error}')
+    return Route(**fields)
+
+
+def parse_routes(raw: str) -> Tuple[Route, ...]:
+    """Routes from the JSON of the `model_routes` option; raises ValueError naming the first problem"""
+    try:
+        specs = json.loads(raw)
+    except ValueError:
+        raise ValueError('must be a JSON list of routes')
+    if not isinstance(specs, list) or not specs:
+        raise ValueError('must be a non-empty JSON list of routes')
+    routes = tuple(_route(spec) for spec in specs)
+    names = [route.name for route in routes]
+    if len(set(names)) != len(names):
+        raise ValueError('route names must be unique')
+    return routes
+
+
+def select_route(routes: Tuple[Route, ...], intent: str, confidence: float, message: str, language: str) -> Route:
+    words = len(message.split())
+    for route in routes:
+        if route.matches(intent, confidence, words, language):
+            return route
+    return DEFAULT_ROUTE
+
+
+def length_instruction(route: Route, language: str) -> str:
+    """System prompt addition for routes with a sentence limit"""
+    if route.max_sentences is None:
+        return ""
+    return SENTENCE_LIMITS.get(language, SENTENCE_LIMITS['en']).format(count=route.max_sentences)
+
+
+def completion_options(route: Route, config, language: str) -> Dict:
+    """Model, max_tokens and stop sequences of a route under the current runtime configuration"""
+    budget = route.max_tokens or config.llm_max_tokens
+    budget = min(round(budget * LANGUAGE_TOKEN_FACTORS.get(language, 1.0)), MAX_COMPLETION_TOKENS)
+    options = {
+        'model': config.llm_fast_model if route.tier == 'fast' else config.llm_model,
+        'max_tokens': budget,
+    }
+    if route.stop:
+        options['stop'] = list(route.stop)
+    return options
@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
+from .answer_engine import validate_facts
+from .runtime_config import validate_option
+from .text_normalization import normalize_keywords, normalize_text
 
 
 class ChatSession(models.Model):
@@ -16,6 +19,9 @@ class ChatSession(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['updated_at'], name='chatsession_updated_at_idx'),
+        ]
     
     def __str__(self):
         return f"Session {self.session_id}"
@@ -28,6 +34,17 @@ class Message(models.Model):
         ('assistant', 'Assistant'),
         ('system', 'System'),
     ]
+    ANSWER_SOURCES = [
+        ('llm', 'LLM completion'),
+        ('template', 'Answer template'),
+        ('faq', 'FAQ'),
+        ('refusal', 'Out-of-scope reply'),
+        ('error', 'Error reply'),
+    ]
+    HEDGE_WINNERS = [
+        ('primary', 'Hedged, first request won'),
+        ('hedge', 'Hedged, second request won'),
+    ]
     
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='messages')
     message_type = models.CharField(max_length=10, choices=MESSAGE_TYPES)
@@ -35,6 +52,15 @@ class Message(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     is_helpful = models.BooleanField(null=True, blank=True)  # User feedback
     response_time = models.FloatField(null=True, blank=True)  # Time taken to generate response
+    in_scope = models.BooleanField(null=True, blank=True)  # Scope decision for assistant replies
+    answer_source = models.CharField(max_length=10, choices=ANSWER_SOURCES, blank=True)  # How an assistant reply was produced
+    # Completion details of LLM replies (see model_routing.py)
+    route = models.CharField(max_length=50, blank=True)
+    llm_model = models.CharField(max_length=100, blank=True)
+    prompt_tokens = models.IntegerField(null=True, blank=True)
+    completion_tokens = models.IntegerField(null=True, blank=True)
+    truncated = models.BooleanField(null=True, blank=True)  # Stopped by max_tokens
+    hedge = models.CharField(max_length=10, choices=HEDGE_WINNERS, blank=True)  # See llm_calls.py
     
     class Meta:
         ordering = ['timestamp']
@@ -43,6 +69,22 @@ class Message(models.Model):
         return f"{self.message_type}: {self.content[:50]}..."
 
 
+class ConversationMemory(models.Model):
+    """An answered exchange of a session, embedded for recall into later prompts (see memory.py)"""
+    session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='memories')
+    user_message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='+')
+    assistant_message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='+')
+    semantic_vector = models.BinaryField(help_text="Sparse embedding: packed uint16 dimensions, then float32 values")
+    importance_score = models.FloatField(default=0.5)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"Memory {self.id} of session {self.session_id}"
+
+
 class KnowledgeBaseEntry(models.Model):
     """Represents entries in the knowledge base"""
     CATEGORIES = [
@@ -61,16 +103,58 @@ class KnowledgeBaseEntry(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     priority = models.IntegerField(default=0, help_text="Higher priority entries are preferred")
+    facts = models.JSONField(blank=True, default=dict, help_text="Typed facts for templated answers (see answer_engine.FACTS)")
+    # Search forms of title/content/keywords (see text_normalization.py), computed on save
+    normalized_title = models.TextField(blank=True, editable=False)
+    normalized_content = models.TextField(blank=True, editable=False)
+    normalized_keywords = models.TextField(blank=True, editable=False)
     
     class Meta:
         ordering = ['-priority', '-created_at']
     
     def __str__(self):
         return self.title
+    
+    def clean(self):
+        super().clean()
+        validate_facts(self.facts)
+    
+    def normalize(self):
+        self.normalized_title = normalize_text(self.title)
+        self.normalized_content = normalize_text(self.content)
+        self.normalized_keywords = normalize_keywords(self.keywords)
+    
+    def save(self, *args, **kwargs):
+        self.normalize()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'normalized_title', 'normalized_content', 'normalized_keywords'}
+        # The post_save change-log row (see signals.py) must commit together with the entry
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+
+class KnowledgeBaseChange(models.Model):
+    """Append-only log of knowledge base edits; the latest id is the KB version"""
+    ACTIONS = [
+        ('save', 'Saved'),
+        ('delete', 'Deleted'),
+        ('reload', 'Bulk write; reload the whole KB'),
+    ]
+    
+    entry_id = models.BigIntegerField(db_index=True)
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"v{self.id} {self.action} entry {self.entry_id}"
 
 
 class ChatbotConfiguration(models.Model):
-    """Configuration settings for the chatbot"""
+    """Configuration settings for the chatbot (runtime_config.CONFIG_OPTIONS are read by the chat path)"""
     name = models.CharField(max_length=100, unique=True)
     value = models.TextField()
     description = models.TextField(blank=True)
@@ -79,3 +163,140 @@ class ChatbotConfiguration(models.Model):
     
     def __str__(self):
         return f"{self.name}: {self.value}"
+    
+    def clean(self):
+        super().clean()
+        validate_option(self.name, self.value)
+
+
+class ProcessingCheckpoint(models.Model):
+    """High-water mark for incremental background jobs over the Message table"""
+    name = models.CharField(max_length=100, unique=True)
+    last_message_id = models.BigIntegerField(default=0)
+    fingerprint = models.CharField(max_length=200, blank=True)
+    answers_since = models.DateTimeField(null=True, blank=True, help_text="Answers older than this predate the current KB")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} @ {self.last_message_id}"
+
+
+class FAQEntry(models.Model):
+    """Precomputed answer for a frequently asked (normalized) question"""
+    ANSWER_SOURCES = [
+        ('history', 'Best-rated answer from history'),
+        ('generated', 'Pre-generated answer'),
+    ]
+    
+    language = models.CharField(max_length=10, default='en')
+    question_key = models.CharField(max_length=255, help_text="Normalized question text")
+    sample_question = models.TextField()
+    ask_count = models.IntegerField(default=0)
+    answer = models.TextField(blank=True)
+    answer_score = models.IntegerField(default=0)
+    answer_source = models.CharField(max_length=10, choices=ANSWER_SOURCES, blank=True)
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-ask_count']
+        constraints = [
+            models.UniqueConstraint(fields=['language', 'question_key'], name='unique_faq_question'),
+        ]
+    
+    def __str__(self):
+        return f"[{self.language}] {self.sample_question[:50]}"
+
+
+class MessageRollup(models.Model):
+    """Hourly/daily aggregates over Message, maintained incrementally by `manage.py rollup_messages`"""
+    GRANULARITIES = [
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+    ]
+    
+    granularity = models.CharField(max_length=4, choices=GRANULARITIES)
+    bucket_start = models.DateTimeField()
+    language = models.CharField(max_length=10)
+    message_type = models.CharField(max_length=10, choices=Message.MESSAGE_TYPES)
+    message_count = models.IntegerField(default=0)
+    session_starts = models.IntegerField(default=0)
+    in_scope_count = models.IntegerField(default=0)
+    out_of_scope_count = models.IntegerField(default=0)
+    helpful_count = models.IntegerField(default=0)
+    unhelpful_count = models.IntegerField(default=0)
+    llm_count = models.IntegerField(default=0)
+    template_count = models.IntegerField(default=0)
+    faq_count = models.IntegerField(default=0)
+    refusal_count = models.IntegerField(default=0)
+    response_time_count = models.IntegerField(default=0)
+    response_time_sum = models.FloatField(default=0.0)
+    response_time_histogram = models.JSONField(default=list, help_text="Counts per RESPONSE_TIME_BUCKETS bound, plus overflow")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-bucket_start', 'language', 'message_type']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularity', 'bucket_start', 'language', 'message_type'],
+                name='unique_message_rollup_bucket',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.granularity} {self.bucket_start:%Y-%m-%d %H:00} {self.language}/{self.message_type}"
+
+
+class RouteRollup(models.Model):
+    """Hourly/daily LLM calls per model route, maintained together with MessageRollup"""
+    granularity = models.CharField(max_length=4, choices=MessageRollup.GRANULARITIES)
+    bucket_start = models.DateTimeField()
+    route = models.CharField(max_length=50)
+    llm_model = models.CharField(max_length=100)
+    language = models.CharField(max_length=10)
+    call_count = models.IntegerField(default=0)
+    truncated_count = models.IntegerField(default=0)
+    hedged_count = models.IntegerField(default=0)
+    hedge_win_count = models.IntegerField(default=0)
+    prompt_tokens = models.BigIntegerField(default=0)
+    completion_tokens = models.BigIntegerField(default=0)
+    response_time_sum = models.FloatField(default=0.0)
+    response_time_histogram = models.JSONField(default=list, help_text="Counts per RESPONSE_TIME_BUCKETS bound, plus overflow")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-bucket_start', 'route']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularity', 'bucket_start', 'route', 'llm_model', 'language'],
+                name='unique_route_rollup_bucket',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.granularity} {self.bucket_start:%Y-%m-%d %H:00} {self.route} ({self.llm_model})"
+
+
+class RequestProfile(models.Model):
+    """A sampled request profile written by ProfilingMiddleware (speedscope file in CHAT_PROFILE_DIR)"""
+    TRIGGERS = [
+        ('header', 'Signed header'),
+        ('session', 'Profiled session'),
+        ('sample', 'Random sample'),
+    ]
+    
+    path = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    session_id = models.CharField(max_length=100, blank=True)
+    trigger = models.CharField(max_length=10, choices=TRIGGERS)
+    status_code = models.IntegerField()
+    duration = models.FloatField(help_text="Wall time in seconds")
+    sample_count = models.IntegerField(default=0)
+    file_name = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration:.2f}s)"
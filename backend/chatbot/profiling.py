@@ -0,0 +1,213 @@
+"""
+On-demand request profiling.
+
+ProfilingMiddleware is only installed with CHAT_PROFILING=True, so it costs
+nothing otherwise. When installed it profiles a request if it carries a valid
+signed X-Chat-Profile header (see `manage.py profile_token`), belongs to one of
+CHAT_PROFILE_SESSION_IDS, or is picked by CHAT_PROFILE_SAMPLE_RATE. A
+background thread samples the request thread's stack every
+CHAT_PROFILE_INTERVAL seconds; the result is written as a speedscope file
+(https://www.speedscope.app) to CHAT_PROFILE_DIR and listed in the admin.
+"""
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'HTTP_X_CHAT_PROFILE'
+TOKEN_SALT = 'chatbot.profiling'
+SESSION_PATH = re.compile(r'/session/(?P<session_id>[^/]+)/')
+
+
+def get_profile_dir() -> Path:
+    return Path(getattr(settings, 'CHAT_PROFILE_DIR', Path(settings.BASE_DIR) / 'profiles'))
+
+
+def make_token(session_id: str = '') -> str:
+    """Header value that enables profiling for requests (optionally only one session's)"""
+    return signing.dumps({'session_id': session_id}, salt=TOKEN_SALT)
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack from a helper thread"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: List[Tuple[Tuple[str, str, int], ...]] = []
+        self.weights: List[float] = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='chatbot-profiler', daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(tuple(stack))
+            self.weights.append(now - last)
+            last = now
+
+    def to_speedscope(self, name: str) -> Dict:
+        frames: List[Dict] = []
+        frame_index: Dict[Tuple[str, str, int], int] = {}
+        samples = []
+        for stack in self.samples:
+            indices = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({'name': frame[0], 'file': frame[1], 'line': frame[2]})
+                indices.append(frame_index[frame])
+            samples.append(indices)
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'chatbot.profiling',
+            'activeProfileIndex': 0,
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': sum(self.weights),
+                'samples': samples,
+                'weights': self.weights,
+            }],
+        }
+
+
+class ProfilingMiddleware:
+    """Profile selected requests into speedscope files (installed only with CHAT_PROFILING)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'CHAT_PROFILE_SAMPLE_RATE', 0.0)
+        self.session_ids = set(getattr(settings, 'CHAT_PROFILE_SESSION_IDS', []))
+        self.interval = getattr(settings, 'CHAT_PROFILE_INTERVAL', 0.005)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        trigger = self.trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+        profiler = SamplingProfiler(threading.get_ident(), self.interval)
+        profiler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+        self.save(request, response, profiler, trigger)
+        return response
+
+    async def __acall__(self, request):
+        trigger = self.trigger(request)
+        if trigger is None:
+            return await self.get_response(request)
+        # Samples the event loop thread; work handed to sync threads shows up as the awaiting frame
+        profiler = SamplingProfiler(threading.get_ident(), self.interval)
+        profiler.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.stop()
+        await sync_to_async(self.save)(request, response, profiler, trigger)
+        return response
+
+    def request_session_id(self, request) -> str:
+        match = SESSION_PATH.search(request.path)
+        if match:
+            return match.group('session_id')
+        if request.method == 'POST' and request.content_type == 'application/json':
+            try:
+                return str(json.loads(request.body or b'{}').get('session_id') or '')
+            except (ValueError, AttributeError):
+                return ''
+        return ''
+
+    def trigger(self, request) -> Optional[str]:
+        token = request.META.get(PROFILE_HEADER)
+        if token:
+            try:
+                claims = signing.loads(token, salt=TOKEN_SALT,
+                                       max_age=getattr(settings, 'CHAT_PROFILE_TOKEN_MAX_AGE', 3600))
+            except signing.BadSignature:
+                logger.warning("Ignoring invalid profiling token for %s", request.path)
+            else:
+                if not claims.get('session_id') or claims['session_id'] == self.request_session_id(request):
+                    return 'header'
+        if self.session_ids and self.request_session_id(request) in self.session_ids:
+            return 'session'
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'sample'
+        return None
+
+    def save(self, request, response, profiler: SamplingProfiler, trigger: str):
+        from .models import RequestProfile
+
+        try:
+            profile_dir = get_profile_dir()
+            profile_dir.mkdir(parents=True, exist_ok=True)
+            slug = re.sub(r'[^a-zA-Z0-9]+', '-', request.path).strip('-')[:60] or 'root'
+            file_name = f"{timezone.now():%Y%m%dT%H%M%S%f}-{request.method.lower()}-{slug}.speedscope.json"
+            with open(profile_dir / file_name, 'w', encoding='utf-8') as profile_file:
+                json.dump(profiler.to_speedscope(f'{request.method} {request.path}'), profile_file)
+
+            profile = RequestProfile.objects.create(
+                path=request.path[:255],
+                method=request.method,
+                session_id=self.request_session_id(request)[:100],
+                trigger=trigger,
+                status_code=response.status_code,
+                duration=profiler.duration,
+                sample_count=len(profiler.samples),
+                file_name=file_name,
+            )
+            response['X-Chat-Profile-Id'] = str(profile.id)
+            self.prune(profile_dir)
+        except Exception:
+            logger.exception("Could not save request profile for %s", request.path)
+
+    def prune(self, profile_dir: Path):
+        from .models import RequestProfile
+
+        keep = getattr(settings, 'CHAT_PROFILE_KEEP', 200)
+        old = RequestProfile.objects.order_by('-created_at', '-id')[keep:]
+        for profile in old:
+            (profile_dir / profile.file_name).unlink(missing_ok=True)
+            profile.delete()
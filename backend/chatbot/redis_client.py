@@ -0,0 +1,47 @@
+import asyncio
+import logging
+import weakref
+from typing import Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_sync_client = None
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_redis():
+    """Shared synchronous Redis client, or None when Redis is not configured"""
+    global _sync_client
+    url = getattr(settings, 'REDIS_URL', None)
+    if not url:
+        return None
+    if _sync_client is None:
+        import redis
+        _sync_client = redis.Redis.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0)
+    return _sync_client
+
+
+def get_async_redis():
+    """Asyncio Redis client bound to the running event loop, or None when Redis is not configured"""
+    url = getattr(settings, 'REDIS_URL', None)
+    if not url:
+        return None
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        import redis.asyncio
+        client = redis.asyncio.Redis.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0)
+        _async_clients[loop] = client
+    return client
+
+
+def get_pubsub():
+    """PubSub on its own connection without a read timeout, for long-lived listener threads"""
+    url = getattr(settings, 'REDIS_URL', None)
+    if not url:
+        return None
+    import redis
+    client = redis.Redis.from_url(url, socket_connect_timeout=1.0, health_check_interval=30)
+    return client.pubsub(ignore_subscribe_messages=True)
@@ -0,0 +1,204 @@
+import base64
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .analytics import update_rollups
+from .models import ChatSession, ConversationMemory, Message
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200
+RUN_LOG_NAME = 'retention-runs.jsonl'
+
+
+def get_archive_dir() -> Path:
+    return Path(getattr(settings, 'CHAT_ARCHIVE_DIR', Path(settings.BASE_DIR) / 'archive'))
+
+
+def _field_names(model) -> List[str]:
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def _inactive_sessions(cutoff):
+    """Sessions untouched since the cutoff that also have no newer messages"""
+    recent_messages = Message.objects.filter(session=models.OuterRef('pk'), timestamp__gte=cutoff)
+    return (
+        ChatSession.objects
+        .filter(updated_at__lt=cutoff)
+        .exclude(models.Exists(recent_messages))
+        .order_by('pk')
+    )
+
+
+def _memory_record(memory: Dict) -> Dict:
+    # JSON has no bytes; the packed embedding travels as base64
+    return dict(memory, semantic_vector=base64.b64encode(bytes(memory['semantic_vector'])).decode('ascii'))
+
+
+def _write_archive(path: Path, records: Iterable[Dict]) -> int:
+    """Write records as gzip JSONL; the file only appears under its final name once fully synced"""
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp_path, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as archive:
+            for record in records:
+                archive.write(json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False).encode('utf-8'))
+                archive.write(b'\n')
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+    return path.stat().st_size
+
+
+def archive_inactive_sessions(days: int, batch_size: int = BATCH_SIZE, max_batches: Optional[int] = None,
+                              archive_dir: Optional[Path] = None, dry_run: bool = False) -> Dict:
+    """Move sessions inactive for `days` (with their messages and memories) into gzip JSONL archive files"""
+    started = time.time()
+    archive_dir = Path(archive_dir or get_archive_dir())
+    cutoff = timezone.now() - timedelta(days=days)
+    stats = {'sessions': 0, 'messages': 0, 'files': [], 'bytes': 0, 'dry_run': dry_run}
+
+    if dry_run:
+        sessions = _inactive_sessions(cutoff)
+        stats['sessions'] = sessions.count()
+        stats['messages'] = Message.objects.filter(session__in=sessions).count()
+        return stats
+
+    # Archived messages leave the hot table, so they must be counted in the analytics first
+    update_rollups()
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    session_fields = _field_names(ChatSession)
+    message_fields = _field_names(Message)
+    memory_fields = _field_names(ConversationMemory)
+    run_stamp = timezone.now().strftime('%Y%m%dT%H%M%S')
+
+    batch_number = 0
+    while max_batches is None or batch_number < max_batches:
+        with transaction.atomic():
+            sessions = list(
+                _inactive_sessions(cutoff).select_for_update()[:batch_size].values(*session_fields)
+            )
+            if not sessions:
+                break
+            session_pks = [session['id'] for session in sessions]
+            messages_by_session = {}
+            for message in Message.objects.filter(session_id__in=session_pks).order_by('id').values(*message_fields):
+                messages_by_session.setdefault(message['session_id'], []).append(message)
+            memories_by_session = {}
+            memories = ConversationMemory.objects.filter(session_id__in=session_pks).order_by('id')
+            for memory in memories.values(*memory_fields):
+                memories_by_session.setdefault(memory['session_id'], []).append(_memory_record(memory))
+
+            records = [
+                {
+                    'session': session,
+                    'messages': messages_by_session.get(session['id'], []),
+                    'memories': memories_by_session.get(session['id'], []),
+                }
+                for session in sessions
+            ]
+            path = archive_dir / f'sessions-{run_stamp}-{batch_number:04d}.jsonl.gz'
+            stats['bytes'] += _write_archive(path, records)
+
+            ConversationMemory.objects.filter(session_id__in=session_pks).delete()
+            deleted_messages, _ = Message.objects.filter(session_id__in=session_pks).delete()
+            ChatSession.objects.filter(pk__in=session_pks).delete()
+
+        stats['sessions'] += len(sessions)
+        stats['messages'] += deleted_messages
+        stats['files'].append(path.name)
+        batch_number += 1
+
+    stats['duration'] = time.time() - started
+    _log_run(archive_dir, days, stats)
+    return stats
+
+
+def _log_run(archive_dir: Path, days: int, stats: Dict):
+    logger.info(
+        "Archived %s sessions and %s messages into %s files (%s bytes) in %.2fs",
+        stats['sessions'], stats['messages'], len(stats['files']), stats['bytes'], stats['duration']
+    )
+    entry = dict(stats, days=days, finished_at=timezone.now())
+    with open(archive_dir / RUN_LOG_NAME, 'a', encoding='utf-8') as run_log:
+        run_log.write(json.dumps(entry, cls=DjangoJSONEncoder) + '\n')
+
+
+def _to_instance(model, record: Dict):
+    values = {}
+    for field in model._meta.concrete_fields:
+        if field.attname not in record:
+            continue
+        value = record[field.attname]
+        if isinstance(field, models.DateTimeField) and isinstance(value, str):
+            value = parse_datetime(value)
+        values[field.attname] = value
+    return model(**values)
+
+
+def _restore_timestamps(model, instances: List, records: List[Dict]):
+    fields = [field for field in model._meta.concrete_fields
+              if isinstance(field, models.DateTimeField) and (field.auto_now or field.auto_now_add)]
+    if not instances or not fields:
+        return
+    for instance, record in zip(instances, records):
+        for field in fields:
+            value = record.get(field.attname)
+            setattr(instance, field.attname, parse_datetime(value) if isinstance(value, str) else value)
+    model.objects.bulk_update(instances, [field.name for field in fields])
+
+
+def restore_archive(path: Path, session_ids: Optional[Iterable[str]] = None) -> Dict:
+    """Load archived sessions back into the hot tables, keeping their original ids and timestamps
+
+    The session's updated_at is set to the time of the restore, so the next
+    archive run does not move it straight back out.
+    """
+    wanted = set(session_ids) if session_ids else None
+    stats = {'sessions': 0, 'messages': 0, 'memories': 0, 'skipped': []}
+
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        records = [json.loads(line) for line in archive if line.strip()]
+
+    with transaction.atomic():
+        for record in records:
+            session_id = record['session']['session_id']
+            if wanted is not None and session_id not in wanted:
+                continue
+            if ChatSession.objects.filter(session_id=session_id).exists():
+                # A new session reused this id after archiving; never merge into it
+                stats['skipped'].append(session_id)
+                continue
+
+            session = _to_instance(ChatSession, record['session'])
+            messages = [_to_instance(Message, message) for message in record['messages']]
+            # Archives written before memories were archived have none
+            memory_records = [
+                dict(memory, semantic_vector=base64.b64decode(memory['semantic_vector']))
+                for memory in record.get('memories', [])
+            ]
+            memories = [_to_instance(ConversationMemory, memory) for memory in memory_records]
+            ChatSession.objects.bulk_create([session])
+            Message.objects.bulk_create(messages)
+            ConversationMemory.objects.bulk_create(memories)
+            # bulk_create applies auto_now/auto_now_add, so put the archived timestamps back
+            _restore_timestamps(ChatSession, [session], [record['session']])
+            _restore_timestamps(Message, messages, record['messages'])
+            _restore_timestamps(ConversationMemory, memories, memory_records)
+            ChatSession.objects.filter(pk=session.pk).update(updated_at=timezone.now())
+
+            stats['sessions'] += 1
+            stats['messages'] += len(messages)
+            stats['memories'] += len(memories)
+    return stats
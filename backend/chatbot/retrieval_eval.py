@@ -0,0 +1,128 @@
+"""
+Offline retrieval evaluation: a registry of retrievers and the quality/latency
+metrics `manage.py evaluate_retrieval` reports for each of them.
+"""
+import json
+import random
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from .knowledge_index import KnowledgeIndex
+from .models import KnowledgeBaseEntry
+
+QUERY_SET_PATH = Path(__file__).resolve().parent / 'data' / 'retrieval_queries.json'
+
+# name -> factory; the factory runs once the KB for a run is in place and returns search(query, limit)
+RETRIEVERS: Dict[str, Callable[[], Callable[[str, int], List[Dict]]]] = {}
+
+SYNTHETIC_WORDS = [
+    'python', 'ai', 'course', 'learning', 'model', 'data', 'project', 'class', 'student', 'session',
+    'network', 'vision', 'language', 'training', 'deep', 'code', 'function', 'price', 'online', 'support',
+]
+
+
+def register_retriever(name: str):
+    def decorator(factory):
+        RETRIEVERS[name] = factory
+        return factory
+    return decorator
+
+
+@register_retriever('db_scan')
+def db_scan_retriever():
+    """The original per-turn table scan, kept as the baseline"""
+    def search(query: str, limit: int) -> List[Dict]:
+        query_lower = query.lower()
+        matches = []
+        for entry in KnowledgeBaseEntry.objects.filter(is_active=True):
+            score = 0
+            if query_lower in entry.title.lower():
+                score += 3
+            if query_lower in entry.content.lower():
+                score += 2
+            if entry.keywords:
+                for keyword in entry.keywords.split(','):
+                    if keyword.strip().lower() in query_lower:
+                        score += 1
+            if score > 0:
+                matches.append({'title': entry.title, 'score': score})
+        matches.sort(key=lambda match: match['score'], reverse=True)
+        return matches[:limit]
+    return search
+
+
+@register_retriever('knowledge_index')
+def knowledge_index_retriever():
+    """The in-process versioned index used by AIService"""
+    index = KnowledgeIndex()
+    index.ensure_current()
+    return index.search
+
+
+def load_queries(path: Path = QUERY_SET_PATH) -> List[Dict]:
+    with open(path, encoding='utf-8') as query_file:
+        return json.load(query_file)
+
+
+def synthetic_entries(count: int, seed: int = 0) -> List[KnowledgeBaseEntry]:
+    """Distractor entries that share vocabulary with the real KB"""
+    rng = random.Random(seed)
+    entries = []
+    for index in range(count):
+        words = rng.sample(SYNTHETIC_WORDS, 6)
+        entries.append(KnowledgeBaseEntry(
+            title=f'Synthetic {index} {" ".join(words[:2])}',
+            content=' '.join(rng.choice(SYNTHETIC_WORDS) for _ in range(60)),
+            category='general',
+            keywords=', '.join(words[2:]),
+        ))
+    return entries
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def evaluate(search: Callable[[str, int], List[Dict]], queries: List[Dict], ks: List[int], repeat: int = 1) -> Dict:
+    """recall@k, MRR and latency percentiles for one retriever over the labeled queries"""
+    depth = max(ks)
+    per_language: Dict[str, Dict] = {}
+    latencies = []
+    # Extra passes only add latency samples; quality comes from the first pass
+    for _ in range(repeat - 1):
+        for item in queries:
+            started = time.perf_counter()
+            search(item['query'], depth)
+            latencies.append(time.perf_counter() - started)
+
+    for item in queries:
+        started = time.perf_counter()
+        results = search(item['query'], depth)
+        latencies.append(time.perf_counter() - started)
+
+        titles = [result['title'] for result in results]
+        expected = set(item['expected'])
+        reciprocal_rank = next((1.0 / rank for rank, title in enumerate(titles, 1) if title in expected), 0.0)
+        for language in (item['language'], 'all'):
+            totals = per_language.setdefault(language, {'queries': 0, 'mrr': 0.0, **{f'recall@{k}': 0.0 for k in ks}})
+            totals['queries'] += 1
+            totals['mrr'] += reciprocal_rank
+            for k in ks:
+                totals[f'recall@{k}'] += len(expected.intersection(titles[:k])) / len(expected)
+
+    for totals in per_language.values():
+        for metric in totals:
+            if metric != 'queries':
+                totals[metric] = round(totals[metric] / totals['queries'], 4)
+    return {
+        'quality': per_language,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 3),
+            'p99': round(percentile(latencies, 0.99) * 1000, 3),
+            'mean': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        },
+    }
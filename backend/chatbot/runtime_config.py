@@ -0,0 +1,249 @@
+"""
+Runtime configuration backed by ChatbotConfiguration rows.
+
+CONFIG_OPTIONS lists the settings that can be tuned without a redeploy, with
+their types, bounds and defaults. Each process keeps one validated snapshot
+(`get_runtime_config()`), so the chat path reads plain attributes. The
+snapshot is reloaded when the table's version (row count and latest
+`updated_at`) changed: immediately after a save or delete in this process or
+a ping on the Redis channel `chat:config:version` from another one, otherwise
+at most every CHAT_CONFIG_POLL_SECONDS. A failed reload keeps the change
+pending and is retried after RETRY_SECONDS.
+
+The ORM must not run on an event loop: async code awaits
+`aget_runtime_config()`, which reloads in a worker thread, and a `get()` on
+the loop serves the current snapshot while a background thread reloads it.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Count, Max
+
+from .model_routing import DEFAULT_ROUTES, parse_routes
+from .redis_client import get_pubsub, get_redis
+
+logger = logging.getLogger(__name__)
+
+VERSION_CHANNEL = 'chat:config:version'
+# Delay before a pending reload that failed is tried again
+RETRY_SECONDS = 1.0
+
+
+class ConfigOption(NamedTuple):
+    parse: Callable[[str], object]
+    default: object
+    minimum: Optional[float] = None
+    maximum: Optional[float] = None
+    description: str = ''
+
+
+def _text(value: str) -> str:
+    value = value.strip()
+    if not value:
+        raise ValueError('must not be empty')
+    return value
+
+
+CONFIG_OPTIONS: Dict[str, ConfigOption] = {
+    'llm_model': ConfigOption(_text, 'gpt-3.5-turbo', description='Chat completion model'),
+    'llm_fast_model': ConfigOption(_text, 'gpt-4o-mini', description='Model of the fast routing tier'),
+    'model_routes': ConfigOption(parse_routes, DEFAULT_ROUTES, description='Model routing table (JSON, see model_routing.py)'),
+    'llm_max_tokens': ConfigOption(int, 400, 1, 4096, 'Completion token limit per reply'),
+    'llm_temperature': ConfigOption(float, 0.3, 0.0, 2.0, 'Sampling temperature'),
+    'retrieval_limit': ConfigOption(int, 5, 0, 50, 'Knowledge base entries added to the prompt'),
+    'context_chars': ConfigOption(int, 200, 0, 4000, 'Characters of each entry added to the prompt'),
+    'memory_top_k': ConfigOption(int, 3, 0, 10, 'Past exchanges of the session recalled into the prompt'),
+}
+
+
+def parse_option(name: str, raw: str):
+    """Typed value of a ChatbotConfiguration row; raises ValueError when it is invalid"""
+    option = CONFIG_OPTIONS[name]
+    try:
+        value = option.parse(raw)
+    except (TypeError, ValueError) as error:
+        # Builtin parsers explain nothing useful; the option's own parsers say what is wrong
+        raise ValueError(f'expected {option.parse.__name__}' if option.parse in (int, float) else str(error))
+    if option.minimum is not None and value < option.minimum:
+        raise ValueError(f'must be at least {option.minimum}')
+    if option.maximum is not None and value > option.maximum:
+        raise ValueError(f'must be at most {option.maximum}')
+    return value
+
+
+def validate_option(name: str, raw: str):
+    """Model validation: known options must hold a valid value, other names are stored as they are"""
+    if name not in CONFIG_OPTIONS:
+        return
+    try:
+        parse_option(name, raw)
+    except ValueError as error:
+        raise ValidationError({'value': f'{name}: {error}.'})
+
+
+class RuntimeConfig:
+    """Immutable snapshot of the configuration; attributes are the CONFIG_OPTIONS names"""
+
+    def __init__(self, values: Dict, version: Tuple = None):
+        self.__dict__.update(values)
+        self.version = version
+
+    def as_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in CONFIG_OPTIONS}
+
+
+def current_version() -> Tuple:
+    from .models import ChatbotConfiguration
+
+    stats = ChatbotConfiguration.objects.aggregate(count=Count('id'), updated=Max('updated_at'))
+    return stats['count'], stats['updated']
+
+
+class ConfigStore:
+    """Per-process holder of the current RuntimeConfig"""
+
+    def __init__(self):
+        self.config = RuntimeConfig({name: option.default for name, option in CONFIG_OPTIONS.items()})
+        self.stale = True
+        self.checked_at = 0.0
+        self.retry_at = 0.0
+        self.refresh_lock = threading.Lock()
+        self.listener: Optional[threading.Thread] = None
+
+    def announce(self):
+        self.stale = True
+
+    def due(self) -> bool:
+        now = time.monotonic()
+        if self.stale:
+            return now >= self.retry_at
+        return now - self.checked_at >= getattr(settings, 'CHAT_CONFIG_POLL_SECONDS', 10)
+
+    def get(self) -> RuntimeConfig:
+        if self.listener is None:
+            self.start_listener()
+        if self.due():
+            if _on_event_loop():
+                self.refresh_in_background()
+            else:
+                with self.refresh_lock:
+                    self.refresh()
+        return self.config
+
+    async def aget(self) -> RuntimeConfig:
+        if self.listener is None:
+            self.start_listener()
+        if self.due():
+            await database_sync_to_async(self._locked_refresh)()
+        return self.config
+
+    def _locked_refresh(self):
+        with self.refresh_lock:
+            self.refresh()
+
+    def refresh_in_background(self):
+        """Reload in a short-lived thread unless a reload is already running"""
+        if not self.refresh_lock.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self.refresh_lock.release()
+                connection.close()
+
+        threading.Thread(target=run, name='config-refresh', daemon=True).start()
+
+    def refresh(self):
+        announced = self.stale
+        # Cleared before reading so a change announced during the load is not lost
+        self.stale = False
+        try:
+            version = current_version()
+            if version != self.config.version:
+                self.config = self.load(version)
+        except Exception:
+            # Keep serving the last good snapshot when the database is unavailable
+            self.stale = self.stale or announced
+            self.retry_at = time.monotonic() + RETRY_SECONDS
+            logger.warning("Could not reload runtime configuration", exc_info=True)
+        self.checked_at = time.monotonic()
+
+    def load(self, version: Tuple) -> RuntimeConfig:
+        from .models import ChatbotConfiguration
+
+        values = {name: option.default for name, option in CONFIG_OPTIONS.items()}
+        rows = ChatbotConfiguration.objects.filter(name__in=list(CONFIG_OPTIONS)).values_list('name', 'value')
+        for name, raw in rows:
+            try:
+                values[name] = parse_option(name, raw)
+            except ValueError as error:
+                # Rows written around model validation; keep what this process had
+                values[name] = getattr(self.config, name)
+                logger.warning("Ignoring invalid configuration %s=%r: %s", name, raw, error)
+        logger.info("Loaded runtime configuration %s", values)
+        return RuntimeConfig(values, version)
+
+    def start_listener(self):
+        """Subscribe to reload pings in a daemon thread (no-op without Redis)"""
+        with self.refresh_lock:
+            if self.listener is not None:
+                return
+            self.listener = threading.Thread(target=self._listen, name='config-version-listener', daemon=True)
+            if getattr(settings, 'REDIS_URL', None):
+                self.listener.start()
+
+    def _listen(self):
+        backoff = 1.0
+        while True:
+            try:
+                pubsub = get_pubsub()
+                pubsub.subscribe(VERSION_CHANNEL)
+                backoff = 1.0
+                for _ in pubsub.listen():
+                    self.announce()
+            except Exception:
+                logger.warning("Config listener disconnected; retrying in %.0fs", backoff, exc_info=True)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+
+def publish_change():
+    """Make this process and every other worker reload the configuration"""
+    _store.announce()
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        client.publish(VERSION_CHANNEL, 1)
+    except Exception:
+        logger.warning("Could not broadcast configuration change; other workers will pick it up by polling",
+                       exc_info=True)
+
+
+_store = ConfigStore()
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def get_runtime_config() -> RuntimeConfig:
+    return _store.get()
+
+
+async def aget_runtime_config() -> RuntimeConfig:
+    """get_runtime_config() for async code; a due reload runs in a worker thread"""
+    return await _store.aget()
@@ -1,5 +1,8 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
-from .models import ChatSession, Message, KnowledgeBaseEntry, ChatbotConfiguration
+from .answer_engine import validate_facts
+from .models import ChatSession, Message, KnowledgeBaseEntry, ChatbotConfiguration, MessageRollup
 
 
 class MessageSerializer(serializers.ModelSerializer):
@@ -19,7 +22,14 @@ class ChatSessionSerializer(serializers.ModelSerializer):
 class KnowledgeBaseEntrySerializer(serializers.ModelSerializer):
     class Meta:
         model = KnowledgeBaseEntry
-        fields = ['id', 'title', 'content', 'category', 'keywords', 'created_at', 'updated_at', 'is_active', 'priority']
+        fields = ['id', 'title', 'content', 'category', 'keywords', 'facts', 'created_at', 'updated_at', 'is_active', 'priority']
+    
+    def validate_facts(self, value):
+        try:
+            validate_facts(value)
+        except DjangoValidationError as error:
+            raise serializers.ValidationError(error.message_dict['facts'])
+        return value
 
 
 class ChatbotConfigurationSerializer(serializers.ModelSerializer):
@@ -28,11 +38,33 @@ class ChatbotConfigurationSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'value', 'description', 'created_at', 'updated_at']
 
 
+class MessageRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MessageRollup
+        fields = [
+            'granularity', 'bucket_start', 'language', 'message_type', 'message_count', 'session_starts',
+            'in_scope_count', 'out_of_scope_count', 'helpful_count', 'unhelpful_count',
+            'llm_count', 'template_count', 'faq_count', 'refusal_count',
+            'response_time_count', 'response_time_sum', 'response_time_histogram'
+        ]
+
+
 class ChatMessageSerializer(serializers.Serializer):
     message = serializers.CharField(max_length=1000)
     session_id = serializers.CharField(max_length=100, required=False)
     language = serializers.CharField(max_length=10, required=False, default='en')
     context = serializers.JSONField(required=False)
+    async_job = serializers.BooleanField(required=False, default=False)
+
+    def validate_async_job(self, value):
+        # Without a Celery worker the job would never run
+        if value and getattr(settings, 'CHAT_GENERATION_MODE', 'inline') == 'inline':
+            raise serializers.ValidationError('Queued generation is not enabled on this server.')
+        return value
+
+
+class RatingSerializer(serializers.Serializer):
+    is_helpful = serializers.BooleanField()
 
 
 class ChatResponseSerializer(serializers.Serializer):
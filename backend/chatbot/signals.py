@@ -0,0 +1,63 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .db_router import KNOWLEDGE_KEY, mark_written, replica_aliases, session_key
+from .models import (
+    ChatbotConfiguration, ChatSession, KnowledgeBaseChange, KnowledgeBaseEntry, Message, ProcessingCheckpoint,
+)
+
+VERSION_LOCK_NAME = 'knowledge_base_version'
+
+
+def _record_change(entry_id: int, action: str):
+    """Append to the KB change log inside the writer's transaction and broadcast once it commits"""
+    # Writers take turns on one row so change ids commit in order and no worker skips a version
+    ProcessingCheckpoint.objects.select_for_update().get_or_create(name=VERSION_LOCK_NAME)
+    change = KnowledgeBaseChange.objects.create(entry_id=entry_id, action=action)
+
+    from .faq import invalidate_answers
+    invalidate_answers()
+
+    from .knowledge_index import publish_version
+    transaction.on_commit(lambda: publish_version(change.id))
+    if replica_aliases():
+        transaction.on_commit(lambda: mark_written(KNOWLEDGE_KEY))
+
+
+def record_bulk_change():
+    """Log a KB change for writes that skip save() and delete() (bulk_create, bulk_update, QuerySet.update())
+
+    Call it in the writing transaction; workers then reload the whole KB.
+    """
+    _record_change(0, 'reload')
+
+
+@receiver(post_save, sender=KnowledgeBaseEntry)
+def knowledge_entry_saved(sender, instance, **kwargs):
+    _record_change(instance.pk, 'save')
+
+
+@receiver(post_delete, sender=KnowledgeBaseEntry)
+def knowledge_entry_deleted(sender, instance, **kwargs):
+    _record_change(instance.pk, 'delete')
+
+
+@receiver(post_save, sender=ChatbotConfiguration)
+@receiver(post_delete, sender=ChatbotConfiguration)
+def configuration_changed(sender, **kwargs):
+    from .runtime_config import publish_change
+    transaction.on_commit(publish_change)
+
+
+@receiver(post_save, sender=ChatSession)
+def session_saved(sender, instance, **kwargs):
+    if replica_aliases():
+        transaction.on_commit(lambda: mark_written(session_key(instance.session_id)))
+
+
+@receiver(post_save, sender=Message)
+def message_saved(sender, instance, **kwargs):
+    # Reads of this session's history stay on the primary until replicas have the message
+    if replica_aliases():
+        transaction.on_commit(lambda: mark_written(session_key(instance.session.session_id)))
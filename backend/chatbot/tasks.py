@@ -0,0 +1,52 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from .models import ChatSession, Message
+from .ai_service import get_ai_service, reply_fields
+from .memory import remember_exchange
+from .tracing import span
+from chatbot_backend.celery import app
+
+
+@app.task
+def generate_response_task(session_id, user_message, language='en', trace_context=None, user_message_id=None):
+    """Generate the assistant reply for a queued chat turn and push it to the session's sockets"""
+    # Continues the trace of the request that queued the job
+    with span('celery.generate_response', **(trace_context or {})) as job_span:
+        session = ChatSession.objects.get(session_id=session_id)
+        ai_response = get_ai_service().generate_response(user_message, session_id, language)
+    
+        ai_msg = Message.objects.create(
+            session=session,
+            message_type='assistant',
+            content=ai_response['response'],
+            **reply_fields(ai_response)
+        )
+        if user_message_id is not None:
+            remember_exchange(Message.objects.filter(id=user_message_id).first(), ai_msg, ai_response)
+    
+        result = {
+            'response': ai_response['response'],
+            'session_id': session_id,
+            'message_id': ai_msg.id,
+            'response_time': ai_response['response_time'],
+            'sources': ai_response.get('sources', [])
+        }
+    
+        # Deliver to any ChatConsumer connected to this session
+        channel_layer = get_channel_layer()
+        if channel_layer is not None:
+            async_to_sync(channel_layer.group_send)(
+                f'chat_{session_id}',
+                {
+                    'type': 'chat_message',
+                    'message': result['response'],
+                    'message_type': 'assistant',
+                    'message_id': result['message_id'],
+                    'response_time': result['response_time'],
+                    'sources': result['sources'],
+                    'job_id': generate_response_task.request.id,
+                    'trace_id': job_span.trace_id
+                }
+            )
+    
+    return result
@@ -0,0 +1,127 @@
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .faq import build_faq
+from .memory import recall, remember_exchange
+from .models import ChatSession, ConversationMemory, FAQEntry, KnowledgeBaseChange, Message, ProcessingCheckpoint
+from .routing import websocket_urlpatterns
+
+
+class HangingLLMClient:
+    """Async client whose completions never produce a token; records whether they were cancelled"""
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.cancelled = asyncio.Event()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.started.set()
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+
+
+@override_settings(
+    CHANNEL_LAYER_MODE='memory',
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    CHAT_ADMISSION_CONTROL=False,
+    CHAT_LLM_HEDGING=False,
+)
+class CancelledTurnTests(TransactionTestCase):
+    async def connect(self):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/chat/cancel-test/')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def start_turn(self, client):
+        communicator = await self.connect()
+        await communicator.send_json_to({'message': 'Can you explain how Python decorators work?'})
+        # The user message is echoed before the LLM call starts
+        frame = await communicator.receive_json_from(timeout=5)
+        self.assertEqual(frame['message_type'], 'user')
+        await asyncio.wait_for(client.started.wait(), 5)
+        return communicator
+
+    async def test_cancel_frame_stops_the_completion(self):
+        client = HangingLLMClient()
+        with mock.patch('chatbot.ai_service.get_async_client', return_value=client):
+            communicator = await self.start_turn(client)
+            await communicator.send_json_to({'type': 'cancel'})
+            frame = await communicator.receive_json_from(timeout=5)
+            self.assertEqual(frame['type'], 'cancelled')
+            await asyncio.wait_for(client.cancelled.wait(), 5)
+            await communicator.disconnect()
+
+    async def test_disconnect_stops_the_completion(self):
+        client = HangingLLMClient()
+        with mock.patch('chatbot.ai_service.get_async_client', return_value=client):
+            communicator = await self.start_turn(client)
+            await communicator.disconnect()
+            await asyncio.wait_for(client.cancelled.wait(), 5)
+
+
+@override_settings(FAQ_SETTLE_MINUTES=0)
+class FAQKnowledgeBaseChangeTests(TestCase):
+    def add_exchange(self, answer, timestamp=None):
+        session = ChatSession.objects.create(session_id=f'faq-{Message.objects.count()}')
+        question = Message.objects.create(session=session, message_type='user', content='What does the course cost?')
+        reply = Message.objects.create(session=session, message_type='assistant', content=answer, is_helpful=True)
+        if timestamp:
+            Message.objects.filter(id__in=[question.id, reply.id]).update(timestamp=timestamp)
+
+    def test_replies_older_than_the_change_are_never_picked(self):
+        ProcessingCheckpoint.objects.create(name='faq', fingerprint='kb-v0')
+        KnowledgeBaseChange.objects.create(entry_id=1, action='save')
+        self.assertTrue(build_faq()['kb_changed'])
+        changed_at = ProcessingCheckpoint.objects.get(name='faq').answers_since
+
+        # Written before the change but only settled now, a run after the one that saw the change
+        self.add_exchange('Old price', timestamp=changed_at - timedelta(minutes=1))
+        build_faq()
+        entry = FAQEntry.objects.get()
+        self.assertEqual((entry.ask_count, entry.answer), (1, ''))
+        self.assertEqual(ProcessingCheckpoint.objects.get(name='faq').answers_since, changed_at)
+
+        self.add_exchange('New price', timestamp=timezone.now())
+        build_faq()
+        entry.refresh_from_db()
+        self.assertEqual((entry.ask_count, entry.answer), (2, 'New price'))
+        self.assertIsNone(ProcessingCheckpoint.objects.get(name='faq').answers_since)
+
+
+@override_settings(CHAT_MEMORY_HALF_LIFE_TURNS=1, CHAT_MEMORY_MIN_SIMILARITY=0.0)
+class ConversationMemoryTests(TestCase):
+    def setUp(self):
+        self.session = ChatSession.objects.create(session_id='memory-test')
+
+    def exchange(self, question, is_helpful=None, answer_source='llm'):
+        asked = Message.objects.create(session=self.session, message_type='user', content=question)
+        reply = Message.objects.create(
+            session=self.session, message_type='assistant', content='Answer', is_helpful=is_helpful
+        )
+        return remember_exchange(asked, reply, {'answer_source': answer_source})
+
+    def test_recency_counts_exchanges_that_were_not_remembered(self):
+        self.exchange('How do Python decorators wrap functions?')
+        self.exchange('Tell me about the weather', answer_source='refusal')
+        self.exchange('Tell me about the weather', answer_source='refusal')
+        [memory] = recall('memory-test', 'Python decorators', 1)
+        # Two later exchanges, one half-life each; similarity and importance are below 1
+        self.assertLess(memory['score'], 0.25)
+
+    @override_settings(CHAT_MEMORY_MAX_PER_SESSION=1)
+    def test_eviction_weighs_ratings_like_recall(self):
+        kept = self.exchange('How do Python decorators wrap functions?', is_helpful=True)
+        self.exchange('What is a Python generator?', is_helpful=False)
+        self.assertEqual(list(ConversationMemory.objects.values_list('id', flat=True)), [kept.id])
@@ -0,0 +1,74 @@
+"""
+Text normalization for matching Persian and English text.
+
+Persian users type the same word with Arabic or Persian yeh/kaf, with a ZWNJ
+or a space between parts, and with Persian, Arabic-Indic or Latin digits.
+normalize_text() folds all of these to one form and applies a light Persian
+stemmer, so knowledge base fields (normalized once when saved), FAQ keys and
+incoming questions compare equal. Plural and comparative suffixes are folded
+whether or not they are attached; verb prefixes ("می", "نمی") are only dropped
+when a ZWNJ or space separates them, since stripping them from an attached
+word would also mangle words like "میلیون".
+"""
+import re
+from typing import List
+
+_CHARACTER_MAP = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و',
+    '۰': '0', '۱': '1', '۲': '2', '۳': '3', '۴': '4', '۵': '5', '۶': '6', '۷': '7', '۸': '8', '۹': '9',
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4', '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+    # ZWNJ/ZWJ, direction marks and no-break space separate word parts like a space does
+    '\u200c': ' ', '\u200d': ' ', '\u200e': ' ', '\u200f': ' ', '\u00a0': ' ',
+})
+# Harakat, superscript alef and tatweel carry no meaning for matching
+_DIACRITICS_RE = re.compile('[\u064b-\u065f\u0670\u0640]')
+_PUNCTUATION_RE = re.compile(r'[^\w\s]+|_')
+_WHITESPACE_RE = re.compile(r'\s+')
+_PERSIAN_RE = re.compile('[\u0600-\u06ff]')
+
+# Longest first so "های" is removed before "ها"
+PERSIAN_SUFFIXES = ('هایی', 'های', 'ترین', 'ها', 'تر', 'ات')
+# Verb prefixes and plural/comparative suffixes that a ZWNJ split off into their own token
+DETACHED_AFFIXES = {'می', 'نمی', 'ها', 'های', 'هایی', 'تر', 'ترین'}
+MIN_STEM_LENGTH = 3
+
+
+def fold(text: str) -> str:
+    """Lowercase and fold characters, digits, diacritics, zero-width characters and punctuation"""
+    text = (text or '').lower().translate(_CHARACTER_MAP)
+    text = _DIACRITICS_RE.sub('', text)
+    text = _PUNCTUATION_RE.sub(' ', text)
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def stem(token: str) -> str:
+    """Light Persian stemming (plural and comparative suffixes); other tokens are returned unchanged"""
+    if not _PERSIAN_RE.search(token):
+        return token
+    for suffix in PERSIAN_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM_LENGTH:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokens(text: str) -> List[str]:
+    return [stem(token) for token in fold(text).split() if token not in DETACHED_AFFIXES]
+
+
+def is_persian(text: str) -> bool:
+    return bool(_PERSIAN_RE.search(text or ''))
+
+
+def normalize_text(text: str) -> str:
+    """Normalized form used for KB fields, FAQ keys and queries"""
+    return ' '.join(tokens(text))
+
+
+def normalize_keywords(keywords: str) -> str:
+    """Normalize a comma-separated keyword list keyword by keyword"""
+    normalized = (normalize_text(keyword) for keyword in (keywords or '').split(','))
+    return ','.join(keyword for keyword in normalized if keyword)
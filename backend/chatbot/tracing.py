@@ -0,0 +1,294 @@
+"""
+Lightweight tracing for chat turns.
+
+`span(name)` opens a span under the current one (held in a contextvar, so it
+follows asgiref's sync_to_async/database_sync_to_async hops) or starts a new
+trace. TracingMiddleware opens the root span of each HTTP request and returns
+its id in X-Trace-Id; ChatConsumer does the same per WebSocket turn and sends
+`trace_id` with the reply. ORM queries run under a span get their own
+`db.query` child through a connection execute wrapper.
+
+Finished spans are exported by a background thread to CHAT_TRACE_FILE (JSONL)
+or, with CHAT_TRACE_EXPORT=otlp, POSTed as OTLP/HTTP JSON to
+CHAT_TRACE_OTLP_ENDPOINT (`manage.py trace_collector` is a local stand-in).
+With CHAT_TRACE_EXPORT unset nothing is recorded.
+"""
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = 'chatbot-backend'
+TRACEPARENT = re.compile(r'^00-(?P<trace_id>[0-9a-f]{32})-(?P<span_id>[0-9a-f]{16})-[0-9a-f]{2}$')
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('chatbot_current_span', default=None)
+
+
+def tracing_enabled() -> bool:
+    return bool(getattr(settings, 'CHAT_TRACE_EXPORT', ''))
+
+
+def get_trace_file() -> Path:
+    return Path(getattr(settings, 'CHAT_TRACE_FILE', Path(settings.BASE_DIR) / 'traces' / 'spans.jsonl'))
+
+
+class Span:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start', 'duration', 'attributes', 'status')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.duration = None
+        self.attributes = attributes
+        self.status = 'ok'
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'duration_ms': round(self.duration * 1000, 3),
+            'attributes': self.attributes,
+            'status': self.status,
+        }
+
+
+class _NoopSpan:
+    trace_id = None
+
+    def set(self, key: str, value):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace_id if current else None
+
+
+def current_context() -> Dict:
+    """span() keyword arguments that continue the current trace elsewhere (e.g. in a Celery task)"""
+    current = _current_span.get()
+    return {'trace_id': current.trace_id, 'parent_id': current.span_id} if current else {}
+
+
+@contextmanager
+def span(name: str, trace_id: str = None, parent_id: str = None, **attributes):
+    """Time a block as a span; children opened inside it (also in sync_to_async threads) nest under it"""
+    if not tracing_enabled():
+        yield NOOP_SPAN
+        return
+    parent = _current_span.get()
+    if parent is not None and trace_id is None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    current = Span(name, trace_id or secrets.token_hex(16), parent_id, attributes)
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as error:
+        current.status = 'error'
+        current.attributes['error'] = repr(error)[:200]
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        _current_span.reset(token)
+        _exporter.submit(current)
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def to_otlp(spans: List[Span]) -> Dict:
+    """OTLP/HTTP JSON payload (ExportTraceServiceRequest) for a batch of spans"""
+    otlp_spans = []
+    for item in spans:
+        start_ns = int(item.start * 1e9)
+        otlp_span = {
+            'traceId': item.trace_id,
+            'spanId': item.span_id,
+            'name': item.name,
+            'kind': 2 if item.parent_id is None else 1,
+            'startTimeUnixNano': str(start_ns),
+            'endTimeUnixNano': str(start_ns + int(item.duration * 1e9)),
+            'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in item.attributes.items()],
+            'status': {'code': 2 if item.status == 'error' else 1},
+        }
+        if item.parent_id:
+            otlp_span['parentSpanId'] = item.parent_id
+        otlp_spans.append(otlp_span)
+    return {'resourceSpans': [{
+        'resource': {'attributes': [
+            {'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}},
+            {'key': 'process.pid', 'value': {'intValue': str(os.getpid())}},
+        ]},
+        'scopeSpans': [{'scope': {'name': 'chatbot.tracing'}, 'spans': otlp_spans}],
+    }]}
+
+
+class SpanExporter:
+    """Batches finished spans off the request path and writes them from one daemon thread"""
+    BATCH_SIZE = 256
+    FLUSH_SECONDS = 1.0
+    MAX_QUEUED = 10000
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=self.MAX_QUEUED)
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, finished: Span):
+        if self.thread is None:
+            self.start()
+        try:
+            self.queue.put_nowait(finished)
+        except queue.Full:
+            # Tracing must never slow chat turns down; drop spans instead
+            pass
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='chatbot-span-exporter', daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.FLUSH_SECONDS
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self.export(batch)
+            except Exception:
+                logger.warning("Dropped %s spans that could not be exported", len(batch), exc_info=True)
+
+    def export(self, batch: List[Span]):
+        if getattr(settings, 'CHAT_TRACE_EXPORT', '') == 'otlp':
+            request = urllib.request.Request(
+                getattr(settings, 'CHAT_TRACE_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces'),
+                data=json.dumps(to_otlp(batch)).encode('utf-8'),
+                headers={'Content-Type': 'application/json'},
+                method='POST',
+            )
+            urllib.request.urlopen(request, timeout=5).close()
+            return
+        write_jsonl([item.to_dict() for item in batch])
+
+    def flush(self, timeout: float = 5.0):
+        """Wait until queued spans are written (management commands and tests)"""
+        deadline = time.monotonic() + timeout
+        while not self.queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.05)
+
+
+def write_jsonl(records: List[Dict], path: Path = None):
+    path = Path(path or get_trace_file())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as trace_file:
+        for record in records:
+            trace_file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+
+
+_exporter = SpanExporter()
+
+
+def flush(timeout: float = 5.0):
+    _exporter.flush(timeout)
+
+
+def db_span_wrapper(execute, sql, params, many, context):
+    """Record ORM queries that run inside a traced turn"""
+    if _current_span.get() is None:
+        return execute(sql, params, many, context)
+    max_chars = getattr(settings, 'CHAT_TRACE_SQL_CHARS', 200)
+    with span('db.query', **{'db.statement': sql[:max_chars], 'db.many': many}):
+        return execute(sql, params, many, context)
+
+
+def _install_db_wrapper(sender, connection, **kwargs):
+    if db_span_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_span_wrapper)
+
+
+def install():
+    """Hook ORM tracing into every new database connection (called from AppConfig.ready)"""
+    if tracing_enabled():
+        connection_created.connect(_install_db_wrapper, dispatch_uid='chatbot.tracing.db')
+
+
+class TracingMiddleware:
+    """Root span per HTTP request; continues an incoming W3C traceparent and returns X-Trace-Id"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with span('http.request', **self.remote_parent(request), **self.request_attributes(request)) as root:
+            response = self.get_response(request)
+            self.finish(request, response, root)
+        return response
+
+    async def __acall__(self, request):
+        with span('http.request', **self.remote_parent(request), **self.request_attributes(request)) as root:
+            response = await self.get_response(request)
+            self.finish(request, response, root)
+        return response
+
+    def remote_parent(self, request) -> Dict:
+        match = TRACEPARENT.match(request.META.get('HTTP_TRACEPARENT', ''))
+        if not match:
+            return {}
+        return {'trace_id': match.group('trace_id'), 'parent_id': match.group('span_id')}
+
+    def request_attributes(self, request) -> Dict:
+        return {'http.method': request.method, 'http.target': request.path}
+
+    def finish(self, request, response, root):
+        if request.resolver_match:
+            root.set('http.route', request.resolver_match.route)
+        root.set('http.status_code', response.status_code)
+        if root.trace_id:
+            response['X-Trace-Id'] = root.trace_id
@@ -1,14 +1,20 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# Chat endpoints that have an async implementation
+chat_views = async_views if getattr(settings, 'CHAT_ASYNC_VIEWS', False) else views
 
 urlpatterns = [
     path('health/', views.health_check, name='health_check'),
-    path('send-message/', views.send_message, name='send_message'),
-    path('session/<str:session_id>/', views.get_session, name='get_session'),
-    path('create-session/', views.create_session, name='create_session'),
-    path('sessions/', views.get_sessions, name='get_sessions'),
-    path('rate-message/<int:message_id>/', views.rate_message, name='rate_message'),
+    path('send-message/', chat_views.send_message, name='send_message'),
+    path('job/<str:job_id>/', views.get_job, name='get_job'),
+    path('session/<str:session_id>/', chat_views.get_session, name='get_session'),
+    path('create-session/', chat_views.create_session, name='create_session'),
+    path('sessions/', chat_views.get_sessions, name='get_sessions'),
+    path('rate-message/<int:message_id>/', chat_views.rate_message, name='rate_message'),
     path('knowledge/', views.get_knowledge_base, name='get_knowledge_base'),
     path('knowledge/add/', views.add_knowledge_entry, name='add_knowledge_entry'),
     path('knowledge/search/', views.search_knowledge, name='search_knowledge'),
+    path('analytics/', views.get_analytics, name='get_analytics'),
 ]
@@ -1,29 +1,54 @@
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.http import Http404
+from django.conf import settings
 from django.db import models
-from .models import ChatSession, Message, KnowledgeBaseEntry
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import ChatSession, Message, KnowledgeBaseEntry, MessageRollup, RouteRollup
 from .serializers import (
     ChatSessionSerializer, 
     MessageSerializer, 
     ChatMessageSerializer,
     ChatResponseSerializer,
-    KnowledgeBaseEntrySerializer
+    KnowledgeBaseEntrySerializer,
+    MessageRollupSerializer,
+    RatingSerializer
 )
-from .ai_service import AIService
+from .admission import check_admission, client_ip
+from .ai_service import get_ai_service, reply_fields
+from .analytics import record_rating_change, summarize, summarize_routes
+from .memory import remember_exchange
+from .db_pool import all_pool_stats
+from .db_router import KNOWLEDGE_KEY, read_replica, session_key
+from .tracing import current_context
+from .fast_serializers import serialize_knowledge, serialize_session, serialize_sessions
+from datetime import timedelta
 import uuid
 
 
 @api_view(['GET'])
 def health_check(request):
     """Health check endpoint for Render.com"""
-    return Response({'status': 'healthy', 'service': 'AI Chatbot Backend'}, status=status.HTTP_200_OK)
+    payload = {'status': 'healthy', 'service': 'AI Chatbot Backend'}
+    pools = all_pool_stats()
+    if pools:
+        payload['database_pools'] = pools
+    return Response(payload, status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
 def send_message(request):
     """Send a message to the chatbot and get response"""
+    # Rejected turns are answered before any DB or LLM work
+    decision = check_admission(request.data.get('session_id'), client_ip(request.META))
+    if not decision.allowed:
+        return Response(decision.payload(), status=decision.status_code,
+                        headers={'Retry-After': decision.retry_after_header})
+    
     serializer = ChatMessageSerializer(data=request.data)
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -52,8 +77,21 @@ def send_message(request):
         content=user_message
     )
     
+    # Queue the generation when requested; the reply is pushed over the WebSocket or polled via job/<job_id>/
+    if serializer.validated_data.get('async_job') or getattr(settings, 'CHAT_GENERATION_MODE', 'inline') == 'celery':
+        # Imported on demand so web workers that never queue jobs do not load Celery
+        from .tasks import generate_response_task
+        job = generate_response_task.delay(session.session_id, user_message, language, trace_context=current_context(),
+                                           user_message_id=user_msg.id)
+        return Response({
+            'job_id': job.id,
+            'status': 'queued',
+            'session_id': session.session_id,
+            'message_id': user_msg.id
+        }, status=status.HTTP_202_ACCEPTED)
+    
     # Get AI response
-    ai_service = AIService()
+    ai_service = get_ai_service()
     ai_response = ai_service.generate_response(user_message, session.session_id, language)
     
     # Save AI response
@@ -61,8 +99,9 @@ def send_message(request):
         session=session,
         message_type='assistant',
         content=ai_response['response'],
-        response_time=ai_response['response_time']
+        **reply_fields(ai_response)
     )
+    remember_exchange(user_msg, ai_msg, ai_response)
     
     # Return response
     response_serializer = ChatResponseSerializer({
@@ -77,8 +116,31 @@ def send_message(request):
 
 
 @api_view(['GET'])
+def get_job(request, job_id):
+    """Poll the status of a queued generation job of the session given as ?session_id="""
+    from celery.result import AsyncResult
+    from chatbot_backend.celery import app
+    result = AsyncResult(job_id, app=app)
+    payload = {'job_id': job_id, 'status': result.state.lower()}
+    if result.successful():
+        # Only the session that queued the job may read its reply
+        if result.result.get('session_id') != request.GET.get('session_id'):
+            raise Http404
+        payload['result'] = ChatResponseSerializer(result.result).data
+    elif result.failed():
+        payload['error'] = 'Generation failed. Please try again.'
+    return Response(payload)
+
+
+@api_view(['GET'])
+@read_replica(session_key)
 def get_session(request, session_id):
     """Get chat session with all messages"""
+    if getattr(settings, 'CHAT_FAST_SERIALIZATION', False):
+        data = serialize_session(session_id)
+        if data is None:
+            raise Http404
+        return Response(data)
     session = get_object_or_404(ChatSession, session_id=session_id)
     serializer = ChatSessionSerializer(session)
     return Response(serializer.data)
@@ -101,9 +163,12 @@ def create_session(request):
 
 
 @api_view(['GET'])
+@read_replica()
 def get_sessions(request):
     """Get all chat sessions"""
     sessions = ChatSession.objects.all().order_by('-created_at')
+    if getattr(settings, 'CHAT_FAST_SERIALIZATION', False):
+        return Response(serialize_sessions(sessions))
     serializer = ChatSessionSerializer(sessions, many=True)
     return Response(serializer.data)
 
@@ -112,20 +177,25 @@ def get_sessions(request):
 def rate_message(request, message_id):
     """Rate a message as helpful or not helpful"""
     message = get_object_or_404(Message, id=message_id)
-    is_helpful = request.data.get('is_helpful')
+    serializer = RatingSerializer(data=request.data)
     
-    if is_helpful is not None:
-        message.is_helpful = is_helpful
+    if serializer.is_valid():
+        previous = message.is_helpful
+        message.is_helpful = serializer.validated_data['is_helpful']
         message.save()
+        record_rating_change(message, previous)
         return Response({'status': 'success'})
     
-    return Response({'error': 'is_helpful field is required'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['GET'])
+@read_replica(lambda: KNOWLEDGE_KEY)
 def get_knowledge_base(request):
     """Get all knowledge base entries"""
     entries = KnowledgeBaseEntry.objects.filter(is_active=True)
+    if getattr(settings, 'CHAT_FAST_SERIALIZATION', False):
+        return Response(serialize_knowledge(entries))
     serializer = KnowledgeBaseEntrySerializer(entries, many=True)
     return Response(serializer.data)
 
@@ -141,6 +211,7 @@ def add_knowledge_entry(request):
 
 
 @api_view(['GET'])
+@read_replica(lambda: KNOWLEDGE_KEY)
 def search_knowledge(request):
     """Search knowledge base entries"""
     query = request.GET.get('q', '')
@@ -155,5 +226,44 @@ def search_knowledge(request):
         models.Q(keywords__icontains=query)
     )
     
+    if getattr(settings, 'CHAT_FAST_SERIALIZATION', False):
+        return Response(serialize_knowledge(entries))
     serializer = KnowledgeBaseEntrySerializer(entries, many=True)
     return Response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_analytics(request):
+    """Get message analytics from the precomputed rollups (staff only)"""
+    granularity = request.GET.get('granularity', 'day')
+    if granularity not in ('hour', 'day'):
+        return Response({'error': 'granularity must be hour or day'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    bounds = {}
+    for param in ('since', 'until'):
+        if request.GET.get(param):
+            bounds[param] = parse_datetime(request.GET[param])
+            if bounds[param] is None:
+                return Response({'error': f'{param} must be an ISO datetime'}, status=status.HTTP_400_BAD_REQUEST)
+    until = bounds.get('until') or timezone.now()
+    since = bounds.get('since') or until - timedelta(days=getattr(settings, 'CHAT_ANALYTICS_DEFAULT_DAYS', 30))
+    max_days = getattr(settings, 'CHAT_ANALYTICS_MAX_DAYS', 366)
+    if until - since > timedelta(days=max_days):
+        return Response({'error': f'since and until may be at most {max_days} days apart'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    
+    filters = {'granularity': granularity, 'bucket_start__gte': since, 'bucket_start__lt': until}
+    if request.GET.get('language'):
+        filters['language'] = request.GET['language']
+    
+    rollups = MessageRollup.objects.filter(**filters)
+    if request.GET.get('message_type'):
+        rollups = rollups.filter(message_type=request.GET['message_type'])
+    
+    rollups = list(rollups.order_by('bucket_start'))
+    return Response({
+        'summary': summarize(rollups),
+        'routes': summarize_routes(RouteRollup.objects.filter(**filters)),
+        'buckets': MessageRollupSerializer(rollups, many=True).data
+    })
@@ -0,0 +1,44 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_started = False
+_lock = threading.Lock()
+
+
+def warm_up():
+    """Load everything the first chat turn would otherwise pay for: URLconf and views,
+    prompts, the OpenAI client, the database connection, the runtime configuration and the knowledge base."""
+    started = time.perf_counter()
+    from django.db import close_old_connections
+    from django.urls import get_resolver
+    from .ai_service import get_ai_service
+
+    get_resolver().url_patterns
+    ai_service = get_ai_service()
+    ai_service.client
+    try:
+        # Also loads the runtime configuration (retrieval limit)
+        ai_service._get_relevant_knowledge('python')
+    finally:
+        close_old_connections()
+    logger.info("Warm-up finished in %.2fs", time.perf_counter() - started)
+
+
+def start_warm_up():
+    """Run warm_up() once per process in a background thread so serving is never delayed"""
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+
+    def run():
+        try:
+            warm_up()
+        except Exception:
+            logger.exception("Warm-up failed")
+
+    threading.Thread(target=run, name='chatbot-warmup', daemon=True).start()
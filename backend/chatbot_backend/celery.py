@@ -0,0 +1,15 @@
+"""
+Celery application for chatbot_backend project.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chatbot_backend.settings')
+
+app = Celery('chatbot_backend')
+
+# Read the CELERY_* settings from Django settings
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
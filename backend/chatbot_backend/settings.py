@@ -4,6 +4,7 @@ Django settings for chatbot_backend project.
 
 from pathlib import Path
 import os
+import django
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -44,6 +45,34 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Compress large responses (history, knowledge base) with brotli/gzip
+if os.getenv('CHAT_RESPONSE_COMPRESSION', 'True').lower() == 'true':
+    MIDDLEWARE.insert(1, 'chatbot.middleware.CompressionMiddleware')
+CHAT_COMPRESS_MIN_BYTES = int(os.getenv('CHAT_COMPRESS_MIN_BYTES', '2048'))
+
+# On-demand request profiling (see chatbot/profiling.py); the middleware is only installed when enabled
+CHAT_PROFILING = os.getenv('CHAT_PROFILING', 'False').lower() == 'true'
+if CHAT_PROFILING:
+    MIDDLEWARE.insert(0, 'chatbot.profiling.ProfilingMiddleware')
+CHAT_PROFILE_SAMPLE_RATE = float(os.getenv('CHAT_PROFILE_SAMPLE_RATE', '0'))
+CHAT_PROFILE_SESSION_IDS = [sid for sid in os.getenv('CHAT_PROFILE_SESSION_IDS', '').split(',') if sid]
+CHAT_PROFILE_INTERVAL = float(os.getenv('CHAT_PROFILE_INTERVAL', '0.005'))
+CHAT_PROFILE_DIR = os.getenv('CHAT_PROFILE_DIR', str(BASE_DIR / 'profiles'))
+CHAT_PROFILE_KEEP = int(os.getenv('CHAT_PROFILE_KEEP', '200'))
+# Lifetime of signed X-Chat-Profile header values (manage.py profile_token)
+CHAT_PROFILE_TOKEN_MAX_AGE = int(os.getenv('CHAT_PROFILE_TOKEN_MAX_AGE', '3600'))
+
+# Tracing of chat turns (see chatbot/tracing.py): '' = off, 'jsonl' = CHAT_TRACE_FILE, 'otlp' = POST to CHAT_TRACE_OTLP_ENDPOINT
+CHAT_TRACE_EXPORT = os.getenv('CHAT_TRACE_EXPORT', '')
+if CHAT_TRACE_EXPORT:
+    MIDDLEWARE.insert(0, 'chatbot.tracing.TracingMiddleware')
+CHAT_TRACE_FILE = os.getenv('CHAT_TRACE_FILE', str(BASE_DIR / 'traces' / 'spans.jsonl'))
+CHAT_TRACE_OTLP_ENDPOINT = os.getenv('CHAT_TRACE_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+CHAT_TRACE_SQL_CHARS = int(os.getenv('CHAT_TRACE_SQL_CHARS', '200'))
+
+# Build read-heavy responses from .values() rows instead of DRF ModelSerializers
+CHAT_FAST_SERIALIZATION = os.getenv('CHAT_FAST_SERIALIZATION', 'True').lower() == 'true'
+
 ROOT_URLCONF = 'chatbot_backend.urls'
 
 TEMPLATES = [
@@ -66,13 +95,9 @@ WSGI_APPLICATION = 'chatbot_backend.wsgi.application'
 ASGI_APPLICATION = 'chatbot_backend.asgi.application'
 
 # Database
-import dj_database_url
-
-# Debug: Print DATABASE_URL to see what we're getting
-print(f"DATABASE_URL: {os.getenv('DATABASE_URL')}")
-
-# Try individual environment variables as fallback
 if os.getenv('DATABASE_URL'):
+    import dj_database_url
+
     DATABASES = {
         'default': dj_database_url.parse(
             os.getenv('DATABASE_URL'),
@@ -96,6 +121,52 @@ else:
         }
     }
 
+# Read replicas: comma-separated database URLs, added as replica_0, replica_1, ... (see chatbot/db_router.py)
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+if DATABASE_REPLICA_URLS:
+    import dj_database_url
+
+    for index, url in enumerate(DATABASE_REPLICA_URLS):
+        DATABASES[f'replica_{index}'] = dict(
+            dj_database_url.parse(url, conn_max_age=600, conn_health_checks=True),
+            TEST={'MIRROR': 'default'},
+        )
+    DATABASE_ROUTERS = ['chatbot.db_router.ReplicaRouter']
+# Seconds reads stay on the primary after a session or the KB was written (covers replication lag)
+CHAT_REPLICA_STICKY_SECONDS = int(os.getenv('CHAT_REPLICA_STICKY_SECONDS', '5'))
+# Replica health checks: interval and the largest PostgreSQL replay lag still served from
+CHAT_REPLICA_CHECK_SECONDS = int(os.getenv('CHAT_REPLICA_CHECK_SECONDS', '5'))
+CHAT_REPLICA_MAX_LAG_SECONDS = int(os.getenv('CHAT_REPLICA_MAX_LAG_SECONDS', '10'))
+
+# Connection pooling (see chatbot/db_pool.py): a bounded psycopg pool per process and PostgreSQL alias
+# instead of a persistent connection per thread, which ASGI and sync_to_async thread pools churn or leak
+CHAT_DB_POOL = os.getenv('CHAT_DB_POOL', 'True').lower() == 'true'
+# database_sync_to_async(thread_sensitive=False) work runs on asgiref's default executor (ASGI_THREADS);
+# the pool covers every executor thread plus headroom for request and background threads
+ASGI_EXECUTOR_THREADS = int(os.getenv('ASGI_THREADS', min(32, (os.cpu_count() or 1) + 4)))
+CHAT_DB_POOL_MIN_SIZE = int(os.getenv('CHAT_DB_POOL_MIN_SIZE', '2'))
+CHAT_DB_POOL_MAX_SIZE = int(os.getenv('CHAT_DB_POOL_MAX_SIZE', ASGI_EXECUTOR_THREADS + 4))
+# Seconds a thread waits for a free connection before the query fails with OperationalError
+CHAT_DB_POOL_TIMEOUT = float(os.getenv('CHAT_DB_POOL_TIMEOUT', '10'))
+CHAT_DB_POOL_MAX_IDLE = float(os.getenv('CHAT_DB_POOL_MAX_IDLE', '300'))
+CHAT_DB_POOL_MAX_LIFETIME = float(os.getenv('CHAT_DB_POOL_MAX_LIFETIME', '1800'))
+# Interval of the saturation warnings in the log (0 disables them)
+CHAT_DB_POOL_LOG_SECONDS = int(os.getenv('CHAT_DB_POOL_LOG_SECONDS', '60'))
+if CHAT_DB_POOL and django.VERSION >= (5, 1):
+    for database in DATABASES.values():
+        if database['ENGINE'] != 'django.db.backends.postgresql':
+            continue
+        # Pooled connections go back to the pool when closed; health checks run on every checkout
+        database['CONN_MAX_AGE'] = 0
+        database['CONN_HEALTH_CHECKS'] = True
+        database['OPTIONS'] = dict(database.get('OPTIONS', {}), pool={
+            'min_size': CHAT_DB_POOL_MIN_SIZE,
+            'max_size': CHAT_DB_POOL_MAX_SIZE,
+            'timeout': CHAT_DB_POOL_TIMEOUT,
+            'max_idle': CHAT_DB_POOL_MAX_IDLE,
+            'max_lifetime': CHAT_DB_POOL_MAX_LIFETIME,
+        })
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -137,6 +208,10 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'chatbot.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
@@ -153,26 +228,101 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379')
+
 # Channels settings
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
-        'CONFIG': {
-            "hosts": [os.getenv('REDIS_URL', 'redis://localhost:6379')],
+# 'redis' fans out across processes and nodes; 'memory' is only valid for a single-process deployment
+CHANNEL_LAYER_MODE = os.getenv('CHANNEL_LAYER_MODE', 'redis')
+if CHANNEL_LAYER_MODE == 'memory':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
         },
-    },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                "hosts": [REDIS_URL],
+            },
+        },
+    }
+
+# WebSocket flow control: accepted-but-unanswered messages per connection, idle close (seconds, 0 = never)
+CHAT_WS_MAX_PENDING = int(os.getenv('CHAT_WS_MAX_PENDING', '2'))
+CHAT_WS_IDLE_TIMEOUT = int(os.getenv('CHAT_WS_IDLE_TIMEOUT', '300'))
+
+# Admission control: token buckets as "<turns>/<seconds>" (empty disables one), checked in Redis with a local fallback
+CHAT_ADMISSION_CONTROL = os.getenv('CHAT_ADMISSION_CONTROL', 'True').lower() == 'true'
+CHAT_RATE_LIMITS = {
+    'session': os.getenv('CHAT_RATE_LIMIT_SESSION', '20/60'),
+    'ip': os.getenv('CHAT_RATE_LIMIT_IP', '60/60'),
+    'global': os.getenv('CHAT_RATE_LIMIT_GLOBAL', ''),
 }
+# Shed new turns while this many LLM calls are in flight in one process (0 = never)
+CHAT_MAX_LLM_INFLIGHT = int(os.getenv('CHAT_MAX_LLM_INFLIGHT', '32'))
+# Behind a proxy (Render terminates TLS in one), take the client address from X-Forwarded-For.
+# Only the entries appended by the CHAT_TRUSTED_PROXY_HOPS proxies in front of the app are trusted.
+CHAT_TRUST_X_FORWARDED_FOR = os.getenv('CHAT_TRUST_X_FORWARDED_FOR', 'False').lower() == 'true'
+CHAT_TRUSTED_PROXY_HOPS = int(os.getenv('CHAT_TRUSTED_PROXY_HOPS', '1'))
 
 # OpenAI settings
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+# Replace the OpenAI client with a stub that answers after this many seconds (load testing only)
+LLM_STUB_LATENCY = float(os.getenv('LLM_STUB_LATENCY')) if os.getenv('LLM_STUB_LATENCY') else None
+# Per-turn deadline for the LLM call, counted from the start of the turn (see chatbot/llm_calls.py)
+CHAT_LLM_DEADLINE_SECONDS = float(os.getenv('CHAT_LLM_DEADLINE_SECONDS', '30'))
+# Hedging: a second identical request when no token arrived by the p95 time to first token, for at most this share of calls
+CHAT_LLM_HEDGING = os.getenv('CHAT_LLM_HEDGING', 'False').lower() == 'true'
+CHAT_LLM_HEDGE_MAX_RATE = float(os.getenv('CHAT_LLM_HEDGE_MAX_RATE', '0.05'))
+
+# Serve the chat endpoints with the async views (run under an ASGI server, see Procfile)
+CHAT_ASYNC_VIEWS = os.getenv('CHAT_ASYNC_VIEWS', 'True').lower() == 'true'
 
 # Celery settings
-CELERY_BROKER_URL = os.getenv('REDIS_URL', 'redis://localhost:6379')
-CELERY_RESULT_BACKEND = os.getenv('REDIS_URL', 'redis://localhost:6379')
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_TASK_TRACK_STARTED = True
+CELERY_RESULT_EXPIRES = 3600
+
+# 'inline' generates replies inside the web worker, 'celery' queues them for the Celery worker
+CHAT_GENERATION_MODE = os.getenv('CHAT_GENERATION_MODE', 'inline')
+
+# FAQ precomputation (see `manage.py build_faq`)
+FAQ_MIN_ASK_COUNT = int(os.getenv('FAQ_MIN_ASK_COUNT', '3'))
+FAQ_SETTLE_MINUTES = int(os.getenv('FAQ_SETTLE_MINUTES', '60'))
+
+# Templated answers from typed KB facts (see chatbot/answer_engine.py); less confident matches go to the LLM
+CHAT_ANSWER_TEMPLATES = os.getenv('CHAT_ANSWER_TEMPLATES', 'True').lower() == 'true'
+CHAT_ANSWER_TEMPLATE_MIN_CONFIDENCE = float(os.getenv('CHAT_ANSWER_TEMPLATE_MIN_CONFIDENCE', '0.8'))
+
+# Long-term session memory (see chatbot/memory.py); how many memories are recalled is the `memory_top_k` runtime option
+CHAT_MEMORY = os.getenv('CHAT_MEMORY', 'True').lower() == 'true'
+CHAT_MEMORY_MAX_PER_SESSION = int(os.getenv('CHAT_MEMORY_MAX_PER_SESSION', '200'))
+CHAT_MEMORY_HALF_LIFE_TURNS = float(os.getenv('CHAT_MEMORY_HALF_LIFE_TURNS', '50'))
+CHAT_MEMORY_MIN_SIMILARITY = float(os.getenv('CHAT_MEMORY_MIN_SIMILARITY', '0.15'))
+CHAT_MEMORY_CHARS = int(os.getenv('CHAT_MEMORY_CHARS', '300'))
+
+# Runtime configuration (ChatbotConfiguration rows): seconds between version checks without a reload ping
+CHAT_CONFIG_POLL_SECONDS = int(os.getenv('CHAT_CONFIG_POLL_SECONDS', '10'))
+
+# Knowledge index: seconds between version checks when no broadcast arrived (safety net for missed Redis messages)
+KB_INDEX_POLL_SECONDS = int(os.getenv('KB_INDEX_POLL_SECONDS', '30'))
+# Knowledge index file shared by the workers of a host (see chatbot/knowledge_file.py); empty keeps a copy per worker
+CHAT_KB_INDEX_PATH = os.getenv('CHAT_KB_INDEX_PATH', '')
+
+# Analytics endpoint: window covered when `since` is omitted, and the longest window one request may ask for (days)
+CHAT_ANALYTICS_DEFAULT_DAYS = int(os.getenv('CHAT_ANALYTICS_DEFAULT_DAYS', '30'))
+CHAT_ANALYTICS_MAX_DAYS = int(os.getenv('CHAT_ANALYTICS_MAX_DAYS', '366'))
+
+# Session retention (see `manage.py archive_sessions`)
+CHAT_RETENTION_DAYS = int(os.getenv('CHAT_RETENTION_DAYS', '90'))
+CHAT_ARCHIVE_DIR = Path(os.getenv('CHAT_ARCHIVE_DIR', BASE_DIR / 'archive'))
 
 # Logging
 LOGGING = {
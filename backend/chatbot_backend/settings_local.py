@@ -72,6 +72,15 @@ DATABASES = {
     }
 }
 
+# Local replica testing: e.g. DATABASE_REPLICA_URLS=sqlite:////path/to/replica.sqlite3 (a copy of db.sqlite3)
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+if DATABASE_REPLICA_URLS:
+    import dj_database_url
+
+    for index, url in enumerate(DATABASE_REPLICA_URLS):
+        DATABASES[f'replica_{index}'] = dict(dj_database_url.parse(url), TEST={'MIRROR': 'default'})
+    DATABASE_ROUTERS = ['chatbot.db_router.ReplicaRouter']
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -131,6 +140,7 @@ CHANNEL_LAYERS = {
         'BACKEND': 'channels.layers.InMemoryChannelLayer',
     },
 }
+CHANNEL_LAYER_MODE = 'memory'
 
 # OpenAI settings - you'll need to set this
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', 'your-openai-api-key-here')
@@ -0,0 +1,12 @@
+"""
+Gunicorn configuration for chatbot_backend project.
+"""
+
+import os
+
+
+def post_worker_init(worker):
+    # The master has already bound the port; warm the worker up in the background (opt-in)
+    if os.getenv('CHAT_WARMUP', 'False').lower() == 'true':
+        from chatbot.warmup import start_warm_up
+        start_warm_up()